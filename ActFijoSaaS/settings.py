@@ -39,11 +39,13 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware', # Correcto
+    'api.middleware.QueryInstrumentationMiddleware', # Métricas SQL por request (ver LOGGING)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.TenantContextMiddleware', # request.tenant (Empleado/Empresa/Suscripción)
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -94,6 +96,62 @@ DATABASES = {
 DATABASE_ROUTERS = ['api.db_router.AnalyticsRouter']
 
 
+# --- INSTRUMENTACIÓN SQL Y LOGGING ---
+# api.middleware.QueryInstrumentationMiddleware registra por request: nº de consultas,
+# tiempo de SQL, duplicadas y tamaño de respuesta (logger 'api.instrumentation').
+# Las vistas pueden declarar `query_budget`; si se supera se emite un WARNING.
+QUERY_INSTRUMENTATION = os.environ.get('QUERY_INSTRUMENTATION', 'True') == 'True'
+
+# --- EXPORTACIÓN DE REPORTES EN SEGUNDO PLANO (api/report_jobs.py) ---
+# Los archivos se guardan en MEDIA_ROOT/tenant_<empresa>/reportes/ y se borran tras el TTL.
+# El worker es un proceso aparte: python manage.py process_report_jobs
+REPORT_JOB_TTL_HOURS = int(os.environ.get('REPORT_JOB_TTL_HOURS', '24'))
+REPORT_JOB_STALE_MINUTES = int(os.environ.get('REPORT_JOB_STALE_MINUTES', '30'))
+
+# --- CACHÉ DE REPORTES (api/report_cache.py) ---
+# Vistas previas en CACHES['default']; exportaciones en MEDIA_ROOT/report_cache/ (LRU por tamaño)
+REPORT_PREVIEW_CACHE_TTL = int(os.environ.get('REPORT_PREVIEW_CACHE_TTL', str(60 * 15)))
+REPORT_EXPORT_CACHE_MAX_BYTES = int(os.environ.get('REPORT_EXPORT_CACHE_MAX_MB', '512')) * 1024 * 1024
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '{asctime} {levelname} {name} {message}', 'style': '{'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+    },
+    'loggers': {
+        'api': {
+            'handlers': ['console'],
+            'level': os.environ.get('API_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+
+# --- CACHÉ COMPARTIDA ---
+# Usada por la caché de permisos (api/permissions.py) y otras cachés de la app.
+# En producción debe ser compartida entre workers de gunicorn (Redis); si no se
+# define REDIS_URL se usa memoria local, válida solo para desarrollo.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
 # ... (Validadores de contraseña sin cambios)
 
 # --- CONFIGURACIÓN DE INTERNACIONALIZACIÓN ---
@@ -139,8 +197,19 @@ CORS_ALLOW_HEADERS = [
     "user-agent",
     "x-csrftoken",
     "x-requested-with",
+    "x-empresa-id", # Selección explícita de empresa para el SuperAdmin
 ]
 
+# --- DJANGO REST FRAMEWORK ---
+REST_FRAMEWORK = {
+    # JWT para el frontend (los claims de permisos evitan consultas de autorización);
+    # sesión para el admin y la API navegable.
+    'DEFAULT_AUTHENTICATION_CLASSES': (
+        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+    ),
+}
+
 SIMPLE_JWT = {
     # Duración del token de acceso (ej: 1 hora en desarrollo)
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60), 
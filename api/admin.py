@@ -72,10 +72,27 @@ class PresupuestoAdmin(admin.ModelAdmin):
     list_display = ('descripcion', 'departamento', 'monto', 'fecha')
     list_filter = ('departamento',)
 
+@admin.register(ReporteJob)
+class ReporteJobAdmin(admin.ModelAdmin):
+    list_display = ('creado', 'usuario', 'empresa', 'formato', 'estado', 'progreso', 'filas')
+    list_filter = ('estado', 'formato', 'origen')
+    readonly_fields = [f.name for f in ReporteJob._meta.fields]
+
+class TasaCambioHistoricaInline(admin.TabularInline):
+    model = TasaCambioHistorica
+    extra = 0
+    ordering = ('-fecha',)
+
+@admin.register(Divisa)
+class DivisaAdmin(admin.ModelAdmin):
+    list_display = ('codigo', 'nombre', 'simbolo', 'tasa_cambio')
+    search_fields = ('codigo', 'nombre')
+    inlines = [TasaCambioHistoricaInline]
+
 # --- Registro de Modelos Simples ---
 # Estos modelos no necesitan tanta personalización en el admin
 
 admin.site.register(Permisos)
 admin.site.register(Estado)
 admin.site.register(Ubicacion)
-# ... y así registrarías el resto de tus modelos si los tuvieras
\ No newline at end of file
+# ... y así registrarías el resto de tus modelos si los tuvieras
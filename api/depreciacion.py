@@ -0,0 +1,284 @@
+# api/depreciacion.py
+import time
+import logging
+import calendar
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import Exists, OuterRef, Subquery, F, Sum, Value, DecimalField
+from django.db.models.functions import Coalesce
+
+from .models import ActivoFijo, DepreciacionActivos, DisposicionActivos, CierreDepreciacion
+from .report_cache import bump_data_version
+from .resumen import rebuild_resumen
+from .valoracion import invalidar_snapshots
+
+logger = logging.getLogger(__name__)
+
+# Filas leídas por bloque de la BD
+LOAD_CHUNK_SIZE = 5000
+# Activos por lote del cierre: cada lote es una transacción (y un punto de reanudación)
+DEPRECIACION_CHUNK_SIZE = 5000
+
+
+class DepreciacionError(Exception):
+    """El cierre no se puede ejecutar (periodo inválido o cierre concurrente)."""
+
+
+def parse_periodo(periodo):
+    """'AAAA-MM' -> fecha del último día del mes (la fecha de los cargos del periodo)."""
+    try:
+        anio, mes = (int(p) for p in str(periodo).split('-'))
+        return date(anio, mes, calendar.monthrange(anio, mes)[1])
+    except (ValueError, TypeError):
+        raise DepreciacionError(f"Periodo inválido: {periodo!r} (formato AAAA-MM).")
+
+
+def _mes_indice(dia):
+    """Meses desde 1970-01 (mismo índice que datetime64[M])."""
+    return (dia.year - 1970) * 12 + dia.month - 1
+
+
+def cargar_activos(queryset, campo_valor='valor_actual'):
+    """
+    Carga la proyección de los activos como arrays: (ids, valor en céntimos, mes de
+    adquisición, vida útil en meses). Los ids quedan en una lista paralela a los arrays.
+    `campo_valor` es el saldo por depreciar (valor_actual, o el saldo paralelo anotado);
+    se pasa a céntimos enteros desde el Decimal, sin pasar por float.
+    """
+    ids, valores, fechas, vidas = [], [], [], []
+    filas = queryset.values_list('id', campo_valor, 'fecha_adquisicion', 'vida_util')
+    for pk, valor, fecha, vida in filas.iterator(chunk_size=LOAD_CHUNK_SIZE):
+        ids.append(pk)
+        valores.append(int(Decimal(valor or 0).scaleb(2).to_integral_value(rounding=ROUND_HALF_UP)))
+        fechas.append(fecha)
+        vidas.append(vida or 0)
+    valor = np.array(valores, dtype=np.int64)
+    mes_adquisicion = np.array(fechas, dtype='datetime64[M]').astype(np.int64)
+    vida_meses = np.array(vidas, dtype=np.int64) * 12
+    return ids, valor, mes_adquisicion, vida_meses
+
+
+def calcular_cargos(valor, mes_adquisicion, vida_meses, mes_periodo, metodo, factor=2.0):
+    """
+    Cargo del mes `mes_periodo` (índice de _mes_indice) para cada activo, en una sola
+    pasada vectorizada. `valor` es el valor en libros actual en céntimos: el cargo
+    se calcula sobre lo que queda por depreciar y los meses de vida restantes, así una
+    revalorización se reparte en la vida que le queda al activo.
+    La depreciación empieza el mes siguiente a la adquisición.
+      - LINEAL: valor / meses restantes.
+      - SUMA_DIGITOS: valor * 2 / (meses restantes + 1), la suma de dígitos por meses.
+      - SALDO_DECRECIENTE: valor * factor / vida, pasando a línea recta cuando esta da
+        un cargo mayor (así el activo termina en cero al final de su vida).
+    Devuelve los cargos en céntimos enteros, redondeados hacia arriba en la mitad
+    como los importes Decimal (np.round redondea al par), y 0 donde no corresponde cargo.
+    """
+    transcurridos = mes_periodo - mes_adquisicion
+    restantes = vida_meses - transcurridos + 1
+    activos = (transcurridos >= 1) & (restantes >= 1) & (vida_meses > 0) & (valor > 0)
+    restantes = np.where(activos, restantes, 1).astype(np.float64)
+
+    lineal = valor / restantes
+    if metodo == 'LINEAL':
+        cargo = lineal
+    elif metodo == 'SUMA_DIGITOS':
+        cargo = valor * 2.0 / (restantes + 1.0)
+    elif metodo == 'SALDO_DECRECIENTE':
+        cargo = np.maximum(valor * float(factor) / np.maximum(vida_meses, 1), lineal)
+    else:
+        raise DepreciacionError(f"Método de depreciación desconocido: {metodo}")
+
+    cargo = np.minimum(np.floor(cargo + 0.5), valor)
+    return np.where(activos, cargo, 0).astype(np.int64)
+
+
+def activos_depreciables(empresa_id, fecha, contable=True):
+    """
+    Activos de la empresa adquiridos antes del periodo y sin disposición a esa fecha.
+    Para el tipo contable, solo los que aún tienen valor en libros.
+    """
+    dispuestos = DisposicionActivos.objects.filter(activo=OuterRef('pk'), fecha__lte=fecha)
+    activos = ActivoFijo.objects.filter(empresa_id=empresa_id, fecha_adquisicion__lte=fecha).filter(~Exists(dispuestos))
+    return activos.filter(valor_actual__gt=0) if contable else activos
+
+
+def _cargos_acumulados(**filtro):
+    cargos = (
+        DepreciacionActivos.objects.filter(activo=OuterRef('pk'), **filtro)
+        .values('activo').annotate(total=Sum('monto')).values('total')[:1]
+    )
+    return Coalesce(Subquery(cargos), Value(Decimal(0)), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def saldo_paralelo(tipo):
+    """
+    Saldo por depreciar de un tipo no contable: valor_actual sin los cargos del tipo
+    contable (es decir, el valor de adquisición con sus revalorizaciones) menos los
+    cargos ya hechos con `tipo`. Estos tipos nunca modifican valor_actual.
+    """
+    contables = _cargos_acumulados(tipo_depreciacion__empresa_id=tipo.empresa_id, tipo_depreciacion__contable=True)
+    return F('valor_actual') + contables - _cargos_acumulados(tipo_depreciacion=tipo)
+
+
+def _mes_siguiente(fecha):
+    anio, mes = divmod(fecha.year * 12 + fecha.month, 12)
+    return parse_periodo(f'{anio}-{mes + 1}')
+
+
+def ultimo_mes_completo(hoy=None):
+    """Fin del mes anterior a hoy: el último periodo que ya se puede cerrar."""
+    hoy = hoy or date.today()
+    return hoy.replace(day=1) - timedelta(days=1)
+
+
+def periodos_pendientes(cierre, hasta, desde=None):
+    """
+    Fechas (fin de mes) que faltan por cerrar hasta `hasta`, en orden: desde el
+    mes siguiente a la marca de agua, o desde el cierre a medias si lo hay.
+    Sin cierres previos se empieza en `desde` (o directamente en `hasta`).
+    """
+    if cierre.periodo_en_curso is not None:
+        actual = cierre.periodo_en_curso
+    elif cierre.ultimo_periodo is not None:
+        actual = _mes_siguiente(cierre.ultimo_periodo)
+    else:
+        actual = desde or hasta
+    periodos = []
+    while actual <= hasta:
+        periodos.append(actual)
+        actual = _mes_siguiente(actual)
+    return periodos
+
+
+def _avanzar(cierre, fecha, cursor_anterior, **campos):
+    """
+    Mueve el cursor del cierre con un UPDATE condicional: si otro proceso lo movió
+    antes (dos cierres del mismo tipo a la vez), el lote actual se revierte. El
+    UPDATE deja bloqueada la fila del cierre hasta el fin de la transacción.
+    """
+    actualizados = CierreDepreciacion.objects.filter(
+        pk=cierre.pk, periodo_en_curso=fecha, ultimo_activo=cursor_anterior,
+    ).update(actualizado=timezone.now(), **campos)
+    if actualizados != 1:
+        raise DepreciacionError("Otro proceso está cerrando este tipo de depreciación; reintenta más tarde.")
+
+
+def cerrar_periodo(cierre, fecha, chunk_size=DEPRECIACION_CHUNK_SIZE):
+    """
+    Cierra un periodo por lotes de activos (en orden de id). Cada lote se guarda en
+    su propia transacción junto con el cursor del cierre: cargos (bulk_create),
+    descuento de valor_actual (un UPDATE, solo el tipo contable) y último activo
+    procesado. Si el proceso
+    cae, el siguiente cierre retoma desde el último lote confirmado.
+    Devuelve (activos, cargos, total en céntimos) de esta ejecución.
+    """
+    tipo = cierre.tipo_depreciacion
+    if cierre.periodo_en_curso != fecha:
+        # Condicional, como _avanzar: un proceso que leyó el cierre antes de que otro
+        # empezara este periodo no debe borrar el cursor de los lotes ya confirmados
+        reiniciados = CierreDepreciacion.objects.filter(
+            pk=cierre.pk, ultimo_periodo=cierre.ultimo_periodo,
+            periodo_en_curso=cierre.periodo_en_curso, ultimo_activo=cierre.ultimo_activo,
+        ).update(periodo_en_curso=fecha, ultimo_activo=None, cargos_en_curso=0, actualizado=timezone.now())
+        if reiniciados != 1:
+            raise DepreciacionError("Otro proceso está cerrando este tipo de depreciación; reintenta más tarde.")
+        cierre.periodo_en_curso, cierre.ultimo_activo, cierre.cargos_en_curso = fecha, None, 0
+    elif cierre.ultimo_activo is not None:
+        logger.info(f"cerrar_periodo: retomando {tipo.nombre} {fecha:%Y-%m} tras el activo {cierre.ultimo_activo}.")
+
+    base = activos_depreciables(cierre.empresa_id, fecha, tipo.contable).order_by('pk')
+    campo_valor = 'valor_actual'
+    if not tipo.contable:
+        base, campo_valor = base.annotate(saldo=saldo_paralelo(tipo)), 'saldo'
+    mes_periodo = _mes_indice(fecha)
+    procesados = cargos_total = centimos_total = 0
+    while True:
+        queryset = base if cierre.ultimo_activo is None else base.filter(pk__gt=cierre.ultimo_activo)
+        with transaction.atomic():
+            ids, valor, mes_adquisicion, vida_meses = cargar_activos(queryset[:chunk_size], campo_valor)
+            if not ids:
+                break
+            centimos = calcular_cargos(valor, mes_adquisicion, vida_meses, mes_periodo, tipo.metodo, tipo.factor)
+            con_cargo = np.flatnonzero(centimos > 0)
+            # El cursor se mueve antes de insertar: un proceso desfasado falla aquí y no
+            # con un IntegrityError de cargos repetidos
+            _avanzar(cierre, fecha, cierre.ultimo_activo, ultimo_activo=ids[-1],
+                     cargos_en_curso=F('cargos_en_curso') + len(con_cargo))
+            DepreciacionActivos.objects.bulk_create([
+                DepreciacionActivos(
+                    activo_id=ids[i], tipo_depreciacion=tipo, fecha=fecha,
+                    monto=Decimal(int(centimos[i])).scaleb(-2),
+                )
+                for i in con_cargo
+            ])
+            if tipo.contable:
+                # valor_actual -= cargo del periodo, en un UPDATE con subconsulta (sin una fila por activo)
+                cargo = DepreciacionActivos.objects.filter(activo=OuterRef('pk'), tipo_depreciacion=tipo, fecha=fecha)
+                ActivoFijo.objects.filter(pk__in=[ids[i] for i in con_cargo]).update(
+                    valor_actual=F('valor_actual') - Subquery(cargo.values('monto')[:1])
+                )
+        cierre.ultimo_activo = ids[-1]
+        procesados += len(ids)
+        cargos_total += len(con_cargo)
+        centimos_total += int(centimos.sum())
+        if len(ids) < chunk_size:
+            break
+
+    _avanzar(cierre, fecha, cierre.ultimo_activo, ultimo_periodo=fecha, periodo_en_curso=None,
+             ultimo_activo=None, cargos_en_curso=0)
+    cierre.ultimo_periodo, cierre.periodo_en_curso, cierre.ultimo_activo = fecha, None, None
+    return procesados, cargos_total, centimos_total
+
+
+def depreciar(empresa_id, tipo, hasta=None, desde=None, chunk_size=DEPRECIACION_CHUNK_SIZE):
+    """
+    Cierre incremental de `tipo` (TipoDepreciacion): cierra, en orden, los periodos
+    que faltan desde su marca de agua (CierreDepreciacion) hasta `hasta` ('AAAA-MM',
+    por defecto el último mes completo). Repetirlo no hace nada si no hay periodos
+    pendientes, y un cierre interrumpido se retoma desde su último lote.
+    `desde` ('AAAA-MM') solo se usa en el primer cierre del tipo.
+    Devuelve una lista con {'periodo', 'activos', 'cargos', 'total', 'ms'} por periodo.
+    """
+    if tipo.empresa_id != empresa_id:
+        raise DepreciacionError("El tipo de depreciación no pertenece a la empresa.")
+    hasta = parse_periodo(hasta) if hasta else ultimo_mes_completo()
+    desde = parse_periodo(desde) if desde else None
+    if desde and desde > hasta:
+        raise DepreciacionError("El periodo inicial es posterior al final.")
+    cierre, _creado = CierreDepreciacion.objects.get_or_create(
+        tipo_depreciacion=tipo, defaults={'empresa_id': empresa_id},
+    )
+    cierre.tipo_depreciacion = tipo
+    if cierre.periodo_en_curso is not None and hasta < cierre.periodo_en_curso:
+        raise DepreciacionError(
+            f"Hay un cierre a medias de {cierre.periodo_en_curso:%Y-%m}: el periodo final no puede ser anterior."
+        )
+
+    resultados = []
+    periodos = periodos_pendientes(cierre, hasta, desde)
+    if not periodos:
+        return resultados
+    try:
+        for fecha in periodos:
+            start = time.perf_counter()
+            activos, cargos, centimos = cerrar_periodo(cierre, fecha, chunk_size)
+            resultado = {
+                'periodo': f'{fecha:%Y-%m}',
+                'activos': activos,
+                'cargos': cargos,
+                'total': Decimal(centimos).scaleb(-2),
+                'ms': round((time.perf_counter() - start) * 1000),
+            }
+            logger.info(f"depreciar: empresa {empresa_id}, {tipo.nombre} ({tipo.metodo}): {resultado}")
+            resultados.append(resultado)
+    finally:
+        if tipo.contable and (resultados or cierre.ultimo_activo is not None):
+            # update() no dispara señales: resumen y cachés de reportes se regeneran aquí
+            rebuild_resumen([empresa_id])
+            bump_data_version([empresa_id])
+            # Los cargos llevan la fecha de su mes: los snapshots desde ahí quedan desfasados
+            invalidar_snapshots(empresa_id, periodos[0])
+    return resultados
@@ -0,0 +1,249 @@
+# api/divisas.py
+import bisect
+import logging
+import itertools
+import threading
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Divisa, TasaCambioHistorica
+from .permissions import read_counter, bump_counter
+
+logger = logging.getLogger(__name__)
+
+# Contador que sube cuando cambia una tasa o una divisa: cada proceso recarga su tabla
+TASAS_VERSION_KEY = 'tasas_cambio_version'
+# Filas convertidas por bloque (una búsqueda numpy de tasas por bloque)
+CONVERSION_CHUNK_SIZE = 2000
+
+CENTIMOS = Decimal('0.01')
+
+
+class DivisaError(ValueError):
+    """Divisa pedida inválida o conversión imposible (se responde 400)."""
+
+
+def _ordinal(valor):
+    """Día (ordinal) de una fecha o fecha/hora; las fechas con zona se toman en hora local."""
+    if isinstance(valor, datetime) and timezone.is_aware(valor):
+        valor = timezone.localtime(valor)
+    return valor.toordinal()
+
+
+# --- HISTORIAL DE TASAS EN MEMORIA ---
+
+class HistorialTasas:
+    """
+    Tasas de una divisa ordenadas por fecha. La tasa a una fecha es la del último
+    registro en o antes de ella (bisect); antes del primero se usa el primero.
+    Sin fecha se usa la tasa actual (Divisa.tasa_cambio).
+    """
+    __slots__ = ('divisa', 'ordinales', 'tasas', '_ordinales_np')
+
+    def __init__(self, divisa, registros):
+        self.divisa = divisa
+        self.ordinales = [fecha.toordinal() for fecha, _tasa in registros]
+        self.tasas = [tasa for _fecha, tasa in registros]
+        self._ordinales_np = np.array(self.ordinales, dtype=np.int64)
+
+    def tasa(self, fecha=None):
+        """Tasa (Decimal) vigente a `fecha`."""
+        if fecha is None or not self.tasas:
+            return self.divisa.tasa_cambio
+        i = bisect.bisect_right(self.ordinales, _ordinal(fecha)) - 1
+        return self.tasas[max(i, 0)]
+
+    def indices_a(self, ordinales):
+        """
+        Posición en `tasas` de la tasa vigente a cada día de `ordinales` (array), en
+        una sola búsqueda vectorizada; -1 si la divisa no tiene historial.
+        """
+        if not self.tasas:
+            return np.full(len(ordinales), -1, dtype=np.int64)
+        i = np.searchsorted(self._ordinales_np, ordinales, side='right') - 1
+        return np.maximum(i, 0)
+
+    def tasa_en(self, indice):
+        """Tasa (Decimal) de una posición devuelta por indices_a()."""
+        return self.divisa.tasa_cambio if indice < 0 else self.tasas[indice]
+
+
+# (versión, {divisa_id: HistorialTasas}): se reemplaza entera al recargar
+_tablas = {'actual': (None, {})}
+_tablas_lock = threading.Lock()
+
+
+def _cargar_tablas():
+    registros = {}
+    filas = TasaCambioHistorica.objects.order_by('divisa_id', 'fecha').values_list('divisa_id', 'fecha', 'tasa')
+    for divisa_id, fecha, tasa in filas.iterator():
+        registros.setdefault(divisa_id, []).append((fecha, tasa))
+    return {divisa.pk: HistorialTasas(divisa, registros.get(divisa.pk, [])) for divisa in Divisa.objects.all()}
+
+
+def tablas_tasas():
+    """
+    (versión, {divisa_id: HistorialTasas}) de todas las divisas. Se guarda en el
+    proceso y solo se recarga cuando cambia TASAS_VERSION_KEY (una lectura de
+    caché por llamada), así que una conversión no consulta la BD.
+    """
+    version = read_counter(TASAS_VERSION_KEY)
+    if _tablas['actual'][0] != version:
+        with _tablas_lock:
+            if _tablas['actual'][0] != version:
+                divisas = _cargar_tablas()
+                # Los hilos que usan la tabla anterior no se ven afectados
+                _tablas['actual'] = (version, divisas)
+                logger.info(f"tablas_tasas: {len(divisas)} divisas cargadas (versión {version}).")
+    return _tablas['actual']
+
+
+def invalidar_tasas():
+    """Sube la versión de las tasas al confirmar la transacción (ver api/signals.py)."""
+    transaction.on_commit(lambda: bump_counter(TASAS_VERSION_KEY))
+
+
+def registrar_tasa(divisa, tasa, fecha=None):
+    """
+    Guarda la tasa de `divisa` vigente desde `fecha` (hoy por defecto). Si no hay
+    un registro posterior pasa a ser también la tasa actual (Divisa.tasa_cambio).
+    """
+    fecha = fecha or timezone.localdate()
+    with transaction.atomic():
+        TasaCambioHistorica.objects.update_or_create(divisa=divisa, fecha=fecha, defaults={'tasa': tasa})
+        if not TasaCambioHistorica.objects.filter(divisa=divisa, fecha__gt=fecha).exists():
+            # update(): sin la señal de Divisa, que volvería a registrar la tasa con fecha de hoy
+            Divisa.objects.filter(pk=divisa.pk).update(tasa_cambio=tasa)
+            divisa.tasa_cambio = tasa
+
+
+# --- CONVERSIÓN ---
+
+class Conversion:
+    """
+    Conversión de importes de la divisa base de una empresa (`origen`) a `destino`:
+    importe * tasa_destino(fecha) / tasa_origen(fecha). Sin destino (o con la misma
+    divisa) es la identidad y solo aporta el símbolo de los encabezados.
+    """
+
+    def __init__(self, origen=None, destino=None, tablas=None, version=None):
+        self.origen = origen
+        self.destino = destino or origen
+        self.identidad = origen is None or self.destino.pk == origen.pk
+        self.version = version
+        if not self.identidad:
+            self._origen = tablas[origen.pk]
+            self._destino = tablas[self.destino.pk]
+
+    @property
+    def simbolo(self):
+        return self.destino.simbolo if self.destino else None
+
+    @property
+    def codigo(self):
+        return self.destino.codigo if self.destino else None
+
+    @property
+    def clave(self):
+        """Parte de las claves de caché de reportes: divisa y versión de las tasas (None sin conversión)."""
+        return None if self.identidad else f'{self.codigo}:{self.version}'
+
+    def encabezado(self, texto):
+        """Encabezado de una columna de importes con el símbolo de la divisa: 'Valor (Bs.)'."""
+        return f"{texto} ({self.simbolo})" if self.simbolo else texto
+
+    def factor(self, fecha=None):
+        """Factor (Decimal) a `fecha`; sin fecha, con las tasas actuales."""
+        if self.identidad:
+            return Decimal(1)
+        return self._destino.tasa(fecha) / self._origen.tasa(fecha)
+
+    def convertir(self, valor, fecha=None):
+        """Un importe (Decimal) convertido y redondeado a céntimos; None se mantiene."""
+        if valor is None or self.identidad:
+            return valor
+        return (valor * self.factor(fecha)).quantize(CENTIMOS, rounding=ROUND_HALF_UP)
+
+    def factores(self, fechas, cache=None):
+        """
+        Factores (Decimal) a cada fecha de `fechas`; una fecha None usa las tasas
+        actuales. Las tasas vigentes salen de una búsqueda vectorizada y cada par
+        distinto de tasas se divide una sola vez (`cache`, compartible entre bloques).
+        """
+        cache = {} if cache is None else cache
+        actual = self.factor()
+        ordinales = np.array([0 if f is None else _ordinal(f) for f in fechas], dtype=np.int64)
+        pares = zip(self._destino.indices_a(ordinales).tolist(), self._origen.indices_a(ordinales).tolist())
+        factores = []
+        for ordinal, par in zip(ordinales.tolist(), pares):
+            if ordinal == 0:
+                factores.append(actual)
+                continue
+            factor = cache.get(par)
+            if factor is None:
+                factor = cache[par] = self._destino.tasa_en(par[0]) / self._origen.tasa_en(par[1])
+            factores.append(factor)
+        return factores
+
+    def convertir_filas(self, rows, montos, fecha=None, chunk_size=CONVERSION_CHUNK_SIZE):
+        """
+        Convierte las columnas `montos` (índices) de `rows` (tuplas) por bloques de
+        `chunk_size` filas: los factores de un bloque salen de una búsqueda
+        vectorizada sobre el historial (ver factores()). `fecha` es el índice de la
+        columna con la fecha de cada importe (None: tasas actuales, ej. valor_actual).
+        Cada importe se redondea en Decimal como convertir(), así la vista previa y
+        los archivos coinciden al céntimo.
+        """
+        if self.identidad or not montos:
+            yield from rows
+            return
+        rows = iter(rows)
+        actual = self.factor()
+        cache = {}
+        while True:
+            bloque = list(itertools.islice(rows, chunk_size))
+            if not bloque:
+                return
+            if fecha is None:
+                factores = itertools.repeat(actual)
+            else:
+                factores = self.factores([row[fecha] for row in bloque], cache)
+            for row, factor in zip(bloque, factores):
+                row = list(row)
+                for i in montos:
+                    if row[i] is not None:
+                        row[i] = (row[i] * factor).quantize(CENTIMOS, rounding=ROUND_HALF_UP)
+                yield tuple(row)
+
+
+def resolver_divisa(valor):
+    """Divisa por código (USD, bob...) o id, desde la tabla en memoria. Lanza DivisaError."""
+    valor = str(valor).strip()
+    _version, tablas = tablas_tasas()
+    for historial in tablas.values():
+        divisa = historial.divisa
+        if divisa.codigo.upper() == valor.upper() or str(divisa.pk) == valor.lower():
+            return divisa
+    raise DivisaError(f"Divisa desconocida: {valor!r}.")
+
+
+def conversion_para(empresa, divisa=None):
+    """
+    Conversión de los importes de `empresa` (en su divisa_base) a `divisa` (código
+    o id; vacío = sin convertir). Sin empresa (vista global) solo se puede pedir
+    sin conversión. Lanza DivisaError.
+    """
+    origen = empresa.divisa_base if empresa is not None else None
+    if not divisa:
+        return Conversion(origen)
+    destino = resolver_divisa(divisa)
+    if empresa is None:
+        raise DivisaError("Selecciona una empresa para convertir importes a otra divisa.")
+    if origen is None:
+        raise DivisaError("La empresa no tiene divisa base configurada.")
+    version, tablas = tablas_tasas()
+    return Conversion(origen, destino, tablas, version)
@@ -0,0 +1,100 @@
+# api/instrumentation.py
+import json
+import time
+import logging
+from collections import Counter
+from contextlib import ExitStack
+from django.db import connections
+
+logger = logging.getLogger('api.instrumentation')
+
+# Una consulta repetida (mismo SQL y mismos parámetros) más de este número de
+# veces en un request se reporta como duplicada.
+DUPLICATE_THRESHOLD = 2
+
+
+class QueryCollector:
+    """
+    Registra las consultas SQL ejecutadas en TODAS las bases de datos mientras está
+    activo (vía connection.execute_wrapper, así que funciona también con DEBUG=False).
+    """
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.per_alias = Counter()
+        self._signatures = Counter()
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.total_time += time.perf_counter() - start
+            self.count += 1
+            self.per_alias[context['connection'].alias] += 1
+            try:
+                self._signatures[(sql, repr(params))] += 1
+            except Exception:
+                pass
+
+    def start(self):
+        self._stack = ExitStack()
+        for conn in connections.all():
+            self._stack.enter_context(conn.execute_wrapper(self))
+        return self
+
+    def stop(self):
+        if self._stack is not None:
+            self._stack.close()
+            self._stack = None
+
+    def duplicates(self):
+        """Lista de (sql, veces) de las consultas ejecutadas más de DUPLICATE_THRESHOLD veces."""
+        return [
+            (sql, times) for (sql, _params), times in self._signatures.most_common()
+            if times > DUPLICATE_THRESHOLD
+        ]
+
+
+def resolve_budget(view_class, action):
+    """
+    Presupuesto de consultas declarado en la vista: un entero, o un dict por acción
+    con 'default' como respaldo (ej: {'list': 5, 'create': 8, 'default': 10}).
+    """
+    budget = getattr(view_class, 'query_budget', None)
+    if isinstance(budget, dict):
+        return budget.get(action, budget.get('default'))
+    return budget
+
+
+def report(request, collector, view_class, action, status, response_size, streaming=False):
+    """Emite las métricas del request como un log estructurado (JSON)."""
+    budget = resolve_budget(view_class, action) if view_class else None
+    duplicates = collector.duplicates()
+    payload = {
+        'method': request.method,
+        'path': request.path,
+        'view': view_class.__name__ if view_class else None,
+        'action': action,
+        'status': status,
+        'queries': collector.count,
+        'queries_per_db': dict(collector.per_alias),
+        'sql_time_ms': round(collector.total_time * 1000, 2),
+        'duplicate_queries': sum(times - 1 for _sql, times in duplicates),
+        'response_bytes': response_size,
+        'streaming': streaming,
+        'budget': budget,
+    }
+    over_budget = budget is not None and collector.count > budget
+    payload['over_budget'] = over_budget
+
+    if over_budget or duplicates:
+        if duplicates:
+            payload['duplicate_samples'] = [
+                {'sql': sql[:300], 'times': times} for sql, times in duplicates[:3]
+            ]
+        logger.warning("query_metrics %s", json.dumps(payload, default=str))
+    else:
+        logger.info("query_metrics %s", json.dumps(payload, default=str))
+    return payload
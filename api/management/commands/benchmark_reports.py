@@ -0,0 +1,223 @@
+# management/commands/benchmark_reports.py
+import sys
+import json
+import time
+import platform
+import resource
+import statistics
+import tracemalloc
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.models import Empresa, Empleado, ActivoFijo
+from api.report_cache import bump_data_version
+from api.report_utils import create_excel_report, create_pdf_report
+from api.management.commands.seed_data import generar_tenant, borrar_tenant
+
+# Las empresas de benchmark usan índices altos para no chocar con las de seed_data
+# (el índice forma el NIT, los usuarios y los seriales de generar_tenant).
+BENCH_INDEX_BASE = 90_000_000
+BENCH_NAME = 'Benchmark reportes {size} activos'
+DEFAULT_SIZES = '1000,10000,50000'
+METRICS = ('wall_ms', 'peak_mb', 'queries')
+# Diferencias absolutas por debajo de esto se consideran ruido aunque superen el %
+MIN_DELTA = {'wall_ms': 5.0, 'peak_mb': 1.0, 'queries': 0}
+
+
+def _consume(response):
+    """Lee la respuesta completa (archivo o streaming) y devuelve los bytes enviados."""
+    if getattr(response, 'streaming', False):
+        size = sum(len(chunk) for chunk in response.streaming_content)
+        response.close()
+        return size
+    return len(response.content)
+
+
+class Command(BaseCommand):
+    help = ('Mide los exportadores y las vistas de reportes sobre empresas de tamaño creciente: '
+            'tiempo, pico de memoria (tracemalloc) y número de consultas. Escribe los resultados en '
+            'JSON y falla si empeoran respecto a una línea base más de --threshold %. '
+            'Crea (y reutiliza) empresas sintéticas: no ejecutar en producción.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default=DEFAULT_SIZES, help='Activos por empresa, separados por comas.')
+        parser.add_argument('--scenarios', help='Limitar a estos escenarios (separados por comas).')
+        parser.add_argument('--repeat', type=int, default=3, help='Repeticiones para la mediana del tiempo.')
+        parser.add_argument('--seed', type=int, default=42, help='Semilla de los datos generados.')
+        parser.add_argument('--output', help='Archivo JSON donde escribir los resultados.')
+        parser.add_argument('--baseline', help='JSON de una ejecución anterior con el que comparar.')
+        parser.add_argument('--threshold', type=float, default=20.0,
+                            help='Empeoramiento máximo (%%) respecto a la línea base antes de fallar.')
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='Guardar estos resultados como nueva línea base (en --baseline).')
+
+    def handle(self, *args, **options):
+        sizes = sorted({int(s) for s in options['sizes'].split(',') if s.strip()})
+        scenarios = self.get_scenarios()
+        if options['scenarios']:
+            pedidos = [s.strip() for s in options['scenarios'].split(',') if s.strip()]
+            desconocidos = set(pedidos) - set(scenarios)
+            if desconocidos:
+                raise CommandError(f"Escenarios desconocidos: {', '.join(sorted(desconocidos))}. "
+                                   f"Disponibles: {', '.join(scenarios)}")
+            scenarios = {name: scenarios[name] for name in pedidos}
+
+        results = []
+        for size in sizes:
+            empresa = self.get_empresa(size, options['seed'])
+            client = self.get_client(empresa)
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n=== {empresa.nombre} ==='))
+            for name, run in scenarios.items():
+                result = self.measure(run, empresa, client, options['repeat'])
+                result.update(size=size, scenario=name)
+                results.append(result)
+                self.stdout.write(
+                    f"{name:22} {result['wall_ms']:10.1f} ms {result['peak_mb']:8.1f} MB "
+                    f"{result['queries']:5d} consultas {result['bytes']:12d} bytes"
+                )
+
+        payload = {'meta': self.get_meta(options), 'results': results}
+        if options['output']:
+            self.write_json(options['output'], payload)
+        if options['baseline'] and options['update_baseline']:
+            self.write_json(options['baseline'], payload)
+            self.stdout.write(self.style.SUCCESS(f"Línea base actualizada: {options['baseline']}"))
+        elif options['baseline']:
+            self.compare(payload, options['baseline'], options['threshold'])
+
+    # --- DATOS ---
+
+    def get_empresa(self, size, seed):
+        """Empresa sintética con `size` activos (se genera la primera vez y luego se reutiliza)."""
+        nombre = BENCH_NAME.format(size=size)
+        empresa = Empresa.objects.filter(nombre=nombre).first()
+        if empresa is not None and ActivoFijo.objects.filter(empresa=empresa).count() == size:
+            return empresa
+        indice = BENCH_INDEX_BASE + size
+        borrar_tenant(indice, empresa)
+        self.stdout.write(self.style.WARNING(f'Generando {nombre}...'))
+        opciones = {'assets': size, 'employees': 2, 'movements': 0, 'proveedores': 40,
+                    'seed': seed, 'batch_size': 5000}
+        empresa_id, _filas = generar_tenant(indice, opciones, nombre=nombre)
+        return Empresa.objects.get(pk=empresa_id)
+
+    def get_client(self, empresa):
+        """Cliente con el JWT de un empleado de la empresa: recorre middleware, auth y tenant."""
+        empleado = Empleado.objects.filter(empresa=empresa).select_related('usuario').first()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(empleado.usuario).access_token}')
+        return client
+
+    # --- ESCENARIOS ---
+
+    def get_scenarios(self):
+        """nombre -> función(empresa, client) que ejecuta el escenario y devuelve los bytes generados."""
+        def activos(empresa):
+            return ActivoFijo.objects.filter(empresa=empresa)
+
+        def post(url, data):
+            def run(empresa, client):
+                # Versión de datos nueva: las exportaciones cacheadas no cuentan
+                bump_data_version([empresa.id])
+                response = client.post(url, data, format='json')
+                if response.status_code != 200:
+                    raise CommandError(f'{url} devolvió {response.status_code}: {response.content[:200]!r}')
+                return _consume(response)
+            return run
+
+        return {
+            'excel_util': lambda empresa, client: _consume(create_excel_report(activos(empresa))),
+            'pdf_util': lambda empresa, client: _consume(create_pdf_report(activos(empresa))),
+            'query_preview': post('/api/reportes/query/', {'filters': []}),
+            'query_preview_filtro': post('/api/reportes/query/', {'filters': ['depto:TI', 'valor>=100']}),
+            'query_export_excel': post('/api/reportes/query/export/', {'filters': [], 'format': 'excel'}),
+            'query_export_pdf': post('/api/reportes/query/export/', {'filters': [], 'format': 'pdf'}),
+            'query_export_csv': post('/api/reportes/query/export/', {'filters': [], 'format': 'csv'}),
+        }
+
+    # --- MEDICIÓN ---
+
+    @override_settings(ALLOWED_HOSTS=['testserver'])
+    def measure(self, run, empresa, client, repeat):
+        """
+        Mediana del tiempo en `repeat` ejecuciones sin instrumentar, y una ejecución
+        más con tracemalloc y captura de consultas (ambas ralentizan) para el pico
+        de memoria y el número de consultas.
+        """
+        tiempos = []
+        for _ in range(max(repeat, 1)):
+            start = time.perf_counter()
+            size = run(empresa, client)
+            tiempos.append((time.perf_counter() - start) * 1000)
+
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connections['default']) as ctx:
+                run(empresa, client)
+            _current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return {
+            'wall_ms': round(statistics.median(tiempos), 1),
+            'peak_mb': round(peak / (1024 * 1024), 2),
+            'queries': len(ctx.captured_queries),
+            'bytes': size,
+        }
+
+    def get_meta(self, options):
+        # ru_maxrss: KB en Linux, bytes en macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {
+            'timestamp': timezone.now().isoformat(),
+            'vendor': connections['default'].vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'platform': platform.platform(),
+            'seed': options['seed'],
+            'repeat': options['repeat'],
+            'max_rss_mb': round(maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1),
+        }
+
+    @staticmethod
+    def write_json(path, payload):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, indent=2, ensure_ascii=False)
+
+    # --- COMPARACIÓN CON LA LÍNEA BASE ---
+
+    def compare(self, payload, baseline_path, threshold):
+        try:
+            with open(baseline_path, encoding='utf-8') as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            raise CommandError(f'No existe la línea base {baseline_path} (créala con --update-baseline).')
+        anteriores = {(r['size'], r['scenario']): r for r in baseline.get('results', [])}
+        if baseline.get('meta', {}).get('vendor') != payload['meta']['vendor']:
+            self.stdout.write(self.style.WARNING('La línea base se midió con otro motor de BD.'))
+
+        regresiones = []
+        for result in payload['results']:
+            anterior = anteriores.get((result['size'], result['scenario']))
+            if anterior is None:
+                continue
+            for metric in METRICS:
+                antes, ahora = anterior.get(metric), result[metric]
+                if antes is None:
+                    continue
+                if ahora - antes > MIN_DELTA[metric] and ahora > antes * (1 + threshold / 100):
+                    cambio = (ahora / antes - 1) * 100 if antes else float('inf')
+                    regresiones.append(
+                        f"{result['scenario']} ({result['size']} activos) {metric}: {antes} -> {ahora} (+{cambio:.0f}%)"
+                    )
+
+        if regresiones:
+            for linea in regresiones:
+                self.stderr.write(self.style.ERROR(linea))
+            raise CommandError(f'{len(regresiones)} regresiones de más del {threshold:g}% respecto a {baseline_path}.')
+        self.stdout.write(self.style.SUCCESS(f'Sin regresiones de más del {threshold:g}% respecto a {baseline_path}.'))
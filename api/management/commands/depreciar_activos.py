@@ -0,0 +1,52 @@
+# management/commands/depreciar_activos.py
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Empresa, TipoDepreciacion
+from api.depreciacion import depreciar, DepreciacionError
+
+
+class Command(BaseCommand):
+    help = ('Cierre incremental de depreciación: para cada empresa con el tipo indicado, cierra los '
+            'periodos que faltan desde el último cierre (CierreDepreciacion) hasta el periodo dado. '
+            'Es seguro repetirlo (p. ej. cada noche) y retoma un cierre interrumpido.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('periodo', nargs='?',
+                            help='Último periodo a cerrar (AAAA-MM). Por defecto, el último mes completo.')
+        parser.add_argument('--tipo', required=True,
+                            help='Nombre del tipo de depreciación (TipoDepreciacion) de cada empresa.')
+        parser.add_argument('--desde', help='Primer periodo (AAAA-MM) si el tipo aún no tiene cierres.')
+        parser.add_argument('--empresa', action='append', dest='empresas', metavar='EMPRESA_ID',
+                            help='Limitar a una empresa (se puede repetir). Por defecto, todas las que '
+                                 'tengan un tipo con ese nombre.')
+
+    def handle(self, *args, **options):
+        tipos = TipoDepreciacion.objects.filter(nombre=options['tipo'])
+        if options['empresas']:
+            tipos = tipos.filter(empresa_id__in=options['empresas'])
+            sin_tipo = set(map(str, options['empresas'])) - {str(t.empresa_id) for t in tipos}
+            if sin_tipo:
+                raise CommandError(f"Empresas sin el tipo '{options['tipo']}': {', '.join(sorted(sin_tipo))}")
+        if not tipos:
+            raise CommandError(f"No hay empresas con el tipo de depreciación '{options['tipo']}'.")
+
+        errores = 0
+        nombres = dict(Empresa.objects.filter(pk__in=[t.empresa_id for t in tipos]).values_list('id', 'nombre'))
+        for tipo in tipos:
+            nombre = nombres[tipo.empresa_id]
+            try:
+                periodos = depreciar(tipo.empresa_id, tipo, hasta=options['periodo'], desde=options['desde'])
+            except DepreciacionError as e:
+                errores += 1
+                self.stderr.write(self.style.ERROR(f"{nombre}: {e}"))
+                continue
+            if not periodos:
+                self.stdout.write(f"{nombre}: sin periodos pendientes.")
+            for r in periodos:
+                self.stdout.write(
+                    f"{nombre} {r['periodo']}: {r['cargos']} cargos de {r['activos']} activos, "
+                    f"total {r['total']} en {r['ms']} ms"
+                )
+        if errores:
+            raise CommandError(f'{errores} empresas no se pudieron depreciar.')
+        self.stdout.write(self.style.SUCCESS('Cierre de depreciación completado.'))
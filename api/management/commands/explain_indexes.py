@@ -0,0 +1,148 @@
+# management/commands/explain_indexes.py
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, router, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from api.models import (
+    Empresa, ActivoFijo, Notificacion, Log, MovimientoInventario, RevalorizacionActivo
+)
+
+# Índices que sirven a las consultas calientes (migraciones 0002 y 0004).
+# El plan "antes" se obtiene borrando solo estos índices (los de las FK se quedan,
+# como en 0001) dentro de una transacción que luego se deshace. DROP INDEX toma un
+# bloqueo exclusivo sobre la tabla mientras dura la medición: hace falta --allow-ddl.
+HOT_PATH_INDEXES = {
+    ActivoFijo: ['activo_emp_fecha_idx', 'activo_emp_fecha_valor_cov'],
+    Notificacion: ['notif_dest_leido_ts_idx', 'notif_dest_no_leidas_idx'],
+    Log: ['log_tenant_ts_idx'],
+    MovimientoInventario: ['movinv_inv_fecha_idx'],
+    RevalorizacionActivo: ['reval_activo_fecha_idx'],
+}
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Muestra el plan (EXPLAIN) y el tiempo de las consultas calientes de un tenant '
+            'con y sin los índices compuestos. Conviene ejecutarlo sobre un tenant grande.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', help='ID de la empresa (por defecto, la que tenga más activos).')
+        parser.add_argument('--repeat', type=int, default=20, help='Repeticiones para medir el tiempo medio.')
+        parser.add_argument('--analyze', action='store_true',
+                            help='EXPLAIN ANALYZE (solo PostgreSQL): ejecuta la consulta y muestra tiempos reales.')
+        parser.add_argument('--allow-ddl', action='store_true',
+                            help='Mide el "antes" borrando los índices dentro de una transacción deshecha '
+                                 '(toma bloqueos exclusivos: no usar en producción).')
+
+    def handle(self, *args, **options):
+        empresa = self.get_empresa(options['empresa'])
+        self.stdout.write(self.style.NOTICE(
+            f'Empresa: {empresa.nombre} ({empresa.activos_fijos.count()} activos)'
+        ))
+
+        for nombre, alias, build in self.get_queries(empresa):
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n=== {nombre} [{alias}] ==='))
+            # El "antes" va primero: SQLite reutiliza el plan de una sentencia ya preparada
+            if not options['allow_ddl']:
+                self.stdout.write(self.style.WARNING('--- ANTES: omitido (usa --allow-ddl)'))
+            else:
+                try:
+                    antes = self.measure(build, alias, options, without_indexes=True)
+                except OperationalError as e:
+                    # lock_timeout: la tabla está en uso, no se espera detrás de otras transacciones
+                    self.stdout.write(self.style.ERROR(f'--- ANTES: no se pudo borrar los índices ({e})'))
+                else:
+                    self.stdout.write(self.style.WARNING(f'--- ANTES (sin índices) {antes[1]:.3f} ms'))
+                    self.stdout.write(antes[0])
+            despues = self.measure(build, alias, options, without_indexes=False)
+            self.stdout.write(self.style.SUCCESS(f'--- DESPUÉS {despues[1]:.3f} ms'))
+            self.stdout.write(despues[0])
+
+    def get_empresa(self, empresa_id):
+        if empresa_id:
+            empresa = Empresa.objects.filter(pk=empresa_id).first()
+        else:
+            empresa = Empresa.objects.alias(n=Count('activos_fijos')).order_by('-n').first()
+        if empresa is None:
+            raise CommandError('No hay empresas. Ejecuta primero seed_data.')
+        return empresa
+
+    def get_queries(self, empresa):
+        """(nombre, alias de BD, función que construye el queryset) de cada acceso caliente."""
+        hoy = timezone.now().date()
+        usuario_id = empresa.empleados.values_list('usuario_id', flat=True).first()
+        inventario_id = empresa.inventarios.values_list('id', flat=True).first()
+        activo_id = empresa.activos_fijos.values_list('id', flat=True).first()
+
+        return [
+            ('Reporte / filtro de activos por fecha de adquisición', 'default', lambda: (
+                ActivoFijo.objects.filter(
+                    empresa=empresa, fecha_adquisicion__gte=hoy - timedelta(days=365 * 3),
+                    fecha_adquisicion__lte=hoy,
+                ).order_by('-fecha_adquisicion', '-id')[:50]
+            )),
+            ('Notificaciones del usuario (campanita)', 'default', lambda: (
+                Notificacion.objects.filter(destinatario_id=usuario_id).order_by('leido', '-timestamp', '-id')[:50]
+            )),
+            ('Notificaciones no leídas', 'default', lambda: (
+                Notificacion.objects.filter(destinatario_id=usuario_id, leido=False).order_by('-timestamp')[:20]
+            )),
+            ('Bitácora de la empresa', 'log_saas', lambda: (
+                Log.objects.filter(tenant_id=empresa.id).order_by('-timestamp', '-id')[:50]
+            )),
+            ('Kardex de un inventario por rango de fechas', 'default', lambda: (
+                MovimientoInventario.objects.filter(
+                    inventario_id=inventario_id, fecha__gte=hoy - timedelta(days=90)
+                ).order_by('-fecha', '-id')[:50]
+            )),
+            ('Historial de revalorizaciones de un activo', 'default', lambda: (
+                RevalorizacionActivo.objects.filter(activo_id=activo_id).order_by('-fecha', '-id')[:50]
+            )),
+        ]
+
+    def measure(self, build, alias, options, without_indexes):
+        """Devuelve (plan, ms medios). Sin índices, todo ocurre en una transacción deshecha."""
+        result = {}
+        try:
+            with transaction.atomic(using=alias):
+                if without_indexes:
+                    self.drop_indexes(alias)
+                result['plan'] = self.explain(build(), options)
+                result['ms'] = self.time_query(build, options['repeat'])
+                if without_indexes:
+                    raise _Rollback()
+        except _Rollback:
+            pass
+        return result['plan'], result['ms']
+
+    def drop_indexes(self, alias):
+        connection = connections[alias]
+        names = [
+            name for model, model_names in HOT_PATH_INDEXES.items()
+            if router.db_for_write(model) == alias for name in model_names
+        ]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Si la tabla está ocupada se falla enseguida en vez de encolar el bloqueo
+                cursor.execute("SET LOCAL lock_timeout = '2s'")
+            for name in names:
+                cursor.execute(f'DROP INDEX IF EXISTS {connection.ops.quote_name(name)}')
+
+    def explain(self, queryset, options):
+        if options['analyze'] and connections[queryset.db].vendor == 'postgresql':
+            return queryset.explain(analyze=True, buffers=True)
+        return queryset.explain()
+
+    @staticmethod
+    def time_query(build, repeat):
+        start = time.perf_counter()
+        for _ in range(max(repeat, 1)):
+            list(build())
+        return (time.perf_counter() - start) * 1000 / max(repeat, 1)
@@ -0,0 +1,101 @@
+# management/commands/explain_report_filters.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count, Q
+
+from api.models import Empresa, ActivoFijo
+from api.report_query import apply_filters, FilterSyntaxError
+
+# Filtros de ejemplo: búsquedas por tablas de consulta, a-muchos y combinaciones
+DEFAULT_FILTERS = [
+    ['depto:TI'],
+    ['estado=En Uso', 'valor>=500'],
+    ['categoria:[laptop, monitor]', 'NOT proveedor:dell'],
+    ['depto:TI OR depto:Finanzas', 'fecha_adq:2023-01-01..'],
+    ['mantenimiento=pendiente'],
+]
+
+# Texto libre tal como lo resolvía la vista antes del índice de búsqueda:
+# icontains en OR sobre cada tabla relacionada y distinct() sobre el resultado.
+LEGACY_TEXT_FIELDS = ['nombre', 'codigo_interno', 'departamento__nombre', 'item_catalogo__nombre',
+                      'estado__nombre', 'proveedor__nombre']
+
+
+class Command(BaseCommand):
+    help = ('Compara el plan (EXPLAIN) y el tiempo de los filtros del reporte dinámico con joins + '
+            'distinct() frente a subconsultas sobre las tablas de búsqueda del tenant. '
+            'Conviene ejecutarlo sobre un tenant grande (ej. 100k activos de seed_data).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', help='ID de la empresa (por defecto, la que tenga más activos).')
+        parser.add_argument('--filtro', action='append', dest='filtros', metavar='EXPRESION',
+                            help='Expresión a medir (se puede repetir; cada una se mide por separado).')
+        parser.add_argument('--texto', default='laptop', help='Texto libre para comparar con la búsqueda antigua.')
+        parser.add_argument('--repeat', type=int, default=5, help='Repeticiones para medir el tiempo medio.')
+        parser.add_argument('--analyze', action='store_true',
+                            help='EXPLAIN ANALYZE (solo PostgreSQL): ejecuta la consulta y muestra tiempos reales.')
+
+    def handle(self, *args, **options):
+        empresa = self.get_empresa(options['empresa'])
+        base = ActivoFijo.objects.filter(empresa=empresa)
+        self.stdout.write(self.style.NOTICE(f'Empresa: {empresa.nombre} ({base.count()} activos)'))
+
+        casos = [[f] for f in options['filtros']] if options['filtros'] else DEFAULT_FILTERS
+        for filtros in casos:
+            try:
+                apply_filters(base, filtros, empresa.id, subqueries=False)
+            except FilterSyntaxError as e:
+                raise CommandError(f'{filtros}: {e}')
+            # apply_filters se mide dentro del tiempo: con subconsultas resuelve ids al aplicarse
+            self.compare(' AND '.join(filtros),
+                         lambda f=filtros: apply_filters(base, f, empresa.id, subqueries=False),
+                         lambda f=filtros: apply_filters(base, f, empresa.id), options)
+
+        texto = options['texto']
+        antigua = Q()
+        for campo in LEGACY_TEXT_FIELDS:
+            antigua |= Q(**{f'{campo}__icontains': texto})
+        self.compare(f'texto libre "{texto}"', lambda: base.filter(antigua).distinct(),
+                     lambda: apply_filters(base, [texto], empresa.id), options)
+
+    def get_empresa(self, empresa_id):
+        if empresa_id:
+            empresa = Empresa.objects.filter(pk=empresa_id).first()
+        else:
+            empresa = Empresa.objects.alias(n=Count('activos_fijos')).order_by('-n').first()
+        if empresa is None:
+            raise CommandError('No hay empresas. Ejecuta primero seed_data.')
+        return empresa
+
+    def compare(self, nombre, antes, despues, options):
+        """
+        Una página del preview (100 filas por fecha) y el conteo, con cada estrategia.
+        antes/despues construyen el queryset: se llaman en cada repetición.
+        """
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n=== {nombre} ==='))
+        for etiqueta, build, style in (('ANTES (joins)', antes, self.style.WARNING),
+                                       ('DESPUÉS (subconsultas)', despues, self.style.SUCCESS)):
+            filas, ms = self.time_query(lambda: self.pagina_y_conteo(build()), options['repeat'])
+            self.stdout.write(style(f'--- {etiqueta}: {filas[1]} filas, {ms:.3f} ms'))
+            self.stdout.write(self.explain(self.pagina(build()), options))
+
+    @staticmethod
+    def pagina(queryset):
+        return queryset.order_by('-fecha_adquisicion', '-id').values_list('id', flat=True)[:100]
+
+    def pagina_y_conteo(self, queryset):
+        return len(list(self.pagina(queryset))), queryset.count()
+
+    def explain(self, queryset, options):
+        if options['analyze'] and connections[queryset.db].vendor == 'postgresql':
+            return queryset.explain(analyze=True, buffers=True)
+        return queryset.explain()
+
+    @staticmethod
+    def time_query(run, repeat):
+        start = time.perf_counter()
+        for _ in range(max(repeat, 1)):
+            result = run()
+        return result, (time.perf_counter() - start) * 1000 / max(repeat, 1)
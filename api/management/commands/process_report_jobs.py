@@ -0,0 +1,92 @@
+# management/commands/process_report_jobs.py
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api.report_jobs import claim_jobs, requeue_stale, purge_expired, mark_failed, run_job
+
+# Cada cuánto se revisan trabajos huérfanos y archivos caducados
+MAINTENANCE_INTERVAL = 60  # segundos
+
+
+class Command(BaseCommand):
+    help = ('Procesa la cola de exportaciones de reportes (ReporteJob) con un pool de procesos. '
+            'Pensado para ejecutarse como servicio aparte de gunicorn.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Procesos de render en paralelo (por defecto, uno por núcleo).')
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help='Segundos entre consultas a la cola cuando no hay trabajo.')
+        parser.add_argument('--max-tasks-per-child', type=int, default=50,
+                            help='Reinicia cada proceso tras N reportes (acota la memoria).')
+        parser.add_argument('--once', action='store_true',
+                            help='Vaciar la cola y terminar (útil en cron o pruebas).')
+
+    def handle(self, *args, **options):
+        workers = max(options['workers'], 1)
+        self.stdout.write(self.style.NOTICE(f'Procesando reportes con {workers} procesos...'))
+        while True:
+            try:
+                self.run_pool(workers, options)
+                break
+            except BrokenProcessPool:
+                # Un proceso murió (OOM, señal...): sus trabajos ya se marcaron con error
+                self.stderr.write(self.style.ERROR('El pool de procesos se rompió; se vuelve a crear.'))
+
+    def run_pool(self, workers, options):
+        # 'spawn': cada proceso arranca Django desde cero y abre sus propias
+        # conexiones (con fork heredaría los sockets de la BD del padre).
+        # La conexión del padre se cierra antes de crear los procesos.
+        connections.close_all()
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+            max_tasks_per_child=options['max_tasks_per_child'],
+        )
+        running = {}
+        next_maintenance = 0
+        try:
+            while True:
+                if time.monotonic() >= next_maintenance:
+                    self.maintenance()
+                    next_maintenance = time.monotonic() + MAINTENANCE_INTERVAL
+
+                for job_id, intento in claim_jobs(workers - len(running)):
+                    running[pool.submit(run_job, job_id, intento)] = (job_id, intento)
+
+                if not running:
+                    if options['once']:
+                        return
+                    time.sleep(options['interval'])
+                    continue
+
+                done, _pending = wait(running, timeout=options['interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id, intento = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        mark_failed(job_id, error, intento)
+                        self.stderr.write(self.style.ERROR(f'Reporte {job_id}: {error}'))
+                        if isinstance(error, BrokenProcessPool):
+                            for other_id, other_intento in running.values():
+                                mark_failed(other_id, error, other_intento)
+                            running.clear()
+                            raise error
+                    else:
+                        self.stdout.write(f'Reporte {job_id} procesado.')
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def maintenance(self):
+        requeued = requeue_stale()
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'{requeued} trabajos huérfanos devueltos a la cola.'))
+        purge_expired()
@@ -0,0 +1,16 @@
+# management/commands/rebuild_resumen_activos.py
+from django.core.management.base import BaseCommand
+from api.resumen import rebuild_resumen
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye la tabla resumen de activos (ResumenActivos). Útil tras cargas masivas (bulk_create/update).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', action='append', dest='empresas', metavar='EMPRESA_ID',
+                            help='Limitar a una empresa (se puede repetir).')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.NOTICE('Reconstruyendo el resumen de activos...'))
+        total = rebuild_resumen(options['empresas'])
+        self.stdout.write(self.style.SUCCESS(f'Proceso completado. Filas de resumen: {total}'))
@@ -0,0 +1,16 @@
+# management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand
+from api.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de activos (ActivoBusqueda). Útil tras cargas masivas (bulk_create).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', action='append', dest='empresas', metavar='EMPRESA_ID',
+                            help='Limitar a una empresa (se puede repetir).')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.NOTICE('Reconstruyendo el índice de búsqueda de activos...'))
+        total = rebuild_index(options['empresas'])
+        self.stdout.write(self.style.SUCCESS(f'Proceso completado. Documentos indexados: {total}'))
@@ -0,0 +1,24 @@
+# management/commands/reconcile_usage.py
+from django.core.management.base import BaseCommand
+from api.quotas import reconcile_usage
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los contadores de uso de las suscripciones (usuarios_usados, activos_usados) con los conteos reales.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', action='append', dest='empresas', metavar='EMPRESA_ID',
+                            help='Limitar a una empresa (se puede repetir).')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Solo informar de las diferencias, sin corregirlas.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.NOTICE('Verificando contadores de uso de las suscripciones...'))
+        corrected = reconcile_usage(options['empresas'], dry_run=options['dry_run'])
+
+        for empresa_id, diff in corrected:
+            cambios = ', '.join(f'{field}: {antes} -> {despues}' for field, (antes, despues) in diff.items())
+            self.stdout.write(self.style.WARNING(f'  Empresa {empresa_id}: {cambios}'))
+
+        verbo = 'con diferencias' if options['dry_run'] else 'corregidas'
+        self.stdout.write(self.style.SUCCESS(f'\nProceso completado. Suscripciones {verbo}: {len(corrected)}'))
@@ -0,0 +1,51 @@
+# management/commands/registrar_tasas.py
+import csv
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.divisas import registrar_tasa, resolver_divisa, DivisaError
+
+
+class Command(BaseCommand):
+    help = ('Registra tasas de cambio en el historial (TasaCambioHistorica), en la misma referencia '
+            'que Divisa.tasa_cambio. Una tasa sin registros posteriores pasa a ser la actual. '
+            'Acepta una tasa suelta o un CSV con columnas fecha,codigo,tasa para cargar históricos.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('codigo', nargs='?', help='Código de la divisa (USD, BOB...).')
+        parser.add_argument('tasa', nargs='?', help='Tasa respecto a la divisa de referencia.')
+        parser.add_argument('--fecha', help='Fecha desde la que rige la tasa (AAAA-MM-DD). Por defecto, hoy.')
+        parser.add_argument('--archivo', help='CSV con encabezado fecha,codigo,tasa.')
+
+    def handle(self, *args, **options):
+        if options['archivo']:
+            with open(options['archivo'], newline='', encoding='utf-8-sig') as f:
+                filas = [(fila['fecha'], fila['codigo'], fila['tasa']) for fila in csv.DictReader(f)]
+        elif options['codigo'] and options['tasa']:
+            filas = [(options['fecha'], options['codigo'], options['tasa'])]
+        else:
+            raise CommandError('Indica CODIGO y TASA, o --archivo.')
+
+        # En orden de fecha: la última tasa de cada divisa queda como la actual
+        registros = sorted((self.parse(*fila) for fila in filas), key=lambda r: r[0] or date.max)
+        with transaction.atomic():
+            for fecha, divisa, tasa in registros:
+                registrar_tasa(divisa, tasa, fecha)
+        self.stdout.write(self.style.SUCCESS(f'{len(registros)} tasas registradas.'))
+
+    @staticmethod
+    def parse(fecha, codigo, tasa):
+        try:
+            divisa = resolver_divisa(codigo)
+            tasa = Decimal(str(tasa).strip())
+            fecha = date.fromisoformat(fecha.strip()) if fecha else None
+        except DivisaError as e:
+            raise CommandError(str(e))
+        except (InvalidOperation, ValueError):
+            raise CommandError(f'Fila inválida: {fecha}, {codigo}, {tasa}')
+        if not tasa.is_finite() or tasa <= 0:
+            raise CommandError(f'Tasa inválida para {codigo}: {tasa}')
+        return fecha, divisa, tasa
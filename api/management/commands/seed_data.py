@@ -1,7 +1,16 @@
 # -*- coding: utf-8 -*-
-import uuid
+import time
+import random
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.apps import apps
 from django.core.management.base import BaseCommand
-from django.db import transaction
+from django.core.management.color import no_style
+from django.db import transaction, connections, router
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import timedelta
@@ -11,57 +20,294 @@ from decimal import Decimal
 from api.models import (
     Empresa, Empleado, Departamento, Cargo, Roles, Permisos,
     Divisa, Estado, Ubicacion, Proveedor, ActivoFijo, Presupuesto,
-    Suscripcion, Mantenimiento, Notificacion, ItemCatalogo, OrdenesCompra,
-    DetalleCompra, PartidasPresupuestarias, Inventario, MovimientoInventario,
-    TipoDepreciacion, DepreciacionActivos, DisposicionActivos, Impuestos, Log
+    Suscripcion, ItemCatalogo, OrdenesCompra, DetalleCompra,
+    PartidasPresupuestarias, Inventario, MovimientoInventario, Impuestos
 )
+from api.quotas import reconcile_usage
+from api.search import rebuild_index
+from api.resumen import rebuild_resumen
+from api.report_cache import bump_data_version
 
 PASSWORD = "admin123"
 
+# --- DATOS SINTÉTICOS (--tenants) ---
+# Distribuciones aproximadas a las de producción: pocos departamentos y
+# proveedores concentran la mayoría de activos (pesos 1/k), la mayoría de
+# activos están "En Uso" y las compras recientes son más frecuentes.
+ESTADOS_PESOS = [('En Uso', 70), ('Nuevo', 10), ('En Mantenimiento', 8), ('De Baja', 12)]
+DEPARTAMENTOS = ['TI', 'Finanzas', 'Operaciones', 'Recursos Humanos', 'Logística', 'Ventas',
+                 'Marketing', 'Producción', 'Legal', 'Administración']
+CARGOS = ['Gerente', 'Analista', 'Técnico', 'Asistente', 'Supervisor', 'Auxiliar']
+UBICACIONES = ['Oficina Central', 'Almacén Norte', 'Almacén Sur', 'Sucursal Centro', 'Planta']
+# (nombre, tipo, precio mínimo, precio máximo, vida útil en años)
+CATALOGO = [
+    ('Laptop Dell Latitude', 'Equipo de Computación', 700, 2200, 3),
+    ('Laptop Lenovo ThinkPad', 'Equipo de Computación', 650, 2000, 3),
+    ('Monitor LG 27"', 'Equipo de Computación', 150, 450, 4),
+    ('Impresora HP LaserJet', 'Equipo de Computación', 200, 900, 4),
+    ('Servidor Dell PowerEdge', 'Equipo de Computación', 3000, 12000, 5),
+    ('Switch Cisco 48p', 'Redes', 800, 4000, 5),
+    ('Router MikroTik', 'Redes', 100, 600, 5),
+    ('Silla Ergonómica', 'Mobiliario', 120, 900, 8),
+    ('Escritorio Modular', 'Mobiliario', 200, 800, 10),
+    ('Archivador Metálico', 'Mobiliario', 90, 350, 10),
+    ('Aire Acondicionado Split', 'Equipos', 400, 1500, 7),
+    ('Proyector Epson', 'Equipos', 300, 1200, 5),
+    ('Camioneta Toyota Hilux', 'Vehículos', 25000, 48000, 5),
+    ('Montacargas Eléctrico', 'Maquinaria', 9000, 30000, 10),
+    ('Generador Eléctrico', 'Maquinaria', 3000, 15000, 10),
+]
+NOMBRES = ['Ana', 'Luis', 'María', 'Carlos', 'Lucía', 'Jorge', 'Sofía', 'Diego', 'Valeria', 'Andrés',
+           'Camila', 'Mateo', 'Paola', 'Ricardo', 'Daniela', 'Fernando', 'Gabriela', 'Miguel']
+APELLIDOS = ['Gómez', 'Pérez', 'Rodríguez', 'Fernández', 'López', 'Martínez', 'Sánchez', 'Romero',
+             'Torres', 'Flores', 'Vargas', 'Rojas', 'Mendoza', 'Quispe', 'Mamani', 'Gutiérrez']
+ANTIGUEDAD_MAX_DIAS = 365 * 10
+MOVIMIENTOS_DIAS = 365 * 2
+
+
+def _pesos_zipf(n):
+    return [1 / (k + 1) for k in range(n)]
+
+
+@contextmanager
+def _sin_auto_now_add(model, field_name):
+    """bulk_create respeta auto_now_add: se desactiva para poder repartir las fechas."""
+    field = model._meta.get_field(field_name)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def _por_lotes(generador, batch_size):
+    lote = []
+    for obj in generador:
+        lote.append(obj)
+        if len(lote) >= batch_size:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def borrar_usuarios(usuarios):
+    """
+    Borra el queryset `usuarios`. No se usa .delete(): el collector de Django
+    intentaría poner a NULL Log.usuario en 'default', pero Log vive en log_saas.
+    Antes se borran las filas de 'default' que referencian a esos usuarios
+    (admin, grupos, tokens y las de la app que queden); la bitácora se conserva.
+    """
+    for rel in User._meta.related_objects:
+        model = rel.related_model
+        if router.db_for_write(model) == 'default' and not rel.many_to_many:
+            model._base_manager.filter(**{f'{rel.field.name}__in': usuarios}).delete()
+    for through in (User.groups.through, User.user_permissions.through):
+        through.objects.filter(user__in=usuarios).delete()
+    usuarios._raw_delete(usuarios.db)
+
+
+def usuarios_de_tenant(indice):
+    """Usuarios creados por generar_tenant(indice) (los empleados t<indice>.empNNNNNN)."""
+    return User.objects.filter(username__startswith=f't{indice:03d}.emp')
+
+
+def borrar_tenant(indice, empresa=None):
+    """
+    Deshace generar_tenant(indice): borra la empresa (si se indica) y sus usuarios,
+    que no cuelgan de ella y harían chocar los nombres al volver a generarla.
+    """
+    with transaction.atomic():
+        if empresa is not None:
+            # Activos y compras protegen Estado/ItemCatalogo: se borran antes que la empresa
+            ActivoFijo.objects.filter(empresa=empresa).delete()
+            DetalleCompra.objects.filter(empresa=empresa).delete()
+            empresa.delete()
+        borrar_usuarios(usuarios_de_tenant(indice))
+
+
+def generar_tenant(indice, opciones, nombre=None):
+    """
+    Genera una empresa sintética completa con bulk_create por lotes. Es una
+    función de módulo para poder ejecutarse en un proceso del pool (--workers).
+    El generador aleatorio depende solo de (--seed, índice): el resultado es el
+    mismo con cualquier número de procesos. Devuelve (empresa_id, filas creadas).
+    """
+    rng = random.Random(f"{opciones['seed']}:{indice}")
+    batch = opciones['batch_size']
+    hoy = timezone.now().date()
+    creadas = 0
+
+    with transaction.atomic():
+        empresa = Empresa.objects.create(
+            nombre=nombre or f'Empresa Sintética {indice:03d}', nit=f'9{indice:08d}',
+            divisa_base=Divisa.objects.filter(codigo='BOB').first(),
+        )
+        Suscripcion.objects.create(
+            empresa=empresa, plan='empresarial', estado='activa', fecha_fin=hoy + timedelta(days=365),
+            max_usuarios=opciones['employees'] + 10, max_activos=opciones['assets'] + 1000,
+        )
+        estados = Estado.objects.bulk_create([Estado(empresa=empresa, nombre=n) for n, _p in ESTADOS_PESOS])
+        deptos = Departamento.objects.bulk_create([Departamento(empresa=empresa, nombre=n) for n in DEPARTAMENTOS])
+        cargos = Cargo.objects.bulk_create([Cargo(empresa=empresa, nombre=n) for n in CARGOS])
+        ubicaciones = Ubicacion.objects.bulk_create([Ubicacion(empresa=empresa, nombre=n) for n in UBICACIONES])
+        items = ItemCatalogo.objects.bulk_create([
+            ItemCatalogo(empresa=empresa, nombre=n, tipo_item=t) for n, t, *_r in CATALOGO
+        ])
+        proveedores = Proveedor.objects.bulk_create([
+            Proveedor(empresa=empresa, nombre=f'Proveedor {k + 1:02d} S.R.L.', nit=f'{rng.randrange(10**8, 10**9)}')
+            for k in range(opciones['proveedores'])
+        ])
+
+        # Empleados: un único hash de contraseña para todos (make_password es lento a propósito)
+        password = make_password(PASSWORD)
+        prefijo = f't{indice:03d}'
+        for lote in _por_lotes((
+            User(username=f'{prefijo}.emp{k:06d}', password=password, first_name=rng.choice(NOMBRES),
+                 last_name=rng.choice(APELLIDOS), email=f'{prefijo}.emp{k:06d}@example.com')
+            for k in range(opciones['employees'])
+        ), batch):
+            User.objects.bulk_create(lote)
+            creadas += len(lote)
+        usuarios = usuarios_de_tenant(indice).order_by('username').values_list('id', 'last_name')
+        pesos_deptos = _pesos_zipf(len(deptos))
+        for lote in _por_lotes((
+            Empleado(
+                usuario_id=user_id, empresa=empresa, ci=str(rng.randrange(10**6, 10**7)),
+                apellido_p=apellido, apellido_m=rng.choice(APELLIDOS),
+                sueldo=Decimal(rng.randrange(3000, 20000)), cargo=rng.choice(cargos),
+                departamento=rng.choices(deptos, pesos_deptos)[0],
+            )
+            for user_id, apellido in usuarios.iterator()
+        ), batch):
+            Empleado.objects.bulk_create(lote)
+            creadas += len(lote)
+
+        # Activos
+        pesos_estados = [p for _n, p in ESTADOS_PESOS]
+        pesos_proveedores = _pesos_zipf(len(proveedores))
+
+        def activos():
+            for n in range(opciones['assets']):
+                i = rng.randrange(len(CATALOGO))
+                nombre, _tipo, minimo, maximo, vida_util = CATALOGO[i]
+                dias = int(rng.triangular(0, ANTIGUEDAD_MAX_DIAS, 0))  # más compras recientes
+                # Valor de compra depreciado linealmente hasta un 10% residual
+                usado = min(dias / 365 / vida_util, 1)
+                valor = Decimal(rng.uniform(minimo, maximo) * (1 - 0.9 * usado)).quantize(Decimal('0.01'))
+                yield ActivoFijo(
+                    empresa=empresa, nombre=f'{nombre} #{n + 1}', codigo_interno=f'{prefijo.upper()}-{n + 1:07d}',
+                    serial=f'SN{indice:03d}{n + 1:08d}' if rng.random() < 0.7 else None,
+                    fecha_adquisicion=hoy - timedelta(days=dias), valor_actual=valor, vida_util=vida_util,
+                    item_catalogo=items[i], departamento=rng.choices(deptos, pesos_deptos)[0],
+                    estado=rng.choices(estados, pesos_estados)[0],
+                    proveedor=rng.choices(proveedores, pesos_proveedores)[0] if rng.random() < 0.85 else None,
+                )
+
+        for lote in _por_lotes(activos(), batch):
+            ActivoFijo.objects.bulk_create(lote)
+            creadas += len(lote)
+
+        # Inventario: una compra por ítem y un inventario por (ítem, ubicación)
+        presupuesto = Presupuesto.objects.create(departamento=deptos[0], monto=Decimal('1000000.00'), fecha=hoy)
+        partida = PartidasPresupuestarias.objects.create(empresa=empresa, presupuesto=presupuesto, nombre='Compras', fecha=hoy)
+        orden = OrdenesCompra.objects.create(empresa=empresa, proveedor=proveedores[0], estado='COMPLETADA',
+                                             fecha_inicio=hoy - timedelta(days=MOVIMIENTOS_DIAS))
+        detalles = DetalleCompra.objects.bulk_create([
+            DetalleCompra(empresa=empresa, orden_compra=orden, partida=partida, item=item,
+                          cantidad=100, precio_unitario=Decimal(CATALOGO[i][2]))
+            for i, item in enumerate(items)
+        ])
+        inventarios = Inventario.objects.bulk_create([
+            Inventario(empresa=empresa, ubicacion=ubicacion, item_catalogo=detalle.item, detalle_compra=detalle)
+            for detalle in detalles for ubicacion in ubicaciones
+        ])
+        saldos = [0] * len(inventarios)
+
+        def movimientos():
+            for _n in range(opciones['movements']):
+                k = rng.randrange(len(inventarios))
+                # Se entra antes de salir: una salida nunca deja el saldo negativo
+                tipo = 'ENTRADA' if saldos[k] <= 0 else rng.choices(('ENTRADA', 'SALIDA', 'AJUSTE'), (45, 45, 10))[0]
+                cantidad = rng.randint(1, 20) if tipo == 'ENTRADA' else -rng.randint(1, min(saldos[k], 20))
+                saldos[k] += cantidad
+                yield MovimientoInventario(
+                    inventario=inventarios[k], tipo_movimiento=tipo, cantidad=cantidad,
+                    fecha=hoy - timedelta(days=rng.randrange(MOVIMIENTOS_DIAS)), descripcion=f'{tipo.title()} sintética',
+                )
+
+        with _sin_auto_now_add(MovimientoInventario, 'fecha'):
+            for lote in _por_lotes(movimientos(), batch):
+                MovimientoInventario.objects.bulk_create(lote)
+                creadas += len(lote)
+        for inventario, saldo in zip(inventarios, saldos):
+            inventario.cantidad = saldo
+        Inventario.objects.bulk_update(inventarios, ['cantidad'], batch_size=batch)
+
+    # bulk_create no dispara señales: contadores, índice de búsqueda, resumen y caché
+    empresa_ids = [empresa.id]
+    reconcile_usage(empresa_ids)
+    rebuild_index(empresa_ids)
+    rebuild_resumen(empresa_ids)
+    bump_data_version(empresa_ids)
+    return empresa.id, creadas
+
+
 class Command(BaseCommand):
-    help = """Limpia y puebla la base de datos con datos de ejemplo coherentes con el nuevo esquema."""
-
-    @transaction.atomic
-    def handle(self, *args, **kwargs):
-        self.stdout.write(self.style.WARNING('Limpiando TODAS las bases de datos (default, log_saas, analytics_saas)...'))
-
-        # --- LIMPIEZA DE DATOS EN ORDEN INVERSO DE DEPENDENCIAS ---
-        # Limpiar la base de datos de logs y analytics
-        Log.objects.using('log_saas').all().delete()
-
-        # Limpiar la base de datos principal (default)
-        DisposicionActivos.objects.all().delete()
-        DepreciacionActivos.objects.all().delete()
-        TipoDepreciacion.objects.all().delete()
-        Mantenimiento.objects.all().delete()
-        MovimientoInventario.objects.all().delete()
-        Inventario.objects.all().delete()
-        ActivoFijo.objects.all().delete()
-        DetalleCompra.objects.all().delete()
-        OrdenesCompra.objects.all().delete()
-        PartidasPresupuestarias.objects.all().delete()
-        Presupuesto.objects.all().delete()
-        ItemCatalogo.objects.all().delete()
-        Notificacion.objects.all().delete()
-        Suscripcion.objects.all().delete()
-        Empleado.objects.all().delete()
-        User.objects.all().exclude(is_superuser=True).delete()
-        Roles.objects.all().delete()
-        Proveedor.objects.all().delete()
-        Ubicacion.objects.all().delete()
-        Estado.objects.all().delete()
-        Cargo.objects.all().delete()
-        Departamento.objects.all().delete()
-        Empresa.objects.all().delete()
-        
-        # Limpiar modelos globales que no dependen de Empresa
-        Divisa.objects.all().delete()
-        Impuestos.objects.all().delete()
-        # Permisos no se borra, se gestiona con 'create_permissions'
+    help = """Limpia y puebla la base de datos con datos de ejemplo coherentes con el nuevo esquema.
+    Con --tenants N genera además N empresas sintéticas a escala (ej. para benchmarks):
+    seed_data --tenants 4 --assets 250000 --employees 2000 --movements 500000 --workers 4"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenants', type=int, default=0, help='Empresas sintéticas a generar (además de la de ejemplo).')
+        parser.add_argument('--assets', type=int, default=10000, help='Activos fijos por empresa sintética.')
+        parser.add_argument('--employees', type=int, default=200, help='Empleados (y usuarios) por empresa sintética.')
+        parser.add_argument('--movements', type=int, default=20000, help='Movimientos de inventario por empresa sintética.')
+        parser.add_argument('--proveedores', type=int, default=40, help='Proveedores por empresa sintética.')
+        parser.add_argument('--seed', type=int, default=42, help='Semilla: los mismos parámetros generan los mismos datos.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Filas por INSERT (bulk_create).')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Procesos que generan empresas en paralelo (no disponible con SQLite).')
 
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        self.stdout.write(self.style.WARNING('Limpiando las bases de datos (default, log_saas)...'))
+        self.limpiar()
         self.stdout.write(self.style.SUCCESS('Bases de datos limpias.'))
+
         self.stdout.write(self.style.WARNING('Creando nuevos datos de ejemplo...'))
+        with transaction.atomic():
+            self.crear_datos_base()
+
+        if options['tenants'] > 0:
+            self.generar_tenants(options)
 
+        self.stdout.write(self.style.SUCCESS(f'¡Datos de ejemplo creados con éxito en {time.perf_counter() - start:.1f} s!'))
+        self.stdout.write(self.style.NOTICE(f'--- Usuarios Admin Creados (Pass: {PASSWORD}) ---'))
+        self.stdout.write('admin_innovatech')
+
+    def limpiar(self):
+        """
+        Vacía las tablas de la app con TRUNCATE ... CASCADE en PostgreSQL (DELETE
+        en SQLite) en lugar de .delete() por modelo, que carga las cascadas en
+        Python. Permisos se conserva (se gestiona con 'create_permissions').
+        """
+        for alias in ('default', 'log_saas'):
+            connection = connections[alias]
+            tablas = [
+                model._meta.db_table
+                for model in apps.get_app_config('api').get_models(include_auto_created=True)
+                if model._meta.managed and model is not Permisos and router.allow_migrate_model(alias, model)
+            ]
+            sql = connection.ops.sql_flush(no_style(), tablas, allow_cascade=True)
+            connection.ops.execute_sql_flush(sql)
+        self.borrar_usuarios()
+
+    def borrar_usuarios(self):
+        """Borra los usuarios que no son superusuarios (ver borrar_usuarios())."""
+        borrar_usuarios(User.objects.exclude(is_superuser=True))
+
+    def crear_datos_base(self):
         # --- 1. CREAR DATOS GLOBALES ---
         divisa_usd, _ = Divisa.objects.get_or_create(codigo='USD', defaults={'nombre': 'Dólar Americano', 'simbolo': '$', 'tasa_cambio': Decimal('1.0')})
         divisa_bob, _ = Divisa.objects.get_or_create(codigo='BOB', defaults={'nombre': 'Boliviano', 'simbolo': 'Bs.', 'tasa_cambio': Decimal('6.96')})
@@ -80,10 +326,34 @@ class Command(BaseCommand):
             divisa_base=divisa_bob,
             permisos=permisos
         )
-        
-        self.stdout.write(self.style.SUCCESS('¡Datos de ejemplo creados con éxito!'))
-        self.stdout.write(self.style.NOTICE(f'--- Usuarios Admin Creados (Pass: {PASSWORD}) ---'))
-        self.stdout.write('admin_innovatech')
+
+    def generar_tenants(self, options):
+        workers = max(options['workers'], 1)
+        if workers > 1 and connections['default'].vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('SQLite no admite escrituras en paralelo: se usa un solo proceso.'))
+            workers = 1
+        opciones = {k: options[k] for k in ('assets', 'employees', 'movements', 'proveedores', 'seed', 'batch_size')}
+        indices = range(1, options['tenants'] + 1)
+        self.stdout.write(self.style.WARNING(
+            f"Generando {options['tenants']} empresas sintéticas ({options['assets']} activos, "
+            f"{options['employees']} empleados y {options['movements']} movimientos cada una) con {workers} procesos..."
+        ))
+        if workers == 1:
+            resultados = map(lambda i: generar_tenant(i, opciones), indices)
+            self.informar(resultados)
+            return
+        # 'spawn': cada proceso abre sus propias conexiones (ver process_report_jobs)
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=django.setup) as pool:
+            self.informar(pool.map(generar_tenant, indices, [opciones] * len(indices)))
+
+    def informar(self, resultados):
+        total = 0
+        for empresa_id, creadas in resultados:
+            total += creadas
+            self.stdout.write(f'Empresa sintética {empresa_id}: {creadas} filas.')
+        self.stdout.write(self.style.SUCCESS(f'Filas sintéticas creadas: {total}'))
 
     def crear_usuario(self, username, first_name, last_name, email):
         return User.objects.create_user(
@@ -0,0 +1,30 @@
+# management/commands/snapshot_valores.py
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Empresa
+from api.depreciacion import parse_periodo, ultimo_mes_completo, DepreciacionError
+from api.valoracion import tomar_snapshot
+
+
+class Command(BaseCommand):
+    help = ('Toma el snapshot mensual del valor en libros de cada activo (SnapshotValorActivo), '
+            'el punto de control de las consultas de valor a una fecha. Conviene ejecutarlo tras '
+            'el cierre de depreciación del mes; si ya existía se regenera.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('periodo', nargs='?', help='Mes del snapshot (AAAA-MM). Por defecto, el último mes completo.')
+        parser.add_argument('--empresa', action='append', dest='empresas', metavar='EMPRESA_ID',
+                            help='Limitar a una empresa (se puede repetir).')
+
+    def handle(self, *args, **options):
+        try:
+            fecha = parse_periodo(options['periodo']) if options['periodo'] else ultimo_mes_completo()
+        except DepreciacionError as e:
+            raise CommandError(str(e))
+        empresas = Empresa.objects.order_by('nombre')
+        if options['empresas']:
+            empresas = empresas.filter(pk__in=options['empresas'])
+        for empresa in empresas:
+            filas = tomar_snapshot(empresa.id, fecha)
+            self.stdout.write(f'{empresa.nombre}: {filas} activos al {fecha}')
+        self.stdout.write(self.style.SUCCESS('Snapshots completados.'))
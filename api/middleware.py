@@ -0,0 +1,118 @@
+# api/middleware.py
+from django.conf import settings
+from .tenancy import get_tenant
+from .instrumentation import QueryCollector, report
+
+
+class _TenantProxy:
+    """
+    Acceso perezoso a request.tenant. Con JWT el usuario lo autentica DRF dentro
+    de la vista (después de los middlewares), así que el contexto se resuelve en el
+    primer acceso y no aquí; get_tenant() lo memoriza para el resto del request.
+    """
+    __slots__ = ('_request',)
+
+    def __init__(self, request):
+        self._request = request
+
+    def __getattr__(self, name):
+        return getattr(get_tenant(self._request), name)
+
+
+class TenantContextMiddleware:
+    """Adjunta request.tenant (Empleado + Empresa + Suscripción) a cada request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.tenant = _TenantProxy(request)
+        return self.get_response(request)
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Mide cada request: número de consultas, tiempo total de SQL, consultas
+    duplicadas y tamaño de la respuesta, y lo compara con el presupuesto
+    `query_budget` declarado en la vista (ver api/instrumentation.py).
+    En respuestas streaming las consultas siguen contando mientras se itera.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'QUERY_INSTRUMENTATION', True)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        collector = QueryCollector().start()
+        request._metrics_view = (None, None)
+        try:
+            response = self.get_response(request)
+        except Exception:
+            collector.stop()
+            raise
+
+        view_class, action = request._metrics_view
+        if getattr(response, 'file_to_stream', None) is not None:
+            # FileResponse: el servidor WSGI puede enviar el fichero directamente
+            # (wsgi.file_wrapper) sin pasar por streaming_content; ya no hay más SQL.
+            collector.stop()
+            report(request, collector, view_class, action, response.status_code,
+                   response.get('Content-Length'), streaming=True)
+            return response
+        if response.streaming:
+            # Se captura el iterador original antes de sustituirlo por el envoltorio
+            measure = _StreamMeasure(request, response, collector, view_class, action)
+            response.streaming_content = measure.wrap(response.streaming_content)
+            # El servidor cierra la respuesta aunque el cliente corte antes de leerla
+            # (y el generador nunca arranque): ahí se desinstala el collector
+            response._resource_closers.append(measure.close)
+            return response
+
+        collector.stop()
+        payload = report(request, collector, view_class, action, response.status_code, len(response.content))
+        if settings.DEBUG:
+            response['X-Query-Count'] = str(payload['queries'])
+            response['X-SQL-Time-Ms'] = str(payload['sql_time_ms'])
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Las vistas DRF exponen la clase (cls) y, en ViewSets, el mapeo método -> acción
+        view_class = getattr(view_func, 'cls', None)
+        actions = getattr(view_func, 'actions', None) or {}
+        request._metrics_view = (view_class, actions.get(request.method.lower()))
+        return None
+
+
+class _StreamMeasure:
+    """
+    Cuenta los bytes de una respuesta streaming y la reporta una sola vez: al
+    agotar el iterador o al cerrarse la respuesta, lo que ocurra primero.
+    """
+
+    def __init__(self, request, response, collector, view_class, action):
+        self.request = request
+        self.response = response
+        self.collector = collector
+        self.view_class = view_class
+        self.action = action
+        self.size = 0
+        self.closed = False
+
+    def wrap(self, content):
+        try:
+            for chunk in content:
+                self.size += len(chunk)
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.collector.stop()
+        report(self.request, self.collector, self.view_class, self.action,
+               self.response.status_code, self.size, streaming=True)
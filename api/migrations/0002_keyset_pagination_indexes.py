@@ -0,0 +1,63 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activofijo',
+            index=models.Index(fields=['empresa', 'fecha_adquisicion', 'id'], name='activo_emp_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activofijo',
+            index=models.Index(fields=['empresa', 'nombre', 'id'], name='activo_emp_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activofijo',
+            index=models.Index(fields=['empresa', 'valor_actual', 'id'], name='activo_emp_valor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='empleado',
+            index=models.Index(fields=['empresa', 'apellido_p', 'id'], name='empleado_emp_apellido_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='estado',
+            index=models.Index(fields=['empresa', 'nombre', 'id'], name='estado_emp_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemcatalogo',
+            index=models.Index(fields=['empresa', 'nombre', 'id'], name='itemcat_emp_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['tenant_id', 'timestamp', 'id'], name='log_tenant_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mantenimiento',
+            index=models.Index(fields=['empresa', 'fecha_inicio', 'id'], name='mant_emp_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordenescompra',
+            index=models.Index(fields=['empresa', 'fecha_inicio', 'id'], name='orden_emp_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proveedor',
+            index=models.Index(fields=['empresa', 'nombre', 'id'], name='proveedor_emp_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='revalorizacionactivo',
+            index=models.Index(fields=['empresa', 'fecha', 'id'], name='reval_emp_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ubicacion',
+            index=models.Index(fields=['empresa', 'nombre', 'id'], name='ubicacion_emp_nombre_idx'),
+        ),
+    ]
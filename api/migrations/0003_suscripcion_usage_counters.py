@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:26
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, IntegerField
+from django.db.models.functions import Coalesce
+
+
+def rellenar_contadores(apps, schema_editor):
+    """Inicializa los contadores de uso con los conteos reales de cada empresa."""
+    if schema_editor.connection.alias != 'default':
+        return
+    Suscripcion = apps.get_model('api', 'Suscripcion')
+    Empleado = apps.get_model('api', 'Empleado')
+    ActivoFijo = apps.get_model('api', 'ActivoFijo')
+
+    def conteo(model):
+        subquery = (
+            model.objects.filter(empresa_id=OuterRef('empresa_id'))
+            .order_by().values('empresa_id').annotate(n=Count('pk')).values('n')
+        )
+        return Coalesce(Subquery(subquery, output_field=IntegerField()), 0)
+
+    Suscripcion.objects.update(usuarios_usados=conteo(Empleado), activos_usados=conteo(ActivoFijo))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='suscripcion',
+            name='activos_usados',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='suscripcion',
+            name='usuarios_usados',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(rellenar_contadores, migrations.RunPython.noop),
+    ]
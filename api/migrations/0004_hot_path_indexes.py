@@ -0,0 +1,52 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Índice "covering" solo para PostgreSQL: los resúmenes del reporte (SUM de
+# valor_actual por empresa y rango de fechas) se resuelven con un index-only scan
+# sin tocar la tabla. Otros motores no soportan INCLUDE, así que no se crea.
+ACTIVO_COVERING_INDEX = 'activo_emp_fecha_valor_cov'
+
+
+def crear_indice_covering(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {ACTIVO_COVERING_INDEX} '
+        'ON api_activofijo (empresa_id, fecha_adquisicion) INCLUDE (valor_actual)'
+    )
+
+
+def borrar_indice_covering(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {ACTIVO_COVERING_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_suscripcion_usage_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimientoinventario',
+            index=models.Index(fields=['inventario', 'fecha', 'id'], name='movinv_inv_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['destinatario', 'leido', '-timestamp', '-id'], name='notif_dest_leido_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(condition=models.Q(('leido', False)), fields=['destinatario', '-timestamp'], name='notif_dest_no_leidas_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='revalorizacionactivo',
+            index=models.Index(fields=['activo', 'fecha', 'id'], name='reval_activo_fecha_idx'),
+        ),
+        migrations.RunPython(crear_indice_covering, borrar_indice_covering),
+    ]
@@ -0,0 +1,116 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:32
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+import unicodedata
+from django.db import migrations, models
+
+# --- Objetos específicos de cada motor (el modelo es portable) ---
+POSTGRES_SQL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    # tsvector mantenido por la BD en cada INSERT/UPDATE del documento
+    'CREATE TRIGGER activo_busqueda_vector BEFORE INSERT OR UPDATE OF documento ON api_activobusqueda '
+    "FOR EACH ROW EXECUTE FUNCTION tsvector_update_trigger(vector, 'pg_catalog.spanish', documento)",
+    'CREATE INDEX activo_busqueda_vector_gin ON api_activobusqueda USING GIN (vector)',
+    'CREATE INDEX activo_busqueda_trgm_gin ON api_activobusqueda USING GIN (documento gin_trgm_ops)',
+]
+POSTGRES_REVERSE_SQL = [
+    'DROP INDEX IF EXISTS activo_busqueda_trgm_gin',
+    'DROP INDEX IF EXISTS activo_busqueda_vector_gin',
+    'DROP TRIGGER IF EXISTS activo_busqueda_vector ON api_activobusqueda',
+]
+SQLITE_SQL = [
+    # FTS5 con tokenizer trigram: búsqueda por subcadenas como el antiguo icontains.
+    # El rowid de la tabla FTS es el de api_activobusqueda (sincronizado por triggers).
+    "CREATE VIRTUAL TABLE activo_busqueda_fts USING fts5("
+    "activo_id UNINDEXED, empresa_id UNINDEXED, documento, tokenize='trigram')",
+    'CREATE TRIGGER activo_busqueda_ai AFTER INSERT ON api_activobusqueda BEGIN '
+    'INSERT INTO activo_busqueda_fts(rowid, activo_id, empresa_id, documento) '
+    'VALUES (new.rowid, new.activo_id, new.empresa_id, new.documento); END',
+    'CREATE TRIGGER activo_busqueda_ad AFTER DELETE ON api_activobusqueda BEGIN '
+    'DELETE FROM activo_busqueda_fts WHERE rowid = old.rowid; END',
+    'CREATE TRIGGER activo_busqueda_au AFTER UPDATE ON api_activobusqueda BEGIN '
+    'DELETE FROM activo_busqueda_fts WHERE rowid = old.rowid; '
+    'INSERT INTO activo_busqueda_fts(rowid, activo_id, empresa_id, documento) '
+    'VALUES (new.rowid, new.activo_id, new.empresa_id, new.documento); END',
+]
+SQLITE_REVERSE_SQL = [
+    'DROP TRIGGER IF EXISTS activo_busqueda_au',
+    'DROP TRIGGER IF EXISTS activo_busqueda_ad',
+    'DROP TRIGGER IF EXISTS activo_busqueda_ai',
+    'DROP TABLE IF EXISTS activo_busqueda_fts',
+]
+
+DOCUMENT_FIELDS = (
+    'nombre', 'codigo_interno', 'serial',
+    'item_catalogo__nombre', 'item_catalogo__tipo_item',
+    'departamento__nombre', 'estado__nombre', 'proveedor__nombre',
+)
+
+
+def _normalizar(texto):
+    texto = unicodedata.normalize('NFKD', str(texto or '').lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+def crear_objetos_motor(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for sql in POSTGRES_SQL if vendor == 'postgresql' else SQLITE_SQL if vendor == 'sqlite' else []:
+        schema_editor.execute(sql)
+
+
+def borrar_objetos_motor(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for sql in POSTGRES_REVERSE_SQL if vendor == 'postgresql' else SQLITE_REVERSE_SQL if vendor == 'sqlite' else []:
+        schema_editor.execute(sql)
+
+
+def indexar_activos(apps, schema_editor):
+    """Genera el documento de búsqueda de los activos existentes."""
+    ActivoFijo = apps.get_model('api', 'ActivoFijo')
+    ActivoBusqueda = apps.get_model('api', 'ActivoBusqueda')
+    filas = ActivoFijo.objects.values_list('id', 'empresa_id', *DOCUMENT_FIELDS).iterator(chunk_size=1000)
+    lote = []
+    for fila in filas:
+        lote.append(ActivoBusqueda(
+            activo_id=fila[0], empresa_id=fila[1],
+            documento=' '.join(_normalizar(v) for v in fila[2:] if v)
+        ))
+        if len(lote) >= 1000:
+            ActivoBusqueda.objects.bulk_create(lote)
+            lote = []
+    ActivoBusqueda.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivoBusquedaFTS',
+            fields=[
+                ('activo', models.UUIDField(db_column='activo_id', primary_key=True, serialize=False)),
+                ('empresa', models.UUIDField(db_column='empresa_id')),
+                ('documento', models.TextField()),
+                ('rank', models.FloatField(null=True)),
+            ],
+            options={
+                'db_table': 'activo_busqueda_fts',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ActivoBusqueda',
+            fields=[
+                ('activo', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='busqueda', serialize=False, to='api.activofijo')),
+                ('documento', models.TextField(blank=True)),
+                ('vector', django.contrib.postgres.search.SearchVectorField(editable=False, null=True)),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.empresa')),
+            ],
+        ),
+        migrations.RunPython(crear_objetos_motor, borrar_objetos_motor),
+        migrations.RunPython(indexar_activos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:44
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_activo_busqueda'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReporteJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('origen', models.CharField(choices=[('query', 'Consulta dinámica'), ('activos', 'Formulario de activos')], default='query', max_length=20)),
+                ('formato', models.CharField(choices=[('pdf', 'PDF'), ('excel', 'Excel')], default='pdf', max_length=10)),
+                ('parametros', models.JSONField(blank=True, default=dict)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('completado', 'Completado'), ('error', 'Error'), ('expirado', 'Expirado')], default='pendiente', max_length=20)),
+                ('progreso', models.PositiveSmallIntegerField(default=0)),
+                ('filas', models.PositiveIntegerField(blank=True, null=True)),
+                ('paginas', models.PositiveIntegerField(blank=True, null=True)),
+                ('archivo', models.CharField(blank=True, max_length=255)),
+                ('tamano_bytes', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('iniciado', models.DateTimeField(blank=True, null=True)),
+                ('finalizado', models.DateTimeField(blank=True, null=True)),
+                ('expira', models.DateTimeField(blank=True, null=True)),
+                ('empresa', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reporte_jobs', to='api.empresa')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reporte_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-creado'],
+                'indexes': [models.Index(fields=['estado', 'creado'], name='reportejob_estado_idx'), models.Index(fields=['usuario', 'creado', 'id'], name='reportejob_user_creado_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.8 on 2026-10-17 12:00
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce, TruncMonth
+
+
+def generar_resumen(apps, schema_editor):
+    """Resume los activos existentes con un GROUP BY por dimensiones y mes."""
+    ActivoFijo = apps.get_model('api', 'ActivoFijo')
+    ResumenActivos = apps.get_model('api', 'ResumenActivos')
+    grupos = (
+        ActivoFijo.objects.annotate(mes=TruncMonth('fecha_adquisicion'))
+        .values('empresa_id', 'departamento_id', 'estado_id', 'proveedor_id', 'item_catalogo_id', 'mes')
+        .annotate(n=Count('pk'), total=Coalesce(Sum('valor_actual'), Decimal('0')))
+        .order_by()
+    )
+    ResumenActivos.objects.bulk_create([
+        ResumenActivos(
+            empresa_id=g['empresa_id'], departamento_id=g['departamento_id'], estado_id=g['estado_id'],
+            proveedor_id=g['proveedor_id'], item_catalogo_id=g['item_catalogo_id'],
+            mes_adquisicion=g['mes'], cantidad=g['n'], valor_total=g['total'],
+        )
+        for g in grupos.iterator()
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_reporte_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenActivos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes_adquisicion', models.DateField()),
+                ('cantidad', models.IntegerField(default=0)),
+                ('valor_total', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('departamento', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.departamento')),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.empresa')),
+                ('estado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.estado')),
+                ('item_catalogo', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.itemcatalogo')),
+                ('proveedor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.proveedor')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['empresa', 'departamento', 'estado', 'proveedor', 'item_catalogo', 'mes_adquisicion'], name='resumen_emp_dims_idx')],
+            },
+        ),
+        migrations.RunPython(generar_resumen, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.8 on 2026-10-17 12:15
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def borrar_cargos_duplicados(apps, schema_editor):
+    """
+    Antes de la restricción única, deja un solo cargo por (activo, tipo, fecha):
+    se conserva el de menor id de cada grupo repetido.
+    """
+    DepreciacionActivos = apps.get_model('api', 'DepreciacionActivos')
+    repetidos = (
+        DepreciacionActivos.objects.values('activo_id', 'tipo_depreciacion_id', 'fecha')
+        .annotate(n=Count('id')).filter(n__gt=1)
+    )
+    for grupo in repetidos.iterator():
+        ids = list(
+            DepreciacionActivos.objects.filter(
+                activo_id=grupo['activo_id'], tipo_depreciacion_id=grupo['tipo_depreciacion_id'], fecha=grupo['fecha'],
+            ).order_by('id').values_list('id', flat=True)
+        )
+        DepreciacionActivos.objects.filter(pk__in=ids[1:]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_resumen_activos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tipodepreciacion',
+            name='factor',
+            field=models.DecimalField(decimal_places=2, default=2, max_digits=4),
+        ),
+        migrations.AddField(
+            model_name='tipodepreciacion',
+            name='metodo',
+            field=models.CharField(choices=[('LINEAL', 'Línea recta'), ('SALDO_DECRECIENTE', 'Saldo decreciente'), ('SUMA_DIGITOS', 'Suma de dígitos')], default='LINEAL', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='tipodepreciacion',
+            name='nombre',
+            field=models.CharField(max_length=20),
+        ),
+        migrations.AlterUniqueTogether(
+            name='tipodepreciacion',
+            unique_together={('empresa', 'nombre')},
+        ),
+        migrations.RunPython(borrar_cargos_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='depreciacionactivos',
+            constraint=models.UniqueConstraint(fields=('activo', 'tipo_depreciacion', 'fecha'), name='depreciacion_activo_tipo_fecha_uniq'),
+        ),
+    ]
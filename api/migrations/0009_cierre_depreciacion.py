@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-17 12:19
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def registrar_cierres(apps, schema_editor):
+    """La marca de agua de cada tipo con cargos previos es su último periodo depreciado."""
+    TipoDepreciacion = apps.get_model('api', 'TipoDepreciacion')
+    CierreDepreciacion = apps.get_model('api', 'CierreDepreciacion')
+    tipos = TipoDepreciacion.objects.annotate(ultimo=Max('depreciaciones__fecha')).filter(ultimo__isnull=False)
+    CierreDepreciacion.objects.bulk_create([
+        CierreDepreciacion(empresa_id=t.empresa_id, tipo_depreciacion_id=t.id, ultimo_periodo=t.ultimo)
+        for t in tipos
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_depreciacion_metodo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CierreDepreciacion',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('ultimo_periodo', models.DateField(blank=True, null=True)),
+                ('periodo_en_curso', models.DateField(blank=True, null=True)),
+                ('ultimo_activo', models.UUIDField(blank=True, null=True)),
+                ('cargos_en_curso', models.PositiveIntegerField(default=0)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='cierredepreciacion',
+            name='empresa',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cierres_depreciacion', to='api.empresa'),
+        ),
+        migrations.AddField(
+            model_name='cierredepreciacion',
+            name='tipo_depreciacion',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='cierre', to='api.tipodepreciacion'),
+        ),
+        migrations.RunPython(registrar_cierres, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-17 12:28
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_cierre_depreciacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotValorActivo',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('fecha', models.DateField()),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=12)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='depreciacionactivos',
+            index=models.Index(fields=['fecha'], name='depreciacion_fecha_idx'),
+        ),
+        migrations.AddField(
+            model_name='snapshotvaloractivo',
+            name='activo',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots_valor', to='api.activofijo'),
+        ),
+        migrations.AddField(
+            model_name='snapshotvaloractivo',
+            name='empresa',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots_valor', to='api.empresa'),
+        ),
+        migrations.AddIndex(
+            model_name='snapshotvaloractivo',
+            index=models.Index(fields=['empresa', 'fecha'], name='snapshot_emp_fecha_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='snapshotvaloractivo',
+            constraint=models.UniqueConstraint(fields=('activo', 'fecha'), name='snapshot_activo_fecha_uniq'),
+        ),
+    ]
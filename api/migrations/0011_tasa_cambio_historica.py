@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-17 12:35
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def registrar_tasas_actuales(apps, schema_editor):
+    """La tasa actual de cada divisa es el primer registro de su historial (vigente desde hoy)."""
+    Divisa = apps.get_model('api', 'Divisa')
+    TasaCambioHistorica = apps.get_model('api', 'TasaCambioHistorica')
+    hoy = timezone.localdate()
+    TasaCambioHistorica.objects.bulk_create([
+        TasaCambioHistorica(divisa_id=pk, fecha=hoy, tasa=tasa)
+        for pk, tasa in Divisa.objects.values_list('id', 'tasa_cambio')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_snapshot_valor_activo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TasaCambioHistorica',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('fecha', models.DateField()),
+                ('tasa', models.DecimalField(decimal_places=6, max_digits=14)),
+                ('divisa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historial_tasas', to='api.divisa')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('divisa', 'fecha'), name='tasa_divisa_fecha_uniq')],
+            },
+        ),
+        migrations.RunPython(registrar_tasas_actuales, migrations.RunPython.noop),
+    ]
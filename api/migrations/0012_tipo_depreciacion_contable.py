@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-17 12:54
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def marcar_contables(apps, schema_editor):
+    """
+    Hasta ahora todos los tipos descontaban valor_actual: en cada empresa queda como
+    contable el tipo con más cargos (o el primero por nombre) y los demás pasan a
+    llevar su saldo en paralelo.
+    """
+    TipoDepreciacion = apps.get_model('api', 'TipoDepreciacion')
+    elegidos = {}
+    for tipo in TipoDepreciacion.objects.annotate(n=Count('depreciaciones')).order_by('empresa_id', '-n', 'nombre'):
+        elegidos.setdefault(tipo.empresa_id, tipo.pk)
+    TipoDepreciacion.objects.filter(pk__in=elegidos.values()).update(contable=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_tasa_cambio_historica'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tipodepreciacion',
+            name='contable',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(marcar_contables, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='tipodepreciacion',
+            constraint=models.UniqueConstraint(condition=models.Q(('contable', True)), fields=('empresa',), name='tipo_depreciacion_contable_uniq'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-17 12:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_tipo_depreciacion_contable'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportejob',
+            name='intento',
+            field=models.UUIDField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='reportejob',
+            name='latido',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
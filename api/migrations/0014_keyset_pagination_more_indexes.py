@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-17 13:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_reporte_job_intento'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='empleado',
+            index=models.Index(fields=['empresa', 'ci', 'id'], name='empleado_emp_ci_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventario',
+            index=models.Index(fields=['empresa', 'cantidad', 'id'], name='inventario_emp_cantidad_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mantenimiento',
+            index=models.Index(fields=['empresa', 'estado', 'id'], name='mant_emp_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordenescompra',
+            index=models.Index(fields=['empresa', 'estado', 'id'], name='orden_emp_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='presupuesto',
+            index=models.Index(fields=['fecha', 'id'], name='presupuesto_fecha_idx'),
+        ),
+    ]
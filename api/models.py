@@ -3,6 +3,7 @@ import uuid
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
+from django.contrib.postgres.search import SearchVectorField
 
 def upload_path_perfil(instance, filename):
     """
@@ -39,6 +40,23 @@ class Divisa(models.Model):
     def __str__(self):
         return f"{self.nombre} ({self.codigo})"
 
+class TasaCambioHistorica(models.Model):
+    """
+    Tasa de una divisa (misma referencia que Divisa.tasa_cambio) vigente desde `fecha`
+    hasta el siguiente registro. Las conversiones de reportes usan la tasa a la
+    fecha de cada importe (ver api/divisas.py).
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    divisa = models.ForeignKey(Divisa, on_delete=models.CASCADE, related_name='historial_tasas')
+    fecha = models.DateField()
+    tasa = models.DecimalField(max_digits=14, decimal_places=6)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['divisa', 'fecha'], name='tasa_divisa_fecha_uniq')]
+
+    def __str__(self):
+        return f"{self.divisa.codigo} {self.fecha}: {self.tasa}"
+
 class Departamento(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, related_name='departamentos')
@@ -102,6 +120,13 @@ class Empleado(models.Model):
     theme_glow_enabled = models.BooleanField(default=False)
     # --- [FIN DE NUEVOS CAMPOS] ---
 
+    class Meta:
+        # Índice para la paginación por cursor del listado (empresa, orden, id)
+        indexes = [
+            models.Index(fields=['empresa', 'apellido_p', 'id'], name='empleado_emp_apellido_idx'),
+            models.Index(fields=['empresa', 'ci', 'id'], name='empleado_emp_ci_idx'),
+        ]
+
     def __str__(self):
         return f"{self.usuario.first_name} {self.apellido_p}"
 
@@ -128,9 +153,75 @@ class ActivoFijo(models.Model):
     # --- [NUEVO] Campo de foto de activo opcional ---
     foto_activo = models.ImageField(upload_to=upload_path_activo, null=True, blank=True)
     
-    class Meta: unique_together = ('empresa', 'codigo_interno')
+    class Meta:
+        unique_together = ('empresa', 'codigo_interno')
+        # Índices para la paginación por cursor: (empresa, campo de orden, id).
+        # El mismo índice sirve para el orden ascendente y el descendente.
+        indexes = [
+            models.Index(fields=['empresa', 'fecha_adquisicion', 'id'], name='activo_emp_fecha_idx'),
+            models.Index(fields=['empresa', 'nombre', 'id'], name='activo_emp_nombre_idx'),
+            models.Index(fields=['empresa', 'valor_actual', 'id'], name='activo_emp_valor_idx'),
+        ]
     def __str__(self): return self.nombre
 
+class ActivoBusqueda(models.Model):
+    """
+    Documento de búsqueda desnormalizado de un activo: nombre, código, serial y los
+    nombres de sus relaciones (catálogo, departamento, estado, proveedor), en
+    minúsculas y sin tildes. Se mantiene por señales (api/signals.py) y se consulta
+    desde api/search.py.
+    En PostgreSQL `vector` lo rellena un trigger (tsvector_update_trigger) y hay
+    índices GIN sobre `vector` y trigramas sobre `documento`; en SQLite se usa la
+    tabla FTS5 ActivoBusquedaFTS (ver migración 0005).
+    """
+    activo = models.OneToOneField(ActivoFijo, on_delete=models.CASCADE, primary_key=True, related_name='busqueda')
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, related_name='+')
+    documento = models.TextField(blank=True)
+    vector = SearchVectorField(null=True, editable=False)
+
+    def __str__(self): return f"Búsqueda de {self.activo_id}"
+
+class ActivoBusquedaFTS(models.Model):
+    """Tabla virtual FTS5 (solo SQLite) sincronizada por triggers con ActivoBusqueda."""
+    activo = models.UUIDField(primary_key=True, db_column='activo_id')
+    empresa = models.UUIDField(db_column='empresa_id')
+    documento = models.TextField()
+    rank = models.FloatField(null=True)  # Columna oculta de FTS5 (bm25, menor = más relevante)
+
+    class Meta:
+        managed = False
+        db_table = 'activo_busqueda_fts'
+
+class ResumenActivos(models.Model):
+    """
+    Tabla resumen por tenant: número de activos y valor total por combinación de
+    departamento, estado, proveedor, categoría y mes de adquisición. Se mantiene
+    de forma incremental por señales (api/signals.py) y alimenta el endpoint de
+    agregados (api/resumen.py) sin recorrer ActivoFijo.
+    Puede haber varias filas con la misma combinación (altas concurrentes): las
+    consultas siempre suman, así que el resultado no cambia.
+    """
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, related_name='+')
+    # Mismo on_delete que en ActivoFijo: al borrar un departamento sus activos
+    # pasan a "sin departamento" y sus filas del resumen también.
+    departamento = models.ForeignKey(Departamento, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    estado = models.ForeignKey('Estado', on_delete=models.CASCADE, related_name='+')
+    proveedor = models.ForeignKey('Proveedor', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    item_catalogo = models.ForeignKey('ItemCatalogo', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    mes_adquisicion = models.DateField()  # Primer día del mes
+    cantidad = models.IntegerField(default=0)
+    valor_total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['empresa', 'departamento', 'estado', 'proveedor', 'item_catalogo', 'mes_adquisicion'],
+                name='resumen_emp_dims_idx',
+            ),
+        ]
+
+    def __str__(self): return f"Resumen {self.empresa_id} {self.mes_adquisicion:%Y-%m}: {self.cantidad}"
+
 class PartidasPresupuestarias(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, related_name='partidas_presupuestarias')
@@ -159,6 +250,9 @@ class ItemCatalogo(models.Model):
     nombre = models.CharField(max_length=200)
     tipo_item = models.CharField(max_length=200)
 
+    class Meta:
+        indexes = [models.Index(fields=['empresa', 'nombre', 'id'], name='itemcat_emp_nombre_idx')]
+
     def __str__(self):
         return self.nombre
 
@@ -167,6 +261,7 @@ class Estado(models.Model):
     empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, related_name='estados_activos')
     nombre = models.CharField(max_length=50) # Ej: "En Uso", "En Reparación", "Obsoleto"
     detalle = models.TextField(blank=True, null=True)
+    class Meta: indexes = [models.Index(fields=['empresa', 'nombre', 'id'], name='estado_emp_nombre_idx')]
     def __str__(self): return self.nombre
 
 class Ubicacion(models.Model):
@@ -175,6 +270,7 @@ class Ubicacion(models.Model):
     nombre = models.CharField(max_length=100)
     direccion = models.CharField(max_length=255, blank=True, null=True)
     detalle = models.TextField(blank=True, null=True)
+    class Meta: indexes = [models.Index(fields=['empresa', 'nombre', 'id'], name='ubicacion_emp_nombre_idx')]
     def __str__(self): return self.nombre
 
 class Inventario(models.Model):
@@ -186,6 +282,10 @@ class Inventario(models.Model):
     responsable = models.ForeignKey('Empleado', on_delete=models.SET_NULL, null=True, blank=True, related_name='inventarios_asignados')
     cantidad = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        # Índice para la paginación por cursor del listado (empresa, orden, id)
+        indexes = [models.Index(fields=['empresa', 'cantidad', 'id'], name='inventario_emp_cantidad_idx')]
+
     def __str__(self):
         return f"Inventario en {self.ubicacion.nombre}: {self.cantidad}"
 
@@ -200,6 +300,10 @@ class MovimientoInventario(models.Model):
     descripcion = models.CharField(max_length=50, blank=True)
     cantidad = models.IntegerField()
 
+    class Meta:
+        # Kardex de un inventario: filtro por inventario + rango de fechas (MovimientoInventarioFilter)
+        indexes = [models.Index(fields=['inventario', 'fecha', 'id'], name='movinv_inv_fecha_idx')]
+
     def __str__(self):
         return f"{self.get_tipo_movimiento_display()} de {self.cantidad} en {self.inventario.item_catalogo.nombre}"
 
@@ -213,6 +317,7 @@ class Proveedor(models.Model):
     pais = models.CharField(max_length=50, blank=True)
     direccion = models.CharField(max_length=255, blank=True, null=True)
     estado = models.CharField(max_length=20, default='activo')
+    class Meta: indexes = [models.Index(fields=['empresa', 'nombre', 'id'], name='proveedor_emp_nombre_idx')]
     def __str__(self): return self.nombre
 
 class OrdenesCompra(models.Model):
@@ -229,6 +334,12 @@ class OrdenesCompra(models.Model):
     condiciones = models.TextField(blank=True)
     monto_total = models.DecimalField(max_digits=15, decimal_places=2, default=0)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['empresa', 'fecha_inicio', 'id'], name='orden_emp_fecha_idx'),
+            models.Index(fields=['empresa', 'estado', 'id'], name='orden_emp_estado_idx'),
+        ]
+
     def __str__(self):
         return f"Orden de Compra {self.id} para {self.empresa.nombre}"
 
@@ -258,6 +369,11 @@ class Presupuesto(models.Model):
     monto = models.DecimalField(max_digits=15, decimal_places=2)
     fecha = models.DateField()
     descripcion = models.TextField(blank=True, null=True)
+
+    class Meta:
+        # Sin columna empresa (el tenant se filtra por el departamento): el índice sirve al orden
+        indexes = [models.Index(fields=['fecha', 'id'], name='presupuesto_fecha_idx')]
+
     def __str__(self): return f"Presupuesto {self.departamento.nombre} - {self.fecha}"
 
 class Mantenimiento(models.Model):
@@ -277,6 +393,12 @@ class Mantenimiento(models.Model):
     descripcion_problema = models.TextField()
     notas_solucion = models.TextField(blank=True, null=True)
     costo = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['empresa', 'fecha_inicio', 'id'], name='mant_emp_fecha_idx'),
+            models.Index(fields=['empresa', 'estado', 'id'], name='mant_emp_estado_idx'),
+        ]
     
     def __str__(self):
         return f"{self.get_tipo_display()} - {self.activo.nombre} ({self.get_estado_display()})"
@@ -306,6 +428,11 @@ class Suscripcion(models.Model):
     max_usuarios = models.PositiveIntegerField(default=5)
     max_activos = models.PositiveIntegerField(default=50)
 
+    # Uso actual (desnormalizado). Se actualiza con F() en la misma transacción
+    # que crea/borra empleados y activos; ver api/quotas.py y reconcile_usage.
+    usuarios_usados = models.PositiveIntegerField(default=0)
+    activos_usados = models.PositiveIntegerField(default=0)
+
     def __str__(self):
         return f"Suscripción {self.get_plan_display()} de {self.empresa.nombre} ({self.get_estado_display()})"
 
@@ -324,15 +451,41 @@ class RevalorizacionActivo(models.Model):
 
     class Meta:
         ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['empresa', 'fecha', 'id'], name='reval_emp_fecha_idx'),
+            # Historial de un activo (?activo_id=), del más reciente al más antiguo
+            models.Index(fields=['activo', 'fecha', 'id'], name='reval_activo_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"Revalorización de {self.activo.nombre} en {self.fecha.strftime('%Y-%m-%d')}"
 
 class TipoDepreciacion(models.Model):
+    # Método de cálculo del cargo mensual (ver api/depreciacion.py)
+    METODO_CHOICES = [
+        ('LINEAL', 'Línea recta'),
+        ('SALDO_DECRECIENTE', 'Saldo decreciente'),
+        ('SUMA_DIGITOS', 'Suma de dígitos'),
+    ]
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, related_name='tipos_depreciacion')
-    nombre = models.CharField(max_length=20, unique=True)
+    nombre = models.CharField(max_length=20)
     detalle = models.CharField(max_length=50, blank=True)
+    metodo = models.CharField(max_length=20, choices=METODO_CHOICES, default='LINEAL')
+    # Solo saldo decreciente: múltiplo de la tasa lineal (2 = doble saldo decreciente)
+    factor = models.DecimalField(max_digits=4, decimal_places=2, default=2)
+    # El tipo contable (uno por empresa) es el único cuyos cargos descuentan valor_actual;
+    # los demás (fiscal, IFRS...) llevan su propio saldo en paralelo
+    contable = models.BooleanField(default=False)
+
+    class Meta:
+        # Cada empresa define sus propios tipos ("Lineal", "Acelerada"...)
+        unique_together = ('empresa', 'nombre')
+        constraints = [
+            models.UniqueConstraint(fields=['empresa'], condition=models.Q(contable=True),
+                                    name='tipo_depreciacion_contable_uniq'),
+        ]
 
     def __str__(self):
         return self.nombre
@@ -341,12 +494,54 @@ class DepreciacionActivos(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     activo = models.ForeignKey(ActivoFijo, on_delete=models.CASCADE, related_name='depreciaciones')
     tipo_depreciacion = models.ForeignKey(TipoDepreciacion, on_delete=models.PROTECT, related_name='depreciaciones')
-    fecha = models.DateField()
+    fecha = models.DateField()  # Último día del periodo (mes) depreciado
     monto = models.DecimalField(max_digits=12, decimal_places=2)
 
+    class Meta:
+        # Un cargo por activo, tipo y periodo: repetir un cierre no puede duplicar cargos
+        constraints = [
+            models.UniqueConstraint(fields=['activo', 'tipo_depreciacion', 'fecha'], name='depreciacion_activo_tipo_fecha_uniq'),
+        ]
+        # Cargos entre un snapshot y la fecha consultada (api/valoracion.py)
+        indexes = [models.Index(fields=['fecha'], name='depreciacion_fecha_idx')]
+
     def __str__(self):
         return f"Depreciación de {self.activo.nombre} - {self.monto}"
 
+class CierreDepreciacion(models.Model):
+    """
+    Registro de cierres de un TipoDepreciacion: último periodo cerrado (marca de
+    agua) y, si hay un cierre a medias, el periodo y el último activo ya procesado
+    (los activos se recorren por id). Ver api/depreciacion.py.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, related_name='cierres_depreciacion')
+    tipo_depreciacion = models.OneToOneField(TipoDepreciacion, on_delete=models.CASCADE, related_name='cierre')
+    ultimo_periodo = models.DateField(null=True, blank=True)  # Último día del último mes cerrado
+    periodo_en_curso = models.DateField(null=True, blank=True)
+    ultimo_activo = models.UUIDField(null=True, blank=True)
+    cargos_en_curso = models.PositiveIntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Cierre {self.tipo_depreciacion.nombre}: {self.ultimo_periodo or 'sin cierres'}"
+
+class SnapshotValorActivo(models.Model):
+    """
+    Valor en libros de cada activo al cierre de un mes (punto de control). El valor a
+    una fecha se obtiene desde el snapshot anterior más cercano sumando solo los
+    eventos posteriores (revalorizaciones y depreciaciones). Ver api/valoracion.py.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, related_name='snapshots_valor')
+    activo = models.ForeignKey(ActivoFijo, on_delete=models.CASCADE, related_name='snapshots_valor')
+    fecha = models.DateField()  # Último día del mes
+    valor = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['activo', 'fecha'], name='snapshot_activo_fecha_uniq')]
+        indexes = [models.Index(fields=['empresa', 'fecha'], name='snapshot_emp_fecha_idx')]
+
 class Notificacion(models.Model):
     TIPO_CHOICES = [
         ('ADVERTENCIA', 'Advertencia'),
@@ -370,10 +565,74 @@ class Notificacion(models.Model):
 
     class Meta:
         ordering = ['leido', '-timestamp']
+        indexes = [
+            # Listado de la campanita: WHERE destinatario = %s ORDER BY leido, timestamp DESC, id DESC
+            models.Index(fields=['destinatario', 'leido', '-timestamp', '-id'], name='notif_dest_leido_ts_idx'),
+            # Contador de no leídas: índice parcial, solo contiene las pendientes
+            models.Index(
+                fields=['destinatario', '-timestamp'], condition=models.Q(leido=False),
+                name='notif_dest_no_leidas_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"[{self.get_tipo_display()}] para {self.destinatario.username} (Leído: {self.leido})"
 
+class ReporteJob(models.Model):
+    """
+    Exportación de un reporte (PDF/Excel) en segundo plano. La cola vive en esta
+    tabla: el comando process_report_jobs toma los pendientes y los genera en un
+    pool de procesos (ver api/report_jobs.py).
+    """
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('completado', 'Completado'),
+        ('error', 'Error'),
+        ('expirado', 'Expirado'),
+    ]
+    FORMATO_CHOICES = [('pdf', 'PDF'), ('excel', 'Excel')]
+    ORIGEN_CHOICES = [
+        ('query', 'Consulta dinámica'),      # ReporteQueryExportView (filters)
+        ('activos', 'Formulario de activos'),  # ReporteActivosExport (fecha_min, fecha_max...)
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # NULL: reporte global de un SuperAdmin sin empresa seleccionada
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, null=True, blank=True, related_name='reporte_jobs')
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reporte_jobs')
+    origen = models.CharField(max_length=20, choices=ORIGEN_CHOICES, default='query')
+    formato = models.CharField(max_length=10, choices=FORMATO_CHOICES, default='pdf')
+    parametros = models.JSONField(default=dict, blank=True)
+
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
+    progreso = models.PositiveSmallIntegerField(default=0)  # 0-100
+    filas = models.PositiveIntegerField(null=True, blank=True)
+    paginas = models.PositiveIntegerField(null=True, blank=True)  # solo PDF
+    archivo = models.CharField(max_length=255, blank=True)  # Ruta relativa a MEDIA_ROOT
+    tamano_bytes = models.PositiveBigIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    creado = models.DateTimeField(auto_now_add=True)
+    iniciado = models.DateTimeField(null=True, blank=True)
+    finalizado = models.DateTimeField(null=True, blank=True)
+    expira = models.DateTimeField(null=True, blank=True)
+    # Intento en curso: lo fija claim_jobs y solo ese intento puede avanzar o cerrar el trabajo
+    intento = models.UUIDField(null=True, blank=True)
+    latido = models.DateTimeField(null=True, blank=True)  # Última señal de vida del intento
+
+    class Meta:
+        ordering = ['-creado']
+        indexes = [
+            # Cola: WHERE estado = 'pendiente' ORDER BY creado
+            models.Index(fields=['estado', 'creado'], name='reportejob_estado_idx'),
+            # Listado de "mis exportaciones"
+            models.Index(fields=['usuario', 'creado', 'id'], name='reportejob_user_creado_idx'),
+        ]
+
+    def __str__(self):
+        return f"Reporte {self.formato} ({self.estado}) de {self.usuario_id}"
+
 class Log(models.Model):
     """
     Representa una entrada en la bitácora del sistema. Cada instancia es un registro
@@ -415,6 +674,8 @@ class Log(models.Model):
     class Meta:
         # Le da un nombre explícito a la tabla en la base de datos 'log_saas'.
         db_table = 'log_bitacora'
+        # Listado de la bitácora por empresa, del más reciente al más antiguo (paginado por cursor)
+        indexes = [models.Index(fields=['tenant_id', 'timestamp', 'id'], name='log_tenant_ts_idx')]
 
 class PrediccionMantenimiento(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
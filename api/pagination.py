@@ -0,0 +1,245 @@
+# api/pagination.py
+import json
+import base64
+import logging
+from collections import OrderedDict
+
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+logger = logging.getLogger(__name__)
+
+# Valores que se consideran "sí" en ?include_count=
+TRUTHY = ('1', 'true', 'yes', 'si', 'sí')
+
+
+def estimate_count(queryset):
+    """
+    Número aproximado de filas del queryset.
+    En PostgreSQL se toma la estimación del planificador (EXPLAIN, no recorre la
+    tabla), así que su coste no crece con el tamaño del tenant. En otros motores
+    (SQLite en desarrollo) se hace un COUNT(*) normal.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginación por cursor (keyset) para los listados de tenant.
+
+    La página siguiente se pide con WHERE (campo, id) > (último campo, último id)
+    en lugar de OFFSET, de modo que cada página cuesta lo mismo sea la 1 o la 500
+    y, con los índices (empresa, campo, id), la BD lee solo las filas devueltas.
+
+    La vista declara:
+      - ordering_fields: campos por los que se permite ordenar (?ordering=-campo).
+        Deben ser columnas NO nulas del propio modelo (la comparación de tuplas
+        no funciona con NULL).
+      - default_ordering: orden por defecto (ej: '-fecha_adquisicion' o
+        ('leido', '-timestamp')). El id se añade siempre como desempate.
+    Con ?include_count=true la respuesta incluye además un total estimado
+    (o en la primera página por defecto, si count_by_default). Pagina tanto
+    instancias como filas de values() (dicts).
+    """
+    page_size = 50  # El cliente puede pedir hasta max_page_size con ?page_size=
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    ordering_param = 'ordering'
+    count_query_param = 'include_count'
+    count_by_default = False
+    invalid_cursor_message = 'Cursor inválido.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        cursor = self.decode_cursor(request)
+        self.ordering = self.get_ordering(request, queryset, view, cursor)
+
+        self.count = None
+        if self.wants_count(request, cursor):
+            self.count = estimate_count(queryset)
+
+        reverse = bool(cursor and cursor.get('r'))
+        ordering = self._reversed(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if cursor:
+            queryset = queryset.filter(self._keyset_filter(ordering, cursor['v']))
+
+        # Se pide una fila de más para saber si hay otra página en esa dirección
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.page = results
+        if reverse:
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+        return results
+
+    def get_paginated_response(self, data):
+        payload = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+        ])
+        if self.count is not None:
+            payload['count'] = self.count
+        payload['results'] = data
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'count': {'type': 'integer', 'description': 'Total estimado (solo con include_count).'},
+                'results': schema,
+            },
+        }
+
+    def wants_count(self, request, cursor):
+        requested = request.query_params.get(self.count_query_param)
+        if requested is not None:
+            return requested.lower() in TRUTHY
+        return self.count_by_default and cursor is None
+
+    # --- Tamaño de página y orden ---
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_ordering(self, request, queryset, view, cursor):
+        """
+        Devuelve la tupla de orden efectiva, siempre terminada en el pk.
+        Un ?ordering= fuera de la lista blanca de la vista se ignora (como hace
+        OrderingFilter de DRF) y se usa el orden por defecto.
+        """
+        pk_name = queryset.model._meta.pk.name
+        default = getattr(view, 'default_ordering', None) or ()
+        default = (default,) if isinstance(default, str) else tuple(default)
+        allowed = set(getattr(view, 'ordering_fields', None) or ())
+
+        if cursor:
+            # El cursor lleva su propio orden: las páginas de un mismo recorrido
+            # no pueden cambiar de criterio a mitad de camino. Aun así viene del
+            # cliente, así que solo se aceptan campos de la lista blanca.
+            valid = allowed | {f.lstrip('-') for f in default} | {pk_name}
+            ordering = tuple(cursor['o'])
+            if not ordering or not all(isinstance(f, str) and f.lstrip('-') in valid for f in ordering):
+                raise NotFound(self.invalid_cursor_message)
+            return ordering
+
+        requested = request.query_params.get(self.ordering_param)
+        ordering = None
+        if requested:
+            fields = tuple(f.strip() for f in requested.split(',') if f.strip())
+            if fields and all(f.lstrip('-') in allowed for f in fields):
+                ordering = fields
+        if ordering is None:
+            ordering = default
+
+        # Desempate único: el pk, en el mismo sentido que el último campo
+        ordering = tuple(f for f in ordering if f.lstrip('-') not in ('pk', pk_name))
+        descending = bool(ordering) and ordering[-1].startswith('-')
+        return ordering + (('-' if descending else '') + pk_name,)
+
+    @staticmethod
+    def _reversed(ordering):
+        return tuple(f[1:] if f.startswith('-') else '-' + f for f in ordering)
+
+    @staticmethod
+    def _keyset_filter(ordering, values):
+        """
+        Condición "estrictamente después de (values)" para un orden mixto:
+        (a > va) OR (a = va AND b > vb) OR (a = va AND b = vb AND id > vid)
+        """
+        if len(values) != len(ordering):
+            raise NotFound(KeysetPagination.invalid_cursor_message)
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    # --- Cursor opaco ---
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            if not isinstance(data.get('o'), list) or not isinstance(data.get('v'), list):
+                raise ValueError
+        except (AttributeError, TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        return data
+
+    def encode_cursor(self, obj, reverse=False):
+        values = [self._cursor_value(obj, field.lstrip('-')) for field in self.ordering]
+        data = {'o': list(self.ordering), 'v': values}
+        if reverse:
+            data['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode('utf-8')).decode('ascii')
+        url = replace_query_param(self.base_url, self.cursor_query_param, encoded)
+        # El total solo se calcula en la primera página
+        return remove_query_param(url, self.count_query_param)
+
+    @staticmethod
+    def _cursor_value(obj, name):
+        value = obj[name] if isinstance(obj, dict) else getattr(obj, name)
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        # Fechas, Decimal y UUID viajan como texto; el ORM los convierte al filtrar
+        return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+
+class ReportPreviewPagination(KeysetPagination):
+    """Vista previa de reportes: páginas algo mayores y total estimado en la primera."""
+    page_size = 100
+    max_page_size = 500
+    count_by_default = True
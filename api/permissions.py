@@ -1,6 +1,146 @@
 # api/permissions.py
+import time
+import logging
+from django.core.cache import cache
 from rest_framework import permissions
 
+logger = logging.getLogger(__name__)
+
+# --- CACHÉ DE PERMISOS POR USUARIO ---
+# El conjunto de permisos resueltos de cada usuario se guarda en la caché compartida
+# (settings.CACHES) y, además, se memoriza en el propio request para que varias
+# comprobaciones dentro de la misma petición no vuelvan a consultar la caché.
+# Las claves incluyen una "generación" global: al cambiar un Permiso se incrementa
+# y todas las entradas anteriores quedan huérfanas (expiran solas).
+PERMISSIONS_CACHE_TIMEOUT = 60 * 15  # 15 minutos
+PERMISSIONS_GENERATION_KEY = 'permisos:generacion'
+
+
+def read_counter(key):
+    """
+    Devuelve el valor actual de un contador de la caché, inicializándolo si no existe.
+    Se inicializa con un valor basado en el reloj (y no con 1) para que, si la caché
+    pierde la clave, el nuevo valor nunca coincida con uno emitido anteriormente.
+    """
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        value = cache.get(key)
+    return value
+
+
+def bump_counter(key):
+    """Incrementa un contador de la caché (o lo inicializa si no existía)."""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        return read_counter(key)
+
+
+# --- VERSIÓN DE AUTORIZACIÓN POR TENANT (claims del JWT) ---
+# El token de acceso lleva los permisos resueltos y la versión de autorización de
+# su empresa en el momento de emitirse. Mientras esa versión coincida con el
+# contador actual, HasPermission confía en los claims sin tocar la BD. Cualquier
+# cambio de roles/permisos de la empresa incrementa el contador y los tokens
+# emitidos antes pasan a resolverse por la caché/BD.
+AUTHZ_VERSION_KEY = 'authz_version:{empresa_id}'
+
+
+def get_authz_version(empresa_id):
+    """Versión actual de autorización de una empresa (incluye la generación global)."""
+    return f"{read_counter(PERMISSIONS_GENERATION_KEY)}.{read_counter(AUTHZ_VERSION_KEY.format(empresa_id=empresa_id))}"
+
+
+def bump_authz_version(empresa_ids):
+    """Invalida los claims de permisos de todos los tokens de las empresas indicadas."""
+    for empresa_id in set(empresa_ids):
+        if empresa_id is not None:
+            bump_counter(AUTHZ_VERSION_KEY.format(empresa_id=empresa_id))
+
+
+def add_permission_claims(token, user, empresa_id):
+    """
+    Añade al token los permisos resueltos del usuario y la versión de autorización.
+    La versión se lee ANTES de resolver los permisos: si algo cambia entre medias,
+    el token nace con una versión ya superada y no se confiará en sus claims.
+    """
+    from .models import Permisos
+    token['authz_version'] = get_authz_version(empresa_id)
+    token['permisos'] = sorted(
+        Permisos.objects.filter(roles__empleado__usuario_id=user.id)
+        .values_list('nombre', flat=True).distinct()
+    )
+    return token
+
+
+def _token_permissions(request):
+    """Devuelve los permisos del JWT si su versión sigue vigente, o None."""
+    token = getattr(request, 'auth', None)
+    if token is None or not hasattr(token, 'get'):
+        return None
+    names = token.get('permisos')
+    version = token.get('authz_version')
+    empresa_id = token.get('empresa_id')
+    if names is None or version is None or not empresa_id:
+        return None
+    if version != get_authz_version(empresa_id):
+        return None
+    return names
+
+
+def _user_permissions_key(user_id):
+    return f'permisos:{read_counter(PERMISSIONS_GENERATION_KEY)}:usuario:{user_id}'
+
+
+def get_user_permissions(request):
+    """
+    Devuelve un frozenset con los nombres de permisos que el usuario del request
+    tiene a través de sus roles. Orden de búsqueda:
+    memo del request -> claims del JWT (si su versión sigue vigente) -> caché -> BD.
+    """
+    user = getattr(request, 'user', None)
+    if not user or not user.is_authenticated:
+        return frozenset()
+
+    # El memo vive en el HttpRequest subyacente para que lo compartan la vista,
+    # los permisos y los serializers aunque cada uno reciba un Request distinto.
+    holder = getattr(request, '_request', request)
+    memo = getattr(holder, '_permisos_usuario', None)
+    if memo is not None:
+        return memo
+
+    # 1. Claims del JWT con versión vigente: cero consultas
+    names = _token_permissions(request)
+    # 2. Caché compartida; 3. Base de datos
+    key = _user_permissions_key(user.id) if names is None else None
+    if key is not None:
+        names = cache.get(key)
+    if names is None:
+        # Importación local para evitar import circular (models -> permissions)
+        from .models import Permisos
+        names = list(
+            Permisos.objects.filter(roles__empleado__usuario_id=user.id)
+            .values_list('nombre', flat=True).distinct()
+        )
+        cache.set(key, names, PERMISSIONS_CACHE_TIMEOUT)
+
+    memo = frozenset(names)
+    holder._permisos_usuario = memo
+    return memo
+
+
+def invalidate_user_permissions(user_ids):
+    """Elimina de la caché los permisos resueltos de los usuarios indicados."""
+    user_ids = [uid for uid in user_ids if uid is not None]
+    if user_ids:
+        cache.delete_many([_user_permissions_key(uid) for uid in user_ids])
+
+
+def invalidate_all_permissions():
+    """Invalida los permisos resueltos de TODOS los usuarios (cambio en Permisos)."""
+    bump_counter(PERMISSIONS_GENERATION_KEY)
+
+
 class HasPermission(permissions.BasePermission):
     """
     Custom permission to check if the user has a specific named permission
@@ -24,24 +164,19 @@ class HasPermission(permissions.BasePermission):
             return False
 
         try:
-            empleado = request.user.empleado
-            # Check if any role assigned to the employee has the required permission
-            # Note: This requires optimizing permission lookup if performance becomes an issue
-            # (e.g., caching permissions per user session)
-            has_perm = empleado.roles.filter(permisos__nombre=self.required_permission).exists()
-            # print(f"DEBUG: Checking {self.required_permission} for {request.user}: {has_perm}") # Optional debug
-            return has_perm
-        except AttributeError: # Handle cases where user might not have 'empleado' linked yet
-             return False
+            # El conjunto de permisos se resuelve una vez por usuario (caché compartida)
+            # y una vez por request (memo), invalidado por señales en api/signals.py
+            return self.required_permission in get_user_permissions(request)
         except Exception as e: # Catch other potential errors
-             print(f"ERROR checking permission {self.required_permission}: {e}")
+             logger.error(f"ERROR checking permission {self.required_permission}: {e}")
              return False
 
     # Optional: Implement has_object_permission if you need row-level checks
     # def has_object_permission(self, request, view, obj):
     #     # ... logic to check permission against a specific object ...
     #     return super().has_object_permission(request, view, obj)
+
 def check_permission(request, view, permission_name):
     """ Instantiates and checks HasPermission """
     checker = HasPermission(permission_name)
-    return checker.has_permission(request, view)
\ No newline at end of file
+    return checker.has_permission(request, view)
@@ -0,0 +1,111 @@
+# api/quotas.py
+import logging
+import contextvars
+from contextlib import contextmanager
+from django.db import transaction
+from django.db.models import F
+from .models import Suscripcion, Empleado, ActivoFijo
+
+logger = logging.getLogger(__name__)
+
+# Modelos con cuota en la suscripción: modelo -> (campo de límite, contador de uso).
+# Los contadores viven en Suscripcion y se mantienen con UPDATE ... SET x = x ± 1
+# dentro de la misma transacción que crea/borra el registro (ver api/signals.py),
+# de modo que comprobar la cuota no necesita ningún COUNT(*).
+QUOTA_FIELDS = {
+    Empleado: ('max_usuarios', 'usuarios_usados'),
+    ActivoFijo: ('max_activos', 'activos_usados'),
+}
+
+# Reservas hechas en este contexto (request/hilo): evita que la señal post_save
+# vuelva a sumar un registro cuyo cupo ya se reservó con reserve_quota().
+_reserved = contextvars.ContextVar('cuotas_reservadas', default=())
+
+
+class QuotaExceeded(Exception):
+    """No quedan cupos en la suscripción (o no está activa)."""
+
+
+def usage_field(model):
+    return QUOTA_FIELDS[model][1]
+
+
+@contextmanager
+def reserve_quota(empresa_id, model):
+    """
+    Reserva un cupo para crear un `model` en la empresa con un UPDATE condicional:
+
+        UPDATE suscripcion SET usados = usados + 1
+        WHERE empresa_id = %s AND estado = 'activa' AND usados < max
+
+    La fila queda bloqueada hasta el fin de la transacción, así que dos POST
+    concurrentes no pueden superar el límite. Debe usarse dentro de
+    transaction.atomic(): si la creación falla, el rollback devuelve el cupo.
+    Lanza QuotaExceeded si no se pudo reservar.
+    """
+    limit_field, used_field = QUOTA_FIELDS[model]
+    updated = Suscripcion.objects.filter(
+        empresa_id=empresa_id, estado='activa', **{f'{used_field}__lt': F(limit_field)}
+    ).update(**{used_field: F(used_field) + 1})
+    if not updated:
+        raise QuotaExceeded()
+
+    key = (model, empresa_id)
+    token = _reserved.set(_reserved.get() + (key,))
+    try:
+        yield
+    finally:
+        _reserved.reset(token)
+
+
+def quota_already_reserved(model, empresa_id):
+    return (model, empresa_id) in _reserved.get()
+
+
+def add_usage(model, empresa_id, delta):
+    """Suma (o resta) uso sin comprobar el límite; nunca baja de cero."""
+    used_field = usage_field(model)
+    queryset = Suscripcion.objects.filter(empresa_id=empresa_id)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{used_field}__gte': -delta})
+    queryset.update(**{used_field: F(used_field) + delta})
+
+
+def real_usage(empresa_id):
+    """Uso real (COUNT) de cada cuota de una empresa: {contador: valor}."""
+    return {
+        used_field: model.objects.filter(empresa_id=empresa_id).count()
+        for model, (_limit, used_field) in QUOTA_FIELDS.items()
+    }
+
+
+def reconcile_usage(empresa_ids=None, dry_run=False):
+    """
+    Recalcula los contadores de uso a partir de los conteos reales.
+    Cada suscripción se bloquea (SELECT ... FOR UPDATE) antes de contar: las
+    creaciones en curso ya tienen la fila bloqueada por su UPDATE, así que el
+    conteo se hace después de que confirmen y no se pisa ningún incremento.
+    Devuelve la lista de (empresa_id, {contador: (antes, después)}) corregidas.
+    """
+    queryset = Suscripcion.objects.all()
+    if empresa_ids:
+        queryset = queryset.filter(empresa_id__in=empresa_ids)
+
+    corrected = []
+    for pk in queryset.values_list('pk', flat=True):
+        with transaction.atomic():
+            suscripcion = Suscripcion.objects.select_for_update().filter(pk=pk).first()
+            if suscripcion is None:
+                continue
+            real = real_usage(suscripcion.empresa_id)
+            diff = {
+                field: (getattr(suscripcion, field), value)
+                for field, value in real.items() if getattr(suscripcion, field) != value
+            }
+            if not diff:
+                continue
+            if not dry_run:
+                Suscripcion.objects.filter(pk=pk).update(**real)
+                logger.warning(f"Contadores de uso corregidos para empresa {suscripcion.empresa_id}: {diff}")
+            corrected.append((suscripcion.empresa_id, diff))
+    return corrected
@@ -0,0 +1,216 @@
+# api/report_cache.py
+import os
+import json
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .permissions import read_counter, bump_counter
+from .report_query import canonical_filters
+
+logger = logging.getLogger(__name__)
+
+# --- VERSIÓN DE DATOS POR TENANT ---
+# Cada empresa tiene un contador que se incrementa (al confirmar la transacción)
+# cuando cambia un ActivoFijo o una de sus tablas de búsqueda (ver api/signals.py).
+# La versión forma parte de la clave, así que un cambio deja obsoletas todas las
+# entradas del tenant sin tener que buscarlas: simplemente dejan de pedirse.
+# La vista global del SuperAdmin usa su propio contador, que sube con cualquier cambio.
+DATA_VERSION_KEY = 'report_data_version:{scope}'
+GLOBAL_SCOPE = 'global'
+
+# Se incrementa si cambia el formato de las vistas previas o de los archivos,
+# o la interpretación de los filtros.
+CACHE_FORMAT_VERSION = 4
+
+PREVIEW_TTL = getattr(settings, 'REPORT_PREVIEW_CACHE_TTL', 60 * 15)
+# Tamaño máximo del directorio de exportaciones cacheadas (LRU por fecha de último uso)
+EXPORT_MAX_BYTES = getattr(settings, 'REPORT_EXPORT_CACHE_MAX_BYTES', 512 * 1024 * 1024)
+EXPORT_DIR = 'report_cache'  # Relativo a MEDIA_ROOT
+EXPORT_META_TTL = 60 * 60 * 24 * 7
+
+STATS_KEY = 'report_cache_stats:{kind}:{result}'
+STATS_KINDS = ('preview', 'export')
+
+EXTENSIONS = {'pdf': 'pdf', 'excel': 'xlsx'}
+
+
+def _scope(empresa_id):
+    return str(empresa_id) if empresa_id is not None else GLOBAL_SCOPE
+
+
+def get_data_version(empresa_id):
+    return read_counter(DATA_VERSION_KEY.format(scope=_scope(empresa_id)))
+
+
+def bump_data_version(empresa_ids):
+    """Deja obsoletas las entradas de las empresas indicadas (y las de la vista global)."""
+    for empresa_id in set(empresa_ids):
+        if empresa_id is not None:
+            bump_counter(DATA_VERSION_KEY.format(scope=_scope(empresa_id)))
+    bump_counter(DATA_VERSION_KEY.format(scope=GLOBAL_SCOPE))
+
+
+def normalize_filters(filters):
+    """
+    Forma canónica de los filtros (api/report_query.py). Se combinan con AND, así
+    que el orden y los duplicados no cambian el resultado:
+    ["laptop", " DEPTO: TI "] == ["depto:TI", "laptop"]. Lanza FilterSyntaxError.
+    """
+    return canonical_filters(filters)
+
+
+def cache_key(kind, empresa_id, filters, formato=None, extra=None):
+    payload = json.dumps(
+        [CACHE_FORMAT_VERSION, kind, _scope(empresa_id), get_data_version(empresa_id),
+         formato, normalize_filters(filters), extra],
+        separators=(',', ':'), ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+# --- ESTADÍSTICAS ---
+
+def _count(kind, result):
+    key = STATS_KEY.format(kind=kind, result=result)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # add() no pisa el valor si otro proceso lo creó a la vez
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def get_stats():
+    """Aciertos/fallos por tipo y ocupación del directorio de exportaciones."""
+    keys = [STATS_KEY.format(kind=k, result=r) for k in STATS_KINDS for r in ('hit', 'miss')]
+    values = cache.get_many(keys)
+    stats = {}
+    for kind in STATS_KINDS:
+        hits = values.get(STATS_KEY.format(kind=kind, result='hit'), 0)
+        misses = values.get(STATS_KEY.format(kind=kind, result='miss'), 0)
+        total = hits + misses
+        stats[kind] = {'hits': hits, 'misses': misses, 'hit_ratio': round(hits / total, 3) if total else None}
+    files, size = 0, 0
+    for entry in _export_entries():
+        files += 1
+        size += entry.stat().st_size
+    stats['export_disk'] = {'files': files, 'bytes': size, 'max_bytes': EXPORT_MAX_BYTES}
+    return stats
+
+
+def reset_stats():
+    cache.delete_many([STATS_KEY.format(kind=k, result=r) for k in STATS_KINDS for r in ('hit', 'miss')])
+
+
+# --- VISTAS PREVIAS (caché de Django) ---
+
+def get_preview(empresa_id, filters, params=None):
+    """
+    Devuelve (clave, datos); datos es None si no estaba en caché. `params` son
+    los parámetros de la página pedida (cursor, ordering, page_size...).
+    """
+    extra = sorted((k, v) for k, v in (params or {}).items()) or None
+    key = 'report_preview:' + cache_key('preview', empresa_id, filters, extra=extra)
+    data = cache.get(key)
+    _count('preview', 'miss' if data is None else 'hit')
+    return key, data
+
+
+def set_preview(key, data):
+    cache.set(key, data, timeout=PREVIEW_TTL)
+
+
+# --- EXPORTACIONES (disco, LRU acotado por tamaño) ---
+
+def _export_root():
+    return os.path.join(settings.MEDIA_ROOT, EXPORT_DIR)
+
+
+def _export_entries():
+    root = _export_root()
+    if not os.path.isdir(root):
+        return
+    for tenant_dir in os.scandir(root):
+        if tenant_dir.is_dir():
+            yield from (e for e in os.scandir(tenant_dir.path) if e.is_file() and not e.name.endswith('.part'))
+
+
+def get_or_render_export(empresa_id, filters, formato, render, extra=None):
+    """
+    Devuelve (archivo abierto en 'rb', metadatos, acierto) de la exportación
+    cacheada; quien la llama debe cerrarlo (FileResponse lo hace). Se devuelve el
+    archivo ya abierto porque evict_exports() de otro proceso puede borrar la ruta
+    en cualquier momento, pero un archivo abierto sigue siendo legible.
+    Si no existe, `render(fileobj)` genera el archivo (y devuelve un dict de
+    metadatos, ej. el número de páginas) en un temporal que luego se renombra: un
+    lector nunca ve un archivo a medias. Cada acierto renueva la fecha de uso
+    (mtime) para la LRU. `extra` distingue variantes del mismo reporte (ej. la divisa).
+    """
+    key = cache_key('export', empresa_id, filters, formato, extra)
+    tenant_dir = os.path.join(_export_root(), f'tenant_{_scope(empresa_id)}')
+    path = os.path.join(tenant_dir, f'{key}.{EXTENSIONS[formato]}')
+    meta_key = f'report_export_meta:{key}'
+
+    try:
+        fileobj = open(path, 'rb')
+    except FileNotFoundError:
+        pass
+    else:
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass  # Desalojado justo ahora: el archivo abierto sigue siendo válido
+        _count('export', 'hit')
+        return fileobj, cache.get(meta_key) or {}, True
+
+    _count('export', 'miss')
+    os.makedirs(tenant_dir, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.part'
+    fileobj = open(tmp_path, 'w+b')
+    try:
+        meta = render(fileobj) or {}
+        fileobj.flush()
+        os.replace(tmp_path, path)
+    except BaseException:
+        fileobj.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    fileobj.seek(0)
+    cache.set(meta_key, meta, timeout=EXPORT_META_TTL)
+    evict_exports(keep=path)
+    return fileobj, meta, False
+
+
+def evict_exports(keep=None, max_bytes=None):
+    """
+    Borra las exportaciones usadas hace más tiempo hasta que el directorio quepa
+    en max_bytes. Las de versiones de datos antiguas ya no se piden, así que son
+    las primeras en salir. Un archivo abierto (descarga en curso) sigue siendo
+    legible tras borrarlo. Devuelve los bytes liberados.
+    """
+    max_bytes = EXPORT_MAX_BYTES if max_bytes is None else max_bytes
+    entries = []
+    total = 0
+    for entry in _export_entries():
+        stat = entry.stat()
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total += stat.st_size
+    liberados = 0
+    for _mtime, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        total -= size
+        liberados += size
+    if liberados:
+        logger.info(f"evict_exports: {liberados} bytes liberados de la caché de exportaciones.")
+    return liberados
@@ -0,0 +1,213 @@
+# api/report_jobs.py
+import os
+import time
+import uuid
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ActivoFijo, ReporteJob
+from .pagination import estimate_count
+from .report_query import apply_filters
+from .divisas import conversion_para
+from .report_utils import write_excel_report, write_pdf_report
+
+logger = logging.getLogger(__name__)
+
+# Los artefactos terminados se conservan este tiempo; luego purge_expired() los borra
+REPORT_JOB_TTL = timedelta(hours=getattr(settings, 'REPORT_JOB_TTL_HOURS', 24))
+# Un trabajo "procesando" sin latido durante este tiempo se da por huérfano (worker caído)
+REPORT_JOB_STALE_AFTER = timedelta(minutes=getattr(settings, 'REPORT_JOB_STALE_MINUTES', 30))
+# Frecuencia máxima con la que un worker escribe el progreso (y el latido) en la BD
+PROGRESS_INTERVAL = 1.0  # segundos
+
+EXTENSIONS = {'pdf': 'pdf', 'excel': 'xlsx'}
+# Parámetros del formulario de ReporteActivosExport que se guardan en el trabajo
+ACTIVOS_FORM_PARAMS = ('departamento_id', 'proveedor_id', 'estado_id', 'fecha_min', 'fecha_max')
+
+
+def artifact_relpath(job, intento):
+    """
+    Ruta del archivo relativa a MEDIA_ROOT: tenant_<empresa>/reportes/<job>-<intento>.<ext>.
+    Cada intento escribe su propio archivo: uno devuelto a la cola no pisa al que lo reemplaza.
+    """
+    tenant = job.empresa_id or 'global'
+    return os.path.join(f'tenant_{tenant}', 'reportes', f'{job.id}-{intento.hex[:12]}.{EXTENSIONS[job.formato]}')
+
+
+def artifact_abspath(relpath):
+    return os.path.join(settings.MEDIA_ROOT, relpath)
+
+
+def download_filename(job):
+    return f"reporte_activos_{timezone.localtime(job.creado):%Y%m%d_%H%M}.{EXTENSIONS[job.formato]}"
+
+
+class IntentoPerdido(Exception):
+    """El trabajo ya no pertenece a este intento (se devolvió a la cola o se canceló)."""
+
+
+# --- COLA ---
+
+def enqueue(tenant, user, origen, formato, parametros):
+    """Registra un trabajo pendiente con el alcance (empresa) del contexto de tenant."""
+    return ReporteJob.objects.create(
+        empresa=None if tenant.ve_todo else tenant.empresa,
+        usuario=user, origen=origen, formato=formato, parametros=parametros,
+    )
+
+
+def claim_jobs(limit):
+    """
+    Toma hasta `limit` trabajos pendientes (los más antiguos), los marca como
+    "procesando" y devuelve pares (id, intento). En PostgreSQL, SELECT ... FOR
+    UPDATE SKIP LOCKED permite varios comandos process_report_jobs a la vez sin
+    que dos tomen el mismo trabajo. El intento (UUID nuevo por toma) identifica
+    al worker dueño: solo él puede avanzar o cerrar el trabajo.
+    """
+    if limit <= 0:
+        return []
+    with transaction.atomic():
+        ids = list(
+            ReporteJob.objects.select_for_update(skip_locked=True)
+            .filter(estado='pendiente').order_by('creado')
+            .values_list('id', flat=True)[:limit]
+        )
+        now = timezone.now()
+        tomados = []
+        for job_id in ids:
+            intento = uuid.uuid4()
+            ReporteJob.objects.filter(id=job_id).update(
+                estado='procesando', intento=intento, iniciado=now, latido=now, progreso=0, error=''
+            )
+            tomados.append((job_id, intento))
+    return tomados
+
+
+def requeue_stale(now=None):
+    """
+    Devuelve a la cola los trabajos "procesando" cuyo intento no da señales (sin
+    latido desde REPORT_JOB_STALE_AFTER). Se borra el intento: si el worker
+    seguía vivo, su siguiente latido o su cierre no encuentran el trabajo y abandona.
+    """
+    limite = (now or timezone.now()) - REPORT_JOB_STALE_AFTER
+    # Sin latido: trabajos tomados antes de que existiera (se mira cuándo empezaron)
+    sin_senal = Q(latido__lt=limite) | Q(latido__isnull=True, iniciado__lt=limite)
+    return ReporteJob.objects.filter(sin_senal, estado='procesando').update(
+        estado='pendiente', intento=None, iniciado=None, latido=None, progreso=0
+    )
+
+
+def mark_failed(job_id, error, intento=None):
+    """Marca el trabajo con error; con `intento`, solo si sigue perteneciendo a ese intento."""
+    jobs = ReporteJob.objects.filter(id=job_id).exclude(estado='completado')
+    if intento is not None:
+        jobs = jobs.filter(intento=intento, estado='procesando')
+    jobs.update(estado='error', error=str(error)[:2000], finalizado=timezone.now())
+
+
+def delete_artifact(relpath):
+    if not relpath:
+        return
+    try:
+        os.remove(artifact_abspath(relpath))
+    except FileNotFoundError:
+        pass
+
+
+def purge_expired(now=None):
+    """Borra los archivos caducados y marca sus trabajos como "expirado"."""
+    now = now or timezone.now()
+    expirados = ReporteJob.objects.filter(estado='completado', expira__lte=now)
+    purgados = 0
+    for job_id, archivo in expirados.values_list('id', 'archivo').iterator():
+        delete_artifact(archivo)
+        purgados += ReporteJob.objects.filter(id=job_id, estado='completado').update(
+            estado='expirado', archivo=''
+        )
+    if purgados:
+        logger.info(f"purge_expired: {purgados} reportes caducados eliminados.")
+    return purgados
+
+
+# --- EJECUCIÓN (dentro de un proceso del pool) ---
+
+def build_queryset(job):
+    """Reconstruye el queryset del reporte con el mismo alcance y filtros que la vista."""
+    # Import tardío: las vistas importan este módulo
+    from .views import ReporteActivosPreview
+
+    queryset = ActivoFijo.objects.all()
+    if job.empresa_id is not None:
+        queryset = queryset.filter(empresa_id=job.empresa_id)
+    if job.origen == 'activos':
+        return ReporteActivosPreview.filtrar_formulario(queryset, job.parametros)
+    return apply_filters(queryset, job.parametros.get('filters', []), job.empresa_id)
+
+
+def run_job(job_id, intento):
+    """
+    Genera el archivo de un trabajo ya tomado por claim_jobs() con `intento`. Se
+    ejecuta en un proceso del pool: escribe en un temporal propio del intento y
+    lo renombra al terminar, así nunca se sirve un archivo a medias. Cada
+    escritura de progreso es también el latido del intento; si el trabajo se
+    devolvió a la cola entretanto, el intento abandona sin tocar el registro.
+    """
+    job = (
+        ReporteJob.objects.select_related('empresa__divisa_base')
+        .filter(id=job_id, estado='procesando', intento=intento).first()
+    )
+    if job is None:
+        return
+    mio = ReporteJob.objects.filter(id=job_id, estado='procesando', intento=intento)
+    start = time.perf_counter()
+    relpath = artifact_relpath(job, intento)
+    abspath = artifact_abspath(relpath)
+    tmp_path = f'{abspath}.part'
+    try:
+        queryset = build_queryset(job)
+        conversion = conversion_para(job.empresa, job.parametros.get('divisa'))
+        total = estimate_count(queryset) or 1
+        last = [time.monotonic()]
+
+        def progress(filas):
+            now = time.monotonic()
+            if now - last[0] >= PROGRESS_INTERVAL:
+                last[0] = now
+                if not mio.update(progreso=min(99, filas * 100 // total), latido=timezone.now()):
+                    raise IntentoPerdido(job_id)
+
+        os.makedirs(os.path.dirname(abspath), exist_ok=True)
+        paginas = None
+        with open(tmp_path, 'wb') as fileobj:
+            if job.formato == 'excel':
+                filas = write_excel_report(queryset, fileobj, progress=progress, conversion=conversion)
+            else:
+                filas, paginas = write_pdf_report(queryset, fileobj, progress=progress, conversion=conversion)
+        os.replace(tmp_path, abspath)
+
+        now = timezone.now()
+        if not mio.update(
+            estado='completado', progreso=100, filas=filas, paginas=paginas,
+            archivo=relpath, tamano_bytes=os.path.getsize(abspath),
+            latido=now, finalizado=now, expira=now + REPORT_JOB_TTL,
+        ):
+            delete_artifact(relpath)
+            raise IntentoPerdido(job_id)
+        logger.info(
+            f"run_job: reporte {job_id} ({job.formato}) con {filas} filas en "
+            f"{(time.perf_counter() - start) * 1000:.0f} ms."
+        )
+    except IntentoPerdido:
+        logger.warning(f"run_job: el reporte {job_id} se reasignó a otro intento; se abandona este.")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    except Exception as e:
+        logger.error(f"run_job: error en el reporte {job_id}: {e}", exc_info=True)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        mark_failed(job_id, e, intento)
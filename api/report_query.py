@@ -0,0 +1,449 @@
+# api/report_query.py
+"""
+Compilador del lenguaje de filtros del reporte dinámico (ReporteQueryView).
+
+Cada elemento de la lista `filters` es una expresión; la lista se combina con AND.
+
+    laptop                          texto libre (índice de búsqueda, api/search.py)
+    "impresora laser"               texto libre con espacios
+    depto:TI                        contiene (sin mayúsculas/tildes del usuario)
+    depto: Recursos Humanos         el valor sin comillas llega hasta el siguiente operador
+    estado=En Uso  /  estado!=Baja  igual / distinto
+    valor>=500  valor<1000          comparaciones (valor, fecha_adq)
+    valor:100..500  fecha_adq:2024-01-01..   rangos (extremos incluidos, abiertos con '..')
+    depto:[TI, Finanzas]            lista IN (cualquiera de los valores)
+    depto:TI OR depto:Finanzas      OR / AND / NOT (también | & y los prefijos - y !)
+    NOT (estado=Baja OR valor<10)   agrupación con paréntesis
+
+Las expresiones se normalizan y su plan compilado (AST validado contra el
+registro de campos, valores ya convertidos, joins usados) se memoriza, así que
+una expresión repetida no se vuelve a analizar.
+
+Las comparaciones sobre tablas de búsqueda (departamento, categoría, estado,
+proveedor) no unen esas tablas a la consulta principal: primero se resuelven
+los ids que coinciden en la tabla del tenant y se filtra por la FK de
+ActivoFijo (`departamento_id IN (...)`), así el recorrido principal usa solo los
+índices de ActivoFijo. Las relaciones a-muchos (mantenimiento) se resuelven con
+EXISTS correlacionado, por lo que el resultado nunca necesita distinct().
+"""
+import re
+import logging
+import functools
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q, Exists, OuterRef
+
+from .models import ActivoFijo
+from .search import text_condition, annotate_rank
+
+logger = logging.getLogger(__name__)
+
+
+class FilterSyntaxError(ValueError):
+    """Expresión de filtro inválida (el mensaje se devuelve tal cual al cliente)."""
+
+
+class Field:
+    """Campo filtrable: ruta ORM, tipo de valor y si atraviesa una relación a-muchos."""
+    __slots__ = ('path', 'kind', 'to_many')
+
+    def __init__(self, path, kind='text', to_many=False):
+        self.path = path
+        self.kind = kind  # 'text' | 'number' | 'date'
+        self.to_many = to_many
+
+    @property
+    def join(self):
+        """Relación que hay que unir (None si es una columna de ActivoFijo)."""
+        return self.path.rsplit('__', 1)[0] if '__' in self.path else None
+
+
+# --- REGISTRO DE CAMPOS ---
+# ActivoFijo no tiene relación con Ubicacion, así que 'ubicacion' ya no es un campo.
+FIELDS = {
+    'depto': Field('departamento__nombre'),
+    'departamento': Field('departamento__nombre'),
+    'categoria': Field('item_catalogo__nombre'),
+    'estado': Field('estado__nombre'),
+    'proveedor': Field('proveedor__nombre'),
+    'nombre': Field('nombre'),
+    'codigo': Field('codigo_interno'),
+    'serial': Field('serial'),
+    'valor': Field('valor_actual', 'number'),
+    'fecha_adq': Field('fecha_adquisicion', 'date'),
+    'vida_util': Field('vida_util', 'number'),
+    # A-muchos: activos con algún mantenimiento en ese estado (EXISTS)
+    'mantenimiento': Field('mantenimientos__estado', to_many=True),
+}
+
+OPERATORS = {
+    'text': (':', '=', '!='),
+    'number': (':', '=', '!=', '>', '>=', '<', '<='),
+    'date': (':', '=', '!=', '>', '>=', '<', '<='),
+}
+RANGE_LOOKUPS = {'>': 'gt', '>=': 'gte', '<': 'lt', '<=': 'lte'}
+# Si la tabla de búsqueda devuelve hasta este número de ids, se incrustan como
+# lista literal (el planificador estima mejor); si no, se deja la subconsulta.
+LOOKUP_INLINE_LIMIT = 500
+
+KEYWORDS = {'OR': 'or', '|': 'or', 'AND': 'and', '&': 'and', 'NOT': 'not'}
+
+TOKEN_RE = re.compile(r'''
+    (?P<space>\s+)
+  | (?P<lparen>\()
+  | (?P<rparen>\))
+  | (?P<list>\[[^\]]*\])
+  | (?P<string>"(?:[^"\\]|\\.)*")
+  | (?P<op>>=|<=|!=|[:=<>])
+  | (?P<bang>!(?=[^\s!=)\]]))
+  | (?P<word>(?:[^\s()\[\]":=<>!]|!(?!=))+)
+''', re.VERBOSE)
+# '!' es NOT solo pegado al inicio de un término (!laptop, !depto:TI, !(...));
+# dentro de una palabra o suelto es un carácter más ("hola!"), y '!=' es operador.
+
+
+# --- ANÁLISIS (texto -> tokens -> AST) ---
+
+def normalize_expression(expression):
+    """Colapsa espacios fuera de comillas: es la clave con la que se memorizan los planes."""
+    partes = re.split(r'("(?:[^"\\]|\\.)*")', str(expression).strip())
+    return ''.join(p if i % 2 else ' '.join(p.split()) for i, p in enumerate(partes))
+
+
+def _tokenize(expression):
+    tokens = []
+    pos = 0
+    while pos < len(expression):
+        match = TOKEN_RE.match(expression, pos)
+        if match is None:
+            raise FilterSyntaxError(f"Carácter inesperado en la posición {pos + 1}: '{expression[pos]}'.")
+        kind = match.lastgroup
+        value = match.group(kind)
+        pos = match.end()
+        if kind == 'space':
+            continue
+        if kind == 'string':
+            value = re.sub(r'\\(.)', r'\1', value[1:-1])
+        elif kind == 'word' and value in KEYWORDS:
+            kind, value = KEYWORDS[value], value
+        elif kind == 'bang':
+            kind = 'not'
+        tokens.append((kind, value))
+    return tokens
+
+
+class _Parser:
+    """
+    Descenso recursivo. Precedencia: NOT > AND (explícito o por yuxtaposición) > OR.
+    Nodos: ('and', [..]), ('or', [..]), ('not', nodo), ('text', str),
+    ('cmp', clave, op, valor) con valor ('eq', v) | ('range', desde, hasta) | ('in', [v, ...]).
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self, offset=0):
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def parse(self):
+        node = self.parse_or()
+        if self.peek()[0] is not None:
+            raise FilterSyntaxError(f"Sobra '{self.peek()[1]}' al final de la expresión.")
+        return node
+
+    def parse_or(self):
+        nodes = [self.parse_and()]
+        while self.peek()[0] == 'or':
+            self.take()
+            nodes.append(self.parse_and())
+        return nodes[0] if len(nodes) == 1 else ('or', nodes)
+
+    def parse_and(self):
+        nodes = [self.parse_not()]
+        while self.peek()[0] not in (None, 'or', 'rparen'):
+            if self.peek()[0] == 'and':
+                self.take()
+            nodes.append(self.parse_not())
+        return nodes[0] if len(nodes) == 1 else ('and', nodes)
+
+    def parse_not(self):
+        kind, value = self.peek()
+        if kind == 'not':
+            self.take()
+            return ('not', self.parse_not())
+        if kind == 'word' and value.startswith('-') and len(value) > 1:
+            # -laptop  ->  NOT laptop
+            self.tokens[self.pos] = ('word', value[1:])
+            return ('not', self.parse_not())
+        return self.parse_atom()
+
+    def parse_atom(self):
+        kind, value = self.take()
+        if kind == 'lparen':
+            node = self.parse_or()
+            if self.take()[0] != 'rparen':
+                raise FilterSyntaxError("Falta cerrar un paréntesis.")
+            return node
+        if kind == 'word' and self.peek()[0] == 'op':
+            return self.parse_comparison(value)
+        if kind in ('word', 'string'):
+            return ('text', value)
+        if kind is None:
+            raise FilterSyntaxError("La expresión termina de forma inesperada.")
+        raise FilterSyntaxError(f"No se esperaba '{value}'.")
+
+    def parse_comparison(self, key):
+        field_key = key.lower()
+        field = FIELDS.get(field_key)
+        if field is None:
+            raise FilterSyntaxError(
+                f"Campo desconocido '{key}'. Campos válidos: {', '.join(sorted(FIELDS))}."
+            )
+        _kind, op = self.take()
+        if op not in OPERATORS[field.kind]:
+            raise FilterSyntaxError(f"El operador '{op}' no se puede usar con '{key}'.")
+
+        kind, raw = self.take()
+        if kind == 'list':
+            items = [item.strip().strip('"') for item in raw[1:-1].split(',') if item.strip()]
+            if not items:
+                raise FilterSyntaxError(f"La lista de '{key}' está vacía.")
+            if op in RANGE_LOOKUPS:
+                raise FilterSyntaxError(f"El operador '{op}' no admite listas.")
+            return ('cmp', field_key, op, ('in', [_convert(field, item, key) for item in items]))
+        if kind not in ('word', 'string'):
+            raise FilterSyntaxError(f"Falta el valor de '{key}{op}'.")
+
+        if kind == 'word' and '..' in raw and field.kind != 'text':
+            if op not in (':', '='):
+                raise FilterSyntaxError(f"Los rangos se escriben {key}:desde..hasta.")
+            desde, _sep, hasta = raw.partition('..')
+            if not desde and not hasta:
+                raise FilterSyntaxError(f"Rango vacío en '{key}'.")
+            return ('cmp', field_key, op, ('range',
+                                           _convert(field, desde, key) if desde else None,
+                                           _convert(field, hasta, key) if hasta else None))
+
+        if kind == 'word' and field.kind == 'text':
+            # Compatibilidad: "depto: Recursos Humanos" (el valor abarca las palabras siguientes)
+            words = [raw]
+            while self.peek()[0] == 'word' and self.peek(1)[0] != 'op':
+                words.append(self.take()[1])
+            raw = ' '.join(words)
+        return ('cmp', field_key, op, ('eq', _convert(field, raw, key)))
+
+
+def _convert(field, raw, key):
+    raw = raw.strip()
+    if field.kind == 'number':
+        try:
+            return Decimal(raw)
+        except InvalidOperation:
+            raise FilterSyntaxError(f"'{raw}' no es un número válido para '{key}'.")
+    if field.kind == 'date':
+        try:
+            return date.fromisoformat(raw)
+        except ValueError:
+            raise FilterSyntaxError(f"'{raw}' no es una fecha válida para '{key}' (AAAA-MM-DD).")
+    return raw
+
+
+# --- PLAN COMPILADO ---
+
+class FilterPlan:
+    """Resultado memorizable de compilar una expresión."""
+    __slots__ = ('ast', 'canonical', 'joins', 'to_many', 'rank_texts')
+
+    def __init__(self, ast):
+        self.ast = ast
+        self.canonical = _canonical(ast)
+        self.joins = frozenset(_walk_fields(ast, lambda f: f.join))
+        self.to_many = any(_walk_fields(ast, lambda f: f.to_many))
+        # Los textos que no están negados aportan al orden por relevancia
+        self.rank_texts = tuple(_positive_texts(ast))
+
+    def to_q(self, empresa_id=None, using='default', subqueries=True):
+        """
+        Condición Q del plan. Con subqueries=False se generan los joins de
+        siempre (y hace falta distinct() si to_many); solo lo usa el comando
+        explain_report_filters para comparar planes.
+        """
+        return _to_q(self.ast, empresa_id, using, subqueries)
+
+
+def _walk_fields(node, getter):
+    kind = node[0]
+    if kind in ('and', 'or'):
+        for child in node[1]:
+            yield from _walk_fields(child, getter)
+    elif kind == 'not':
+        yield from _walk_fields(node[1], getter)
+    elif kind == 'cmp':
+        value = getter(FIELDS[node[1]])
+        if value:
+            yield value
+
+
+def _positive_texts(node, negated=False):
+    kind = node[0]
+    if kind in ('and', 'or'):
+        for child in node[1]:
+            yield from _positive_texts(child, negated)
+    elif kind == 'not':
+        yield from _positive_texts(node[1], not negated)
+    elif kind == 'text' and not negated:
+        yield node[1]
+
+
+def _quote(value):
+    text = value.isoformat() if isinstance(value, date) else str(value)
+    if not text or re.search(r'[\s()\[\]":=<>!,]', text) or text in KEYWORDS:
+        return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    return text
+
+
+def _canonical(node):
+    """Forma canónica (claves en minúscula, operadores y comillas uniformes)."""
+    kind = node[0]
+    if kind == 'text':
+        return _quote(node[1])
+    if kind == 'not':
+        inner = _canonical(node[1])
+        return f"NOT {inner}" if node[1][0] in ('text', 'cmp', 'not') else f"NOT ({inner})"
+    if kind in ('and', 'or'):
+        parts = []
+        for child in node[1]:
+            text = _canonical(child)
+            if kind == 'and' and child[0] == 'or':
+                text = f"({text})"
+            parts.append(text)
+        return f" {kind.upper()} ".join(parts)
+    _cmp, key, op, value = node
+    if value[0] == 'in':
+        return f"{key}{op}[{', '.join(_quote(v) for v in value[1])}]"
+    if value[0] == 'range':
+        desde = value[1].isoformat() if isinstance(value[1], date) else (value[1] if value[1] is not None else '')
+        hasta = value[2].isoformat() if isinstance(value[2], date) else (value[2] if value[2] is not None else '')
+        return f"{key}:{desde}..{hasta}"
+    return f"{key}{op}{_quote(value[1])}"
+
+
+def _to_q(node, empresa_id, using, subqueries=True):
+    kind = node[0]
+    if kind == 'and':
+        q = Q()
+        for child in node[1]:
+            q &= _to_q(child, empresa_id, using, subqueries)
+        return q
+    if kind == 'or':
+        q = _to_q(node[1][0], empresa_id, using, subqueries)
+        for child in node[1][1:]:
+            q |= _to_q(child, empresa_id, using, subqueries)
+        return q
+    if kind == 'not':
+        return ~_to_q(node[1], empresa_id, using, subqueries)
+    if kind == 'text':
+        return text_condition(node[1], empresa_id=empresa_id, using=using)
+
+    _cmp, key, op, value = node
+    field = FIELDS[key]
+    if subqueries and field.join:
+        relation, column = field.path.split('__', 1)
+        q = _related_q(relation, _cmp_q(column, field, op, value), empresa_id, using)
+    else:
+        q = _cmp_q(field.path, field, op, value)
+    return ~q if op == '!=' else q
+
+
+def _cmp_q(path, field, op, value):
+    """Condición (sin negar) de una comparación sobre `path`."""
+    if value[0] == 'in':
+        if field.kind == 'text':
+            lookup = 'icontains' if op == ':' else 'iexact'
+            q = Q()
+            for item in value[1]:
+                q |= Q(**{f'{path}__{lookup}': item})
+            return q
+        return Q(**{f'{path}__in': value[1]})
+    if value[0] == 'range':
+        q = Q()
+        if value[1] is not None:
+            q &= Q(**{f'{path}__gte': value[1]})
+        if value[2] is not None:
+            q &= Q(**{f'{path}__lte': value[2]})
+        return q
+    if op in RANGE_LOOKUPS:
+        return Q(**{f'{path}__{RANGE_LOOKUPS[op]}': value[1]})
+    if field.kind == 'text':
+        return Q(**{f'{path}__{"icontains" if op == ":" else "iexact"}': value[1]})
+    return Q(**{path: value[1]})
+
+
+def _related_q(relation, condition, empresa_id, using):
+    """
+    Traduce una condición sobre una tabla relacionada sin unirla a ActivoFijo:
+    FK -> `relation_id IN (ids de la tabla del tenant que cumplen)`;
+    a-muchos -> EXISTS correlacionado con el activo.
+    """
+    rel = ActivoFijo._meta.get_field(relation)
+    related = rel.related_model.objects.using(using).filter(condition)
+    if not rel.many_to_one:
+        return Q(Exists(related.filter(**{rel.field.name: OuterRef('pk')})))
+    if empresa_id is not None:
+        related = related.filter(empresa_id=empresa_id)
+    ids = list(related.values_list('pk', flat=True)[:LOOKUP_INLINE_LIMIT + 1])
+    if len(ids) <= LOOKUP_INLINE_LIMIT:
+        return Q(**{f'{relation}__in': ids})
+    return Q(**{f'{relation}__in': related.values('pk')})
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile_normalized(expression):
+    return FilterPlan(_Parser(_tokenize(expression)).parse())
+
+
+def compile_expression(expression):
+    """Plan compilado (memorizado) de una expresión. Lanza FilterSyntaxError."""
+    normalized = normalize_expression(expression)
+    if not normalized:
+        raise FilterSyntaxError("Expresión vacía.")
+    return _compile_normalized(normalized)
+
+
+def compile_filters(filters):
+    """Planes de una lista de filtros (los vacíos se ignoran)."""
+    if not isinstance(filters, (list, tuple)):
+        raise FilterSyntaxError("El campo 'filters' debe ser una lista.")
+    return [compile_expression(f) for f in filters if str(f).strip()]
+
+
+def canonical_filters(filters):
+    """Lista canónica ordenada (AND conmutativo): clave estable para la caché de reportes."""
+    return sorted({plan.canonical for plan in compile_filters(filters)})
+
+
+def apply_filters(queryset, filters, empresa_id=None, subqueries=True):
+    """
+    Aplica la lista de filtros a un queryset de ActivoFijo. Si hay texto libre
+    (no negado) se ordena por relevancia. Con subqueries=False (solo para
+    comparar planes) se usan joins y distinct() si algún filtro es a-muchos.
+    """
+    plans = compile_filters(filters)
+    condition = Q()
+    for plan in plans:
+        condition &= plan.to_q(empresa_id=empresa_id, using=queryset.db, subqueries=subqueries)
+    queryset = queryset.filter(condition)
+    if not subqueries and any(plan.to_many for plan in plans):
+        queryset = queryset.distinct()
+    rank_texts = [texto for plan in plans for texto in plan.rank_texts]
+    if rank_texts:
+        queryset = annotate_rank(queryset, ' '.join(rank_texts), empresa_id).order_by('-search_rank', 'id')
+    return queryset
@@ -0,0 +1,170 @@
+# api/report_workbook.py
+import time
+import pickle
+import logging
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from openpyxl import Workbook
+
+from .models import (
+    ActivoFijo, Mantenimiento, RevalorizacionActivo, DepreciacionActivos, DisposicionActivos,
+    MovimientoInventario,
+)
+from .report_utils import (
+    REPORT_COLUMNS, REPORT_CHUNK_SIZE, spooled_file, write_excel_sheet, column_headers, convert_rows,
+)
+
+logger = logging.getLogger(__name__)
+
+# Hilos que leen las hojas en paralelo (cada uno con su propia conexión a la BD)
+WORKBOOK_WORKERS = getattr(settings, 'REPORT_WORKBOOK_WORKERS', 4)
+
+# --- HOJAS DEL LIBRO DE AUDITORÍA ---
+# (título, modelo, ruta hasta la empresa, columnas [(encabezado, ruta ORM)], orden,
+#  columna con la fecha de los importes: sus tasas de cambio; None = tasas actuales)
+WORKBOOK_SHEETS = [
+    ("Activos", ActivoFijo, 'empresa', REPORT_COLUMNS, ('codigo_interno',), None),
+    ("Mantenimientos", Mantenimiento, 'empresa', [
+        ("Código Activo", 'activo__codigo_interno'),
+        ("Activo", 'activo__nombre'),
+        ("Tipo", 'tipo'),
+        ("Estado", 'estado'),
+        ("Asignado a", 'empleado_asignado__usuario__username'),
+        ("Inicio", 'fecha_inicio'),
+        ("Fin", 'fecha_fin'),
+        ("Costo", 'costo'),
+        ("Problema", 'descripcion_problema'),
+        ("Solución", 'notas_solucion'),
+    ], ('fecha_inicio', 'id'), 'fecha_inicio'),
+    ("Revalorizaciones", RevalorizacionActivo, 'empresa', [
+        ("Fecha", 'fecha'),
+        ("Código Activo", 'activo__codigo_interno'),
+        ("Activo", 'activo__nombre'),
+        ("Valor Anterior", 'valor_anterior'),
+        ("Valor Nuevo", 'valor_nuevo'),
+        ("Factor", 'factor_aplicado'),
+        ("Realizado por", 'realizado_por__username'),
+        ("Notas", 'notas'),
+    ], ('fecha', 'id'), 'fecha'),
+    ("Depreciaciones", DepreciacionActivos, 'activo__empresa', [
+        ("Fecha", 'fecha'),
+        ("Código Activo", 'activo__codigo_interno'),
+        ("Activo", 'activo__nombre'),
+        ("Tipo", 'tipo_depreciacion__nombre'),
+        ("Monto", 'monto'),
+    ], ('fecha', 'id'), 'fecha'),
+    ("Disposiciones", DisposicionActivos, 'activo__empresa', [
+        ("Fecha", 'fecha'),
+        ("Código Activo", 'activo__codigo_interno'),
+        ("Activo", 'activo__nombre'),
+        ("Motivo", 'motivo'),
+        ("Valor", 'valor_disposicion'),
+        ("Impuesto", 'impuesto__nombre'),
+        ("Detalle", 'detalle'),
+    ], ('fecha', 'id'), 'fecha'),
+    ("Movimientos Inventario", MovimientoInventario, 'inventario__empresa', [
+        ("Fecha", 'fecha'),
+        ("Tipo", 'tipo_movimiento'),
+        ("Ítem", 'inventario__item_catalogo__nombre'),
+        ("Ubicación", 'inventario__ubicacion__nombre'),
+        ("Cantidad", 'cantidad'),
+        ("Descripción", 'descripcion'),
+    ], ('fecha', 'id'), 'fecha'),
+]
+
+
+def _excel_value(value):
+    # Excel no admite fechas con zona horaria: se escriben en hora local
+    if isinstance(value, datetime) and timezone.is_aware(value):
+        return timezone.localtime(value).replace(tzinfo=None)
+    return value
+
+
+def spool_sheet(queryset, columns, conversion=None, date_path=None):
+    """
+    Lee la proyección de una hoja por bloques (convirtiendo los importes si se pide
+    otra divisa) y la guarda serializada (pickle por bloque) en un temporal; así el
+    hilo no retiene las filas en memoria. Devuelve (archivo, filas). Se ejecuta en
+    un hilo del pool.
+    """
+    try:
+        fileobj = spooled_file()
+        count = 0
+        rows = queryset.values_list(*[path for _header, path in columns]).iterator(chunk_size=REPORT_CHUNK_SIZE)
+        rows = convert_rows(rows, columns, conversion, date_path)
+        chunk = []
+        for row in rows:
+            chunk.append(tuple(_excel_value(value) for value in row))
+            if len(chunk) >= REPORT_CHUNK_SIZE:
+                pickle.dump(chunk, fileobj, pickle.HIGHEST_PROTOCOL)
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            pickle.dump(chunk, fileobj, pickle.HIGHEST_PROTOCOL)
+            count += len(chunk)
+        fileobj.seek(0)
+        return fileobj, count
+    finally:
+        # La conexión es propia de este hilo: no debe quedar abierta al terminar
+        connection.close()
+
+
+def _spooled_rows(fileobj):
+    try:
+        while True:
+            yield from pickle.load(fileobj)
+    except EOFError:
+        return
+
+
+def sheet_querysets(tenant):
+    """
+    Queryset de cada hoja con el filtro de tenant aplicado, en el orden del libro:
+    (título, queryset, columnas, columna de fecha de los importes).
+    """
+    return [
+        (title, tenant.filtrar(model.objects.all(), campo=campo).order_by(*orden), columns, date_path)
+        for title, model, campo, columns, orden, date_path in WORKBOOK_SHEETS
+    ]
+
+
+def write_tenant_workbook(sheets, fileobj, workers=WORKBOOK_WORKERS, conversion=None):
+    """
+    Escribe el libro de auditoría (una hoja por entrada de `sheets`) en `fileobj`.
+    Las consultas de las hojas se ejecutan a la vez en un pool de hilos; este hilo
+    escribe cada hoja en el Workbook write-only según van terminando (openpyxl no
+    es seguro entre hilos), de modo que el tiempo total se acerca al de la hoja
+    más lenta más la escritura. `conversion` (api/divisas.py) fija la divisa de los
+    importes, cada uno con la tasa de su fecha. Devuelve {título: filas}.
+    """
+    start = time.perf_counter()
+    wb = Workbook(write_only=True)
+    # Las hojas se crean en orden; se rellenan en el orden en que terminan
+    hojas = {title: wb.create_sheet(title=title) for title, _queryset, _columns, _date in sheets}
+    headers = {title: column_headers(columns, conversion) for title, _queryset, columns, _date in sheets}
+    filas = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(sheets)))) as pool:
+        futures = {
+            pool.submit(spool_sheet, queryset, columns, conversion, date_path): title
+            for title, queryset, columns, date_path in sheets
+        }
+        try:
+            for future in as_completed(futures):
+                title = futures[future]
+                spool, _count = future.result()
+                with spool:
+                    filas[title] = write_excel_sheet(hojas[title], headers[title], _spooled_rows(spool))
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+    wb.save(fileobj)
+    logger.info(
+        f"write_tenant_workbook: {sum(filas.values())} filas en {len(filas)} hojas en "
+        f"{(time.perf_counter() - start) * 1000:.0f} ms ({filas})."
+    )
+    return filas
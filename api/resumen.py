@@ -0,0 +1,222 @@
+# api/resumen.py
+import logging
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Sum, Count, Value, Case, When, CharField, DecimalField
+from django.db.models.functions import ExtractYear, TruncMonth, Coalesce
+
+from .models import ActivoFijo, ResumenActivos
+
+logger = logging.getLogger(__name__)
+
+# Campos de ActivoFijo que determinan la fila del resumen (y el importe que suma)
+RESUMEN_FIELDS = ('empresa_id', 'departamento_id', 'estado_id', 'proveedor_id', 'item_catalogo_id',
+                  'fecha_adquisicion', 'valor_actual')
+# Campos "propios" cuyo cambio obliga a mover el activo de fila (ver señales)
+OWN_RESUMEN_FIELDS = {'empresa', 'departamento', 'estado', 'proveedor', 'item_catalogo',
+                      'fecha_adquisicion', 'valor_actual'}
+# Clave de una fila del resumen dentro de una empresa (ver sumar_valores)
+RESUMEN_KEY = ('departamento_id', 'estado_id', 'proveedor_id', 'item_catalogo_id', 'mes_adquisicion')
+REBUILD_BATCH_SIZE = 2000
+
+# Antigüedad por años desde el mes de adquisición: (etiqueta, años mínimos)
+AGE_BUCKETS = [('10+ años', 10), ('5-10 años', 5), ('3-5 años', 3), ('1-3 años', 1), ('< 1 año', 0)]
+
+# Dimensiones de agrupación: nombre público -> (expresión o campo, campo con el nombre legible)
+DIMENSIONS = {
+    'departamento': ('departamento_id', 'departamento__nombre'),
+    'estado': ('estado_id', 'estado__nombre'),
+    'proveedor': ('proveedor_id', 'proveedor__nombre'),
+    'categoria': ('item_catalogo_id', 'item_catalogo__nombre'),
+    'anio': ('anio', None),
+    'mes': ('mes_adquisicion', None),
+    'antiguedad': ('antiguedad', None),
+}
+METRICS = ('cantidad', 'valor_total', 'valor_promedio')
+DEFAULT_METRICS = ('cantidad', 'valor_total')
+
+
+# --- MANTENIMIENTO INCREMENTAL ---
+
+def snapshot(valores):
+    """(clave de la fila, valor) de un activo a partir de un dict con RESUMEN_FIELDS."""
+    clave = {
+        'empresa_id': valores['empresa_id'],
+        'departamento_id': valores['departamento_id'],
+        'estado_id': valores['estado_id'],
+        'proveedor_id': valores['proveedor_id'],
+        'item_catalogo_id': valores['item_catalogo_id'],
+        'mes_adquisicion': valores['fecha_adquisicion'].replace(day=1),
+    }
+    return clave, Decimal(valores['valor_actual'] or 0)
+
+
+def snapshot_activo(activo):
+    return snapshot({campo: getattr(activo, campo) for campo in RESUMEN_FIELDS})
+
+
+def _aplicar(clave, cantidad, valor):
+    """Suma (cantidad, valor) a una fila del resumen; la crea si hace falta."""
+    filas = ResumenActivos.objects.filter(**clave)
+    pk = filas.values_list('pk', flat=True).first()
+    if pk is not None:
+        ResumenActivos.objects.filter(pk=pk).update(
+            cantidad=F('cantidad') + cantidad, valor_total=F('valor_total') + valor
+        )
+        if cantidad < 0:
+            # Las filas vacías sobran (y Estado no se podría borrar si quedaran)
+            ResumenActivos.objects.filter(pk=pk, cantidad__lte=0).delete()
+    elif cantidad > 0:
+        ResumenActivos.objects.create(cantidad=cantidad, valor_total=valor, **clave)
+    else:
+        # Restar de una fila que no existe: el resumen se desvió (ej. tras un bulk_create)
+        logger.warning(f"Resumen de activos sin fila para {clave}; ejecuta rebuild_resumen_activos.")
+
+
+def registrar_cambio(anterior, actual):
+    """
+    Aplica al resumen el paso de un activo de `anterior` a `actual` (snapshots;
+    None en un alta o una baja). Si la fila no cambia solo se ajusta el valor.
+    """
+    if anterior is not None and actual is not None and anterior[0] == actual[0]:
+        if anterior[1] != actual[1]:
+            _aplicar(actual[0], 0, actual[1] - anterior[1])
+        return
+    if anterior is not None:
+        _aplicar(anterior[0], -1, -anterior[1])
+    if actual is not None:
+        _aplicar(actual[0], 1, actual[1])
+
+
+def sumar_valores(empresa_id, deltas):
+    """
+    Aplica cambios de valor sin movimiento de filas (ej. una revalorización por
+    lotes): `deltas` es {(departamento, estado, proveedor, categoría, mes): importe}
+    en el orden de RESUMEN_KEY. Dos consultas por llamada: se leen las filas de los
+    meses tocados y se suman todos los importes en un UPDATE ... CASE por fila.
+    Devuelve cuántas claves no tenían fila (el resumen se desvió).
+    """
+    deltas = {clave: delta for clave, delta in deltas.items() if delta}
+    if not deltas:
+        return 0
+    filas = ResumenActivos.objects.filter(
+        empresa_id=empresa_id, mes_adquisicion__in={clave[-1] for clave in deltas},
+    ).values_list('pk', *RESUMEN_KEY)
+    pks = {tuple(clave): pk for pk, *clave in filas}
+    whens = [When(pk=pks[clave], then=Value(delta)) for clave, delta in deltas.items() if clave in pks]
+    if whens:
+        ResumenActivos.objects.filter(pk__in=[pks[clave] for clave in deltas if clave in pks]).update(
+            valor_total=F('valor_total') + Case(*whens, output_field=DecimalField(max_digits=16, decimal_places=2))
+        )
+    sin_fila = len(deltas) - len(whens)
+    if sin_fila:
+        logger.warning(f"sumar_valores: {sin_fila} filas del resumen no existen para la empresa {empresa_id}.")
+    return sin_fila
+
+
+def rebuild_resumen(empresa_ids=None):
+    """
+    Regenera el resumen desde ActivoFijo con un GROUP BY (tras cargas masivas con
+    bulk_create/update, que no disparan señales). Devuelve el número de filas.
+    """
+    activos = ActivoFijo.objects.all()
+    resumen = ResumenActivos.objects.all()
+    if empresa_ids:
+        activos = activos.filter(empresa_id__in=empresa_ids)
+        resumen = resumen.filter(empresa_id__in=empresa_ids)
+    grupos = (
+        activos.annotate(mes=TruncMonth('fecha_adquisicion'))
+        .values('empresa_id', 'departamento_id', 'estado_id', 'proveedor_id', 'item_catalogo_id', 'mes')
+        .annotate(n=Count('pk'), total=Coalesce(Sum('valor_actual'), Decimal('0')))
+        .order_by()
+    )
+    with transaction.atomic():
+        resumen.delete()
+        filas = [
+            ResumenActivos(
+                empresa_id=g['empresa_id'], departamento_id=g['departamento_id'], estado_id=g['estado_id'],
+                proveedor_id=g['proveedor_id'], item_catalogo_id=g['item_catalogo_id'],
+                mes_adquisicion=g['mes'], cantidad=g['n'], valor_total=g['total'],
+            )
+            for g in grupos.iterator()
+        ]
+        ResumenActivos.objects.bulk_create(filas, batch_size=REBUILD_BATCH_SIZE)
+    logger.info(f"rebuild_resumen: {len(filas)} filas de resumen generadas.")
+    return len(filas)
+
+
+# --- CONSULTA ---
+
+def _add_years(dia, years):
+    try:
+        return dia.replace(year=dia.year + years)
+    except ValueError:  # 29 de febrero
+        return dia.replace(year=dia.year + years, day=28)
+
+
+def age_bucket_expression(hoy=None):
+    """Etiqueta de antigüedad según el mes de adquisición (precisión de un mes)."""
+    hoy = hoy or date.today()
+    whens = [
+        When(mes_adquisicion__lte=_add_years(hoy, -years), then=Value(etiqueta))
+        for etiqueta, years in AGE_BUCKETS[:-1]
+    ]
+    return Case(*whens, default=Value(AGE_BUCKETS[-1][0]), output_field=CharField())
+
+
+def aggregate(queryset, group_by, metrics=DEFAULT_METRICS, hoy=None):
+    """
+    Agrega un queryset de ResumenActivos (ya filtrado por tenant) en una sola
+    consulta GROUP BY. `group_by` y `metrics` deben estar validados contra
+    DIMENSIONS y METRICS. Devuelve una lista de dicts ordenada por las dimensiones.
+    """
+    if 'anio' in group_by:
+        queryset = queryset.annotate(anio=ExtractYear('mes_adquisicion'))
+    if 'antiguedad' in group_by:
+        queryset = queryset.annotate(antiguedad=age_bucket_expression(hoy))
+    campos = []
+    for dimension in group_by:
+        campo, nombre = DIMENSIONS[dimension]
+        campos.append(campo)
+        if nombre:
+            campos.append(nombre)
+    totales = {'n': Coalesce(Sum('cantidad'), 0), 'total': Coalesce(Sum('valor_total'), Decimal('0'))}
+    if campos:
+        filas = (
+            queryset.values(*campos).annotate(**totales).filter(n__gt=0)
+            .order_by(*[DIMENSIONS[d][1] or DIMENSIONS[d][0] for d in group_by])
+        )
+    else:
+        # Sin dimensiones: una sola fila con el total del tenant
+        filas = [queryset.aggregate(**totales)]
+    resultado = []
+    for fila in filas:
+        item = {}
+        for dimension in group_by:
+            campo, nombre = DIMENSIONS[dimension]
+            valor = fila[campo]
+            item[dimension] = {'id': valor, 'nombre': fila[nombre]} if nombre else valor
+        calculadas = {
+            'cantidad': fila['n'],
+            'valor_total': fila['total'],
+            'valor_promedio': (fila['total'] / fila['n']).quantize(Decimal('0.01')) if fila['n'] else None,
+        }
+        for metric in metrics:
+            item[metric] = calculadas[metric]
+        resultado.append(item)
+    return resultado
+
+
+def filtrar_resumen(queryset, params):
+    """Filtros por dimensión (ids) y rango de fechas de adquisición (por meses)."""
+    for param, campo in (('departamento_id', 'departamento_id'), ('estado_id', 'estado_id'),
+                         ('proveedor_id', 'proveedor_id'), ('categoria_id', 'item_catalogo_id')):
+        if params.get(param):
+            queryset = queryset.filter(**{campo: params[param]})
+    if params.get('fecha_min'):
+        queryset = queryset.filter(mes_adquisicion__gte=date.fromisoformat(params['fecha_min']).replace(day=1))
+    if params.get('fecha_max'):
+        queryset = queryset.filter(mes_adquisicion__lte=date.fromisoformat(params['fecha_max']))
+    return queryset
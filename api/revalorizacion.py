@@ -0,0 +1,146 @@
+# api/revalorizacion.py
+import time
+import logging
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from .models import ActivoFijo, RevalorizacionActivo
+from .report_cache import bump_data_version
+from .resumen import rebuild_resumen, sumar_valores
+
+logger = logging.getLogger(__name__)
+
+REVAL_TYPES = ('factor', 'fijo', 'porcentual')
+# Activos por lote al leer, insertar el historial y actualizar valor_actual
+REVALORIZACION_CHUNK_SIZE = 2000
+
+# Campos de ActivoFijo que ubican al activo en su fila del resumen (ver resumen.RESUMEN_KEY)
+RESUMEN_FIELDS = ('departamento_id', 'estado_id', 'proveedor_id', 'item_catalogo_id', 'fecha_adquisicion')
+
+CENTIMOS = Decimal('0.01')
+FACTOR_DECIMALES = Decimal('0.000001')
+
+
+class RevalorizacionError(ValueError):
+    """Parámetros de revalorización inválidos (se responde 400)."""
+
+
+def parse_valor(reval_type, value_str):
+    """Valida el tipo y el valor pedido; devuelve el valor como Decimal."""
+    if reval_type not in REVAL_TYPES:
+        raise RevalorizacionError('reval_type inválido.')
+    try:
+        value = Decimal(str(value_str))
+    except ArithmeticError:
+        raise RevalorizacionError('El valor proporcionado no es un número válido.')
+    if not value.is_finite():
+        raise RevalorizacionError('El valor proporcionado no es un número válido.')
+    if reval_type == 'porcentual':
+        if value <= -100:
+            raise RevalorizacionError("El porcentaje no puede ser menor o igual a -100%.")
+    elif value < 0:
+        raise RevalorizacionError("El valor no puede ser negativo para este método.")
+    return value
+
+
+def calcular(valor_anterior, reval_type, value):
+    """(valor_nuevo, factor_aplicado) de un activo; None si no se puede revalorizar."""
+    if valor_anterior == 0 and reval_type != 'fijo':
+        return None  # Un factor o porcentaje sobre cero no tiene efecto
+    if reval_type == 'factor':
+        factor = value
+        valor_nuevo = valor_anterior * factor
+    elif reval_type == 'fijo':
+        valor_nuevo = value
+        factor = valor_nuevo / valor_anterior if valor_anterior > 0 else Decimal(0)
+    else:
+        factor = Decimal(1) + (value / Decimal(100))
+        valor_nuevo = valor_anterior * factor
+    return (
+        valor_nuevo.quantize(CENTIMOS, rounding=ROUND_HALF_UP),
+        factor.quantize(FACTOR_DECIMALES, rounding=ROUND_HALF_UP),
+    )
+
+
+def revalorizar_masivo(queryset, empresa_id, reval_type, value, notas=None, usuario=None,
+                       chunk_size=REVALORIZACION_CHUNK_SIZE):
+    """
+    Revaloriza todos los activos de `queryset` (ya filtrado por la empresa) en una
+    sola transacción: bloquea las filas (SELECT ... FOR UPDATE), calcula los valores
+    nuevos por lotes con aritmética Decimal, inserta el historial con bulk_create y
+    actualiza valor_actual desde ese historial. El resumen (api/resumen.py) recibe
+    la diferencia de cada lote agrupada por fila. Si algo falla no se aplica nada.
+    Devuelve un resumen: activos, revalorizados, omitidos (valor cero), totales y ms.
+    """
+    start = time.perf_counter()
+    revalorizados = omitidos = resumen_desviado = 0
+    total_anterior = total_nuevo = Decimal(0)
+    with transaction.atomic():
+        filas = (
+            queryset.select_for_update(of=('self',)).order_by('pk')
+            .values_list('pk', 'valor_actual', *RESUMEN_FIELDS).iterator(chunk_size=chunk_size)
+        )
+        lote = []
+        for fila in filas:
+            lote.append(fila)
+            if len(lote) >= chunk_size:
+                r, o, anterior, nuevo, d = _aplicar_lote(lote, empresa_id, reval_type, value, notas, usuario)
+                revalorizados, omitidos, resumen_desviado = revalorizados + r, omitidos + o, resumen_desviado + d
+                total_anterior, total_nuevo = total_anterior + anterior, total_nuevo + nuevo
+                lote = []
+        if lote:
+            r, o, anterior, nuevo, d = _aplicar_lote(lote, empresa_id, reval_type, value, notas, usuario)
+            revalorizados, omitidos, resumen_desviado = revalorizados + r, omitidos + o, resumen_desviado + d
+            total_anterior, total_nuevo = total_anterior + anterior, total_nuevo + nuevo
+
+    if revalorizados:
+        # update() no dispara señales: las cachés de reportes se invalidan aquí
+        if resumen_desviado:
+            rebuild_resumen([empresa_id])
+        bump_data_version([empresa_id])
+    resultado = {
+        'activos': revalorizados + omitidos,
+        'revalorizados': revalorizados,
+        'omitidos': omitidos,
+        'valor_anterior_total': total_anterior,
+        'valor_nuevo_total': total_nuevo,
+        'diferencia': total_nuevo - total_anterior,
+        'ms': round((time.perf_counter() - start) * 1000),
+    }
+    logger.info(f"revalorizar_masivo: empresa {empresa_id}, {reval_type} {value}: {resultado}")
+    return resultado
+
+
+def _aplicar_lote(lote, empresa_id, reval_type, value, notas, usuario):
+    """
+    Inserta el historial del lote y copia su valor_nuevo a valor_actual con un solo
+    UPDATE ... = (SELECT valor_nuevo ...) sobre las filas recién creadas (sus ids ya
+    se conocen antes del INSERT), en lugar de bulk_update, que compila un CASE WHEN
+    por activo. La diferencia de valor se suma al resumen por fila (sumar_valores).
+    """
+    historial = []
+    deltas = {}
+    total_anterior = total_nuevo = Decimal(0)
+    for pk, valor_anterior, departamento, estado, proveedor, categoria, fecha in lote:
+        calculado = calcular(valor_anterior, reval_type, value)
+        if calculado is None:
+            continue
+        valor_nuevo, factor = calculado
+        clave = (departamento, estado, proveedor, categoria, fecha.replace(day=1))
+        deltas[clave] = deltas.get(clave, Decimal(0)) + valor_nuevo - valor_anterior
+        historial.append(RevalorizacionActivo(
+            empresa_id=empresa_id, activo_id=pk, valor_anterior=valor_anterior,
+            valor_nuevo=valor_nuevo, factor_aplicado=factor, notas=notas, realizado_por=usuario,
+        ))
+        total_anterior += valor_anterior
+        total_nuevo += valor_nuevo
+    if historial:
+        RevalorizacionActivo.objects.bulk_create(historial)
+        nuevos = RevalorizacionActivo.objects.filter(
+            activo=OuterRef('pk'), pk__in=[h.id for h in historial],
+        ).values('valor_nuevo')[:1]
+        ActivoFijo.objects.filter(pk__in=[h.activo_id for h in historial]).update(valor_actual=Subquery(nuevos))
+    desviado = sumar_valores(empresa_id, deltas)
+    return len(historial), len(lote) - len(historial), total_anterior, total_nuevo, desviado
@@ -0,0 +1,180 @@
+# api/search.py
+import logging
+import unicodedata
+
+from django.db import connections
+from django.db.models import Q, F, FloatField, BooleanField, OuterRef, Subquery, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+from rest_framework.filters import BaseFilterBackend
+
+from .models import ActivoFijo, ActivoBusqueda, ActivoBusquedaFTS
+
+logger = logging.getLogger(__name__)
+
+# Campos de ActivoFijo (y de sus relaciones) que forman el documento de búsqueda.
+# ActivoFijo no tiene relación con Ubicacion, así que la ubicación no se indexa.
+DOCUMENT_FIELDS = (
+    'nombre', 'codigo_interno', 'serial',
+    'item_catalogo__nombre', 'item_catalogo__tipo_item',
+    'departamento__nombre', 'estado__nombre', 'proveedor__nombre',
+)
+
+# Campos "propios" cuyo cambio obliga a regenerar el documento (ver señales)
+OWN_DOCUMENT_FIELDS = {
+    'nombre', 'codigo_interno', 'serial', 'item_catalogo', 'departamento', 'estado', 'proveedor'
+}
+
+TS_CONFIG = 'spanish'      # Diccionario del tsvector (PostgreSQL)
+FTS_MIN_TOKEN = 3          # El tokenizer trigram de FTS5 necesita al menos 3 caracteres
+REINDEX_CHUNK_SIZE = 1000
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes: así se guarda el documento y así se busca."""
+    texto = unicodedata.normalize('NFKD', str(texto or '').lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+# --- MANTENIMIENTO DEL ÍNDICE ---
+
+def reindex_activos(activo_ids):
+    """
+    (Re)genera los documentos de los activos indicados con una consulta de
+    proyección y un upsert por bloque. Devuelve el número de documentos escritos.
+    """
+    activo_ids = list(activo_ids)
+    escritos = 0
+    for i in range(0, len(activo_ids), REINDEX_CHUNK_SIZE):
+        bloque = activo_ids[i:i + REINDEX_CHUNK_SIZE]
+        filas = ActivoFijo.objects.filter(pk__in=bloque).values_list('id', 'empresa_id', *DOCUMENT_FIELDS)
+        documentos = [
+            ActivoBusqueda(
+                activo_id=fila[0], empresa_id=fila[1],
+                documento=' '.join(normalizar(v) for v in fila[2:] if v)
+            )
+            for fila in filas
+        ]
+        ActivoBusqueda.objects.bulk_create(
+            documentos, update_conflicts=True,
+            unique_fields=['activo'], update_fields=['empresa', 'documento'],
+        )
+        escritos += len(documentos)
+    return escritos
+
+
+def reindex_queryset(queryset):
+    """Regenera los documentos de los activos de un queryset (por bloques)."""
+    return reindex_activos(queryset.values_list('pk', flat=True).iterator(chunk_size=REINDEX_CHUNK_SIZE))
+
+
+def rebuild_index(empresa_ids=None):
+    """Reconstruye el índice completo (o el de algunas empresas)."""
+    activos = ActivoFijo.objects.all()
+    documentos = ActivoBusqueda.objects.all()
+    if empresa_ids:
+        activos = activos.filter(empresa_id__in=empresa_ids)
+        documentos = documentos.filter(empresa_id__in=empresa_ids)
+    # Documentos huérfanos no deberían existir (CASCADE), pero por si acaso
+    documentos.exclude(activo_id__in=activos.values('pk')).delete()
+    return reindex_queryset(activos)
+
+
+# --- CONSULTA ---
+
+def search_activos(queryset, texto, empresa_id=None):
+    """
+    Filtra un queryset de ActivoFijo con el índice de búsqueda y lo anota con
+    `search_rank` (mayor = más relevante). Cada palabra debe aparecer en el
+    documento (como el antiguo icontains, pero sobre una sola columna indexada).
+    Con empresa_id se acota el índice al tenant antes de cruzarlo con el queryset.
+    """
+    if not normalizar(texto).split():
+        return annotate_rank(queryset, texto, empresa_id)
+    condicion = text_condition(texto, empresa_id=empresa_id, using=queryset.db)
+    return annotate_rank(queryset.filter(condicion), texto, empresa_id)
+
+
+def text_condition(texto, empresa_id=None, using='default'):
+    """
+    Condición Q "el documento contiene todas las palabras de `texto`" sobre el
+    índice, combinable con OR/NOT (la usa el compilador de api/report_query.py).
+    """
+    terminos = normalizar(texto).split()
+    if not terminos:
+        return Q()
+    documentos, _rank = _backend(terminos, using)
+    if empresa_id is not None:
+        documentos = documentos.filter(empresa=empresa_id)
+    return Q(pk__in=documentos.values('activo'))
+
+
+def annotate_rank(queryset, texto, empresa_id=None):
+    """Anota `search_rank` (0 si el activo no coincide o no hay texto)."""
+    terminos = normalizar(texto).split()
+    if not terminos:
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+    _documentos, rank = _backend(terminos, queryset.db)
+    rank = rank.filter(activo=OuterRef('pk'))
+    return queryset.annotate(
+        search_rank=Coalesce(Subquery(rank[:1], output_field=FloatField()), Value(0.0))
+    )
+
+
+def _backend(terminos, using):
+    """(documentos que coinciden, queryset con el ranking en 'r') según el motor."""
+    if connections[using].vendor == 'postgresql':
+        return _postgres_search(' '.join(terminos), terminos)
+    return _fts5_search(terminos)
+
+
+def _contiene_todos(terminos, campo='documento'):
+    condicion = Q()
+    for termino in terminos:
+        condicion &= Q(**{f'{campo}__contains': termino})
+    return condicion
+
+
+def _postgres_search(texto, terminos):
+    """tsvector (palabras con raíz, vía GIN) o subcadenas (LIKE acelerado por pg_trgm)."""
+    from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+    query = SearchQuery(texto, config=TS_CONFIG, search_type='websearch')
+    documentos = ActivoBusqueda.objects.filter(Q(vector=query) | _contiene_todos(terminos))
+    rank = ActivoBusqueda.objects.annotate(
+        r=SearchRank(F('vector'), query) + TrigramWordSimilarity(texto, 'documento')
+    ).values('r')
+    return documentos, rank
+
+
+def _fts5_search(terminos):
+    """SQLite: tabla FTS5 con tokenizer trigram (subcadenas) y bm25 como relevancia."""
+    largos = [t for t in terminos if len(t) >= FTS_MIN_TOKEN]
+    cortos = [t for t in terminos if len(t) < FTS_MIN_TOKEN]
+    if not largos:
+        # Solo términos muy cortos: sin índice, LIKE sobre el documento y sin ranking
+        documentos = ActivoBusqueda.objects.filter(_contiene_todos(cortos))
+        return documentos, ActivoBusqueda.objects.annotate(r=Value(0.0, output_field=FloatField())).values('r')
+
+    match = ' '.join('"{}"'.format(t.replace('"', '""')) for t in largos)
+    documentos = ActivoBusquedaFTS.objects.filter(
+        RawSQL('documento MATCH %s', [match], output_field=BooleanField()), _contiene_todos(cortos)
+    )
+    # bm25: cuanto más negativo, más relevante; se invierte para ordenar de mayor a menor
+    rank = documentos.annotate(r=-F('rank')).values('r')
+    return documentos, rank
+
+
+class IndexedSearchFilter(BaseFilterBackend):
+    """
+    Sustituye a SearchFilter de DRF (?search=) usando el índice de búsqueda.
+    El resultado queda anotado con `search_rank` para ordenar por relevancia.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        texto = request.query_params.get(self.search_param, '')
+        if not texto.strip():
+            return queryset
+        tenant = getattr(view, 'tenant', None)
+        empresa_id = tenant.empresa_id if tenant is not None and not tenant.ve_todo else None
+        return search_activos(queryset, texto, empresa_id=empresa_id)
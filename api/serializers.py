@@ -2,26 +2,29 @@
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth.models import User
-from .permissions import check_permission, HasPermission
+from .permissions import check_permission, HasPermission, add_permission_claims
+from .tenancy import get_tenant
 from .models import *
 from django.db import transaction
 from datetime import timedelta
+from django.urls import reverse
+from .report_jobs import ACTIVOS_FORM_PARAMS
+from .report_query import compile_filters, FilterSyntaxError
+from .divisas import resolver_divisa, DivisaError
 
 class CurrentUserEmpresaDefault:
     requires_context = True
 
     def __call__(self, serializer_field):
-        request = serializer_field.context['request']
-        user = request.user
-        if user.is_staff:
-            empresa = Empresa.objects.first()
-            if not empresa:
-                raise serializers.ValidationError("No hay empresas registradas. El superusuario no puede crear datos.")
+        # El contexto de tenant se resuelve una vez por request (api/tenancy.py),
+        # no una vez por HiddenField/serializer
+        tenant = get_tenant(serializer_field.context['request'])
+        empresa = tenant.empresa_para_escritura()
+        if empresa is not None:
             return empresa
-        
-        if hasattr(user, 'empleado'):
-            return user.empleado.empresa
-        
+
+        if tenant.is_staff:
+            raise serializers.ValidationError("No hay empresas registradas. El superusuario no puede crear datos.")
         raise serializers.ValidationError("El usuario no está asociado a una empresa.")
 
 class EmpresaSerializer(serializers.ModelSerializer):
@@ -41,6 +44,9 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
             token['empresa_id'] = str(empleado.empresa.id)
             token['empresa_nombre'] = empleado.empresa.nombre
             token['roles'] = [rol.nombre for rol in empleado.roles.all()]             
+            # Permisos resueltos + versión de autorización (HasPermission confía en ellos
+            # mientras la versión de la empresa no cambie)
+            add_permission_claims(token, user, empleado.empresa_id)
             token['is_admin'] = user.is_staff 
             token['empleado_id'] = str(empleado.id) # <-- ID del Empleado
             token['theme_preference'] = empleado.theme_preference
@@ -53,6 +59,7 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
             token['empresa_id'] = None
             token['empresa_nombre'] = None
             token['roles'] = []
+            token['permisos'] = []
             token['is_admin'] = user.is_staff
             token['empleado_id'] = None
             token['theme_preference'] = None
@@ -452,6 +459,42 @@ class RevalorizacionActivoSerializer(serializers.ModelSerializer):
         model = RevalorizacionActivo
         fields = '__all__'
 
+class TipoDepreciacionSerializer(serializers.ModelSerializer):
+    empresa = serializers.HiddenField(default=CurrentUserEmpresaDefault())
+    metodo_display = serializers.CharField(source='get_metodo_display', read_only=True)
+
+    class Meta:
+        model = TipoDepreciacion
+        fields = '__all__'
+
+    def validate(self, data):
+        contable = data.get('contable', self.instance.contable if self.instance else False)
+        if self.instance is not None and contable != self.instance.contable and self.instance.depreciaciones.exists():
+            raise serializers.ValidationError({'contable': 'No se puede cambiar en un tipo que ya tiene cargos.'})
+        if contable:
+            otros = TipoDepreciacion.objects.filter(empresa=data['empresa'], contable=True)
+            if self.instance is not None:
+                otros = otros.exclude(pk=self.instance.pk)
+            if otros.exists():
+                raise serializers.ValidationError({'contable': 'La empresa ya tiene un tipo de depreciación contable.'})
+        return data
+
+class DepreciacionActivosSerializer(serializers.ModelSerializer):
+    activo_nombre = serializers.CharField(source='activo.nombre', read_only=True)
+    activo_codigo = serializers.CharField(source='activo.codigo_interno', read_only=True)
+    tipo_depreciacion_nombre = serializers.CharField(source='tipo_depreciacion.nombre', read_only=True)
+
+    class Meta:
+        model = DepreciacionActivos
+        fields = '__all__'
+
+class CierreDepreciacionSerializer(serializers.ModelSerializer):
+    tipo_depreciacion_nombre = serializers.CharField(source='tipo_depreciacion.nombre', read_only=True)
+
+    class Meta:
+        model = CierreDepreciacion
+        exclude = ('empresa',)
+
 class SuscripcionSerializer(serializers.ModelSerializer):
     plan_display = serializers.CharField(source='get_plan_display', read_only=True)
     estado_display = serializers.CharField(source='get_estado_display', read_only=True)
@@ -460,9 +503,10 @@ class SuscripcionSerializer(serializers.ModelSerializer):
         model = Suscripcion
         fields = [
             'id', 'plan', 'estado', 'fecha_inicio', 'fecha_fin', 
-            'max_usuarios', 'max_activos', 'plan_display', 'estado_display'
+            'max_usuarios', 'max_activos', 'usuarios_usados', 'activos_usados',
+            'plan_display', 'estado_display'
         ]
-        read_only_fields = ('empresa',)
+        read_only_fields = ('empresa', 'usuarios_usados', 'activos_usados')
 
 class NotificacionSerializer(serializers.ModelSerializer):
     tipo_display = serializers.CharField(source='get_tipo_display', read_only=True)
@@ -475,6 +519,57 @@ class NotificacionSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ('empresa',)
 
+class ReporteJobSerializer(serializers.ModelSerializer):
+    estado_display = serializers.CharField(source='get_estado_display', read_only=True)
+    url_descarga = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReporteJob
+        fields = [
+            'id', 'origen', 'formato', 'parametros', 'estado', 'estado_display', 'progreso',
+            'filas', 'paginas', 'tamano_bytes', 'error', 'creado', 'iniciado', 'finalizado',
+            'expira', 'url_descarga'
+        ]
+        read_only_fields = (
+            'estado', 'progreso', 'filas', 'paginas', 'tamano_bytes', 'error',
+            'creado', 'iniciado', 'finalizado', 'expira'
+        )
+
+    def get_url_descarga(self, obj):
+        if obj.estado != 'completado':
+            return None
+        request = self.context.get('request')
+        url = reverse('reporte_job-descargar', kwargs={'pk': obj.pk})
+        return request.build_absolute_uri(url) if request else url
+
+    def validate_parametros(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError("Debe ser un objeto.")
+        return value
+
+    def validate(self, data):
+        origen = data.get('origen', 'query')
+        parametros = data.get('parametros', {})
+        if origen == 'query':
+            filters = parametros.get('filters', [])
+            try:
+                compile_filters(filters)
+            except FilterSyntaxError as e:
+                raise serializers.ValidationError({'parametros': str(e)})
+            data['parametros'] = {'filters': filters}
+        else:
+            # Solo los parámetros del formulario de activos
+            data['parametros'] = {
+                k: parametros[k] for k in ACTIVOS_FORM_PARAMS if parametros.get(k)
+            }
+        if parametros.get('divisa'):
+            # Divisa de los importes del archivo (api/divisas.py), guardada por su código
+            try:
+                data['parametros']['divisa'] = resolver_divisa(parametros['divisa']).codigo
+            except DivisaError as e:
+                raise serializers.ValidationError({'parametros': str(e)})
+        return data
+
 class LogSerializer(serializers.ModelSerializer):
     # Definimos el usuario anidado para que se muestre info útil al LEER logs (opcional)
     # Al escribir, el backend lo asignará automáticamente.
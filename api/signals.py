@@ -0,0 +1,239 @@
+# api/signals.py
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import (
+    Empleado, Roles, Permisos, ActivoFijo, Suscripcion,
+    Departamento, Estado, Proveedor, ItemCatalogo, Divisa, TasaCambioHistorica,
+)
+from .permissions import invalidate_user_permissions, invalidate_all_permissions, bump_authz_version
+from .quotas import add_usage, quota_already_reserved, real_usage
+from .search import reindex_activos, reindex_queryset, OWN_DOCUMENT_FIELDS
+from .report_cache import bump_data_version
+from .resumen import registrar_cambio, snapshot, snapshot_activo, RESUMEN_FIELDS, OWN_RESUMEN_FIELDS
+from .divisas import invalidar_tasas
+
+
+def _invalidate_on_commit(user_ids, empresa_ids):
+    """
+    Invalida los permisos cacheados (y la versión de autorización de las empresas
+    afectadas, que caduca los claims de sus JWT) cuando la transacción confirme,
+    para que ninguna petición concurrente vuelva a cachear el estado anterior.
+    """
+    user_ids = set(user_ids)
+    empresa_ids = set(empresa_ids)
+
+    def invalidate():
+        invalidate_user_permissions(user_ids)
+        bump_authz_version(empresa_ids)
+
+    if user_ids or empresa_ids:
+        transaction.on_commit(invalidate)
+
+
+def _users_with_roles(role_ids):
+    return Empleado.objects.filter(roles__in=role_ids).values_list('usuario_id', flat=True).distinct()
+
+
+def _empresas_of_roles(role_ids):
+    return Roles.objects.filter(pk__in=role_ids).values_list('empresa_id', flat=True).distinct()
+
+
+# --- INVALIDACIÓN DE LA CACHÉ DE PERMISOS ---
+
+@receiver(m2m_changed, sender=Roles.permisos.through)
+def roles_permisos_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Se añadieron/quitaron permisos de un rol (o roles de un permiso)."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        role_ids = [instance.pk]  # instance es un Rol
+    elif action == 'pre_clear':
+        role_ids = list(instance.roles_set.values_list('id', flat=True))  # roles que tenían el permiso
+    else:
+        role_ids = list(pk_set or [])  # instance es un Permiso, pk_set son Roles
+    _invalidate_on_commit(_users_with_roles(role_ids), _empresas_of_roles(role_ids))
+
+
+@receiver(m2m_changed, sender=Empleado.roles.through)
+def empleado_roles_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Se asignaron/quitaron roles a un empleado (o empleados a un rol)."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        _invalidate_on_commit([instance.usuario_id], [instance.empresa_id])  # instance es un Empleado
+    elif action == 'pre_clear':
+        _invalidate_on_commit(_users_with_roles([instance.pk]), [instance.empresa_id])
+    else:
+        _invalidate_on_commit(
+            Empleado.objects.filter(pk__in=pk_set or []).values_list('usuario_id', flat=True),
+            [instance.empresa_id]
+        )
+
+
+@receiver(pre_delete, sender=Roles)
+def rol_deleted(sender, instance, **kwargs):
+    # El borrado en cascada de las tablas intermedias no dispara m2m_changed
+    _invalidate_on_commit(_users_with_roles([instance.pk]), [instance.empresa_id])
+
+
+@receiver(post_delete, sender=Empleado)
+def empleado_deleted(sender, instance, **kwargs):
+    # El User sigue existiendo aunque se borre su Empleado
+    _invalidate_on_commit([instance.usuario_id], [instance.empresa_id])
+
+
+@receiver([post_save, post_delete], sender=Permisos)
+def permiso_changed(sender, **kwargs):
+    # Renombrar o borrar un permiso afecta a todos los usuarios que lo tengan.
+    # La generación global también forma parte de la versión de autorización.
+    transaction.on_commit(invalidate_all_permissions)
+
+
+# --- CONTADORES DE USO DE LA SUSCRIPCIÓN ---
+# Se ejecutan dentro de la transacción del save()/delete(), así que el contador
+# y el registro se confirman (o se deshacen) juntos.
+
+@receiver(post_save, sender=Empleado)
+@receiver(post_save, sender=ActivoFijo)
+def cuota_registro_creado(sender, instance, created, **kwargs):
+    # Si el cupo se reservó con reserve_quota() (ViewSets con límite) ya está contado
+    if created and not quota_already_reserved(sender, instance.empresa_id):
+        add_usage(sender, instance.empresa_id, 1)
+
+
+@receiver(post_delete, sender=Empleado)
+@receiver(post_delete, sender=ActivoFijo)
+def cuota_registro_borrado(sender, instance, **kwargs):
+    add_usage(sender, instance.empresa_id, -1)
+
+
+@receiver(pre_save, sender=Suscripcion)
+def suscripcion_inicializar_uso(sender, instance, **kwargs):
+    # En el registro de empresas el Empleado admin se crea antes que la Suscripción
+    if instance._state.adding and instance.empresa_id:
+        for field, value in real_usage(instance.empresa_id).items():
+            setattr(instance, field, value)
+
+
+# --- ÍNDICE DE BÚSQUEDA DE ACTIVOS (api/search.py) ---
+
+# Relaciones cuyo nombre forma parte del documento: modelo -> (campo en ActivoFijo, campos indexados)
+SEARCH_RELATED = {
+    Departamento: ('departamento', ('nombre',)),
+    Estado: ('estado', ('nombre',)),
+    Proveedor: ('proveedor', ('nombre',)),
+    ItemCatalogo: ('item_catalogo', ('nombre', 'tipo_item')),
+}
+
+
+@receiver(post_save, sender=ActivoFijo)
+def busqueda_activo_guardado(sender, instance, created, update_fields=None, **kwargs):
+    # save(update_fields=[...]) que no toca campos del documento no necesita reindexar
+    if update_fields is not None and not OWN_DOCUMENT_FIELDS.intersection(update_fields):
+        return
+    reindex_activos([instance.pk])
+
+
+@receiver(pre_save, sender=Departamento)
+@receiver(pre_save, sender=Estado)
+@receiver(pre_save, sender=Proveedor)
+@receiver(pre_save, sender=ItemCatalogo)
+def busqueda_relacion_antes_de_guardar(sender, instance, **kwargs):
+    # Se recuerdan los nombres anteriores para reindexar solo si cambian
+    if instance._state.adding:
+        return
+    _fk, campos = SEARCH_RELATED[sender]
+    instance._busqueda_anterior = sender.objects.filter(pk=instance.pk).values_list(*campos).first()
+
+
+@receiver(post_save, sender=Departamento)
+@receiver(post_save, sender=Estado)
+@receiver(post_save, sender=Proveedor)
+@receiver(post_save, sender=ItemCatalogo)
+def busqueda_relacion_guardada(sender, instance, created, **kwargs):
+    if created:
+        return  # Aún no hay activos que la referencien
+    fk, campos = SEARCH_RELATED[sender]
+    actual = tuple(getattr(instance, campo) for campo in campos)
+    if getattr(instance, '_busqueda_anterior', None) != actual:
+        reindex_queryset(ActivoFijo.objects.filter(**{fk: instance}))
+
+
+@receiver(pre_delete, sender=Departamento)
+@receiver(pre_delete, sender=Proveedor)
+@receiver(pre_delete, sender=ItemCatalogo)
+def busqueda_relacion_antes_de_borrar(sender, instance, **kwargs):
+    # on_delete=SET_NULL: tras el borrado ya no se puede saber qué activos la tenían
+    fk, _campos = SEARCH_RELATED[sender]
+    instance._activos_a_reindexar = list(ActivoFijo.objects.filter(**{fk: instance}).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Departamento)
+@receiver(post_delete, sender=Proveedor)
+@receiver(post_delete, sender=ItemCatalogo)
+def busqueda_relacion_borrada(sender, instance, **kwargs):
+    reindex_activos(getattr(instance, '_activos_a_reindexar', []))
+
+
+# --- VERSIÓN DE DATOS DE LOS REPORTES (api/report_cache.py) ---
+
+@receiver([post_save, post_delete], sender=ActivoFijo)
+@receiver([post_save, post_delete], sender=Departamento)
+@receiver([post_save, post_delete], sender=Estado)
+@receiver([post_save, post_delete], sender=Proveedor)
+@receiver([post_save, post_delete], sender=ItemCatalogo)
+def reporte_datos_cambiados(sender, instance, **kwargs):
+    # Al confirmar: un lector concurrente no puede cachear el estado anterior con la versión nueva
+    empresa_id = instance.empresa_id
+    transaction.on_commit(lambda: bump_data_version([empresa_id]))
+
+
+# --- RESUMEN DE ACTIVOS PARA AGREGADOS (api/resumen.py) ---
+# Se ejecutan dentro de la transacción del save()/delete(): el resumen y el
+# activo se confirman (o se deshacen) juntos.
+
+@receiver(pre_save, sender=ActivoFijo)
+def resumen_activo_antes_de_guardar(sender, instance, update_fields=None, **kwargs):
+    # Se recuerda la fila del resumen en la que estaba el activo
+    if instance._state.adding:
+        return
+    if update_fields is not None and not OWN_RESUMEN_FIELDS.intersection(update_fields):
+        return
+    anterior = ActivoFijo.objects.filter(pk=instance.pk).values(*RESUMEN_FIELDS).first()
+    instance._resumen_anterior = snapshot(anterior) if anterior else None
+
+
+@receiver(post_save, sender=ActivoFijo)
+def resumen_activo_guardado(sender, instance, created, update_fields=None, **kwargs):
+    if not created and update_fields is not None and not OWN_RESUMEN_FIELDS.intersection(update_fields):
+        return
+    anterior = None if created else getattr(instance, '_resumen_anterior', None)
+    registrar_cambio(anterior, snapshot_activo(instance))
+    instance._resumen_anterior = None
+
+
+@receiver(post_delete, sender=ActivoFijo)
+def resumen_activo_borrado(sender, instance, **kwargs):
+    registrar_cambio(snapshot_activo(instance), None)
+
+
+# --- HISTORIAL DE TASAS DE CAMBIO (api/divisas.py) ---
+
+@receiver(post_save, sender=Divisa)
+def divisa_guardada(sender, instance, **kwargs):
+    # Un cambio de tasa_cambio (admin, seed_data...) queda en el historial, vigente desde hoy
+    ultima = instance.historial_tasas.order_by('-fecha').values_list('tasa', flat=True).first()
+    if ultima != instance.tasa_cambio:
+        TasaCambioHistorica.objects.update_or_create(
+            divisa=instance, fecha=timezone.localdate(), defaults={'tasa': instance.tasa_cambio},
+        )
+    invalidar_tasas()
+
+
+@receiver(post_delete, sender=Divisa)
+@receiver([post_save, post_delete], sender=TasaCambioHistorica)
+def tasas_cambiadas(sender, instance, **kwargs):
+    invalidar_tasas()
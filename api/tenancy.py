@@ -0,0 +1,121 @@
+# api/tenancy.py
+import uuid
+import logging
+from .models import Empresa, Empleado, Suscripcion
+
+logger = logging.getLogger(__name__)
+
+# Cabecera con la que un SuperAdmin (is_staff) elige explícitamente la empresa
+# sobre la que opera. Sin ella conserva la vista global de siempre.
+TENANT_HEADER = 'HTTP_X_EMPRESA_ID'  # X-Empresa-Id
+
+
+class TenantContext:
+    """
+    Contexto de tenant de un request: Empleado, Empresa y Suscripción resueltos
+    UNA sola vez (con select_related) y compartidos por vistas, permisos,
+    serializers y defaults.
+    """
+    def __init__(self, user=None, empleado=None, empresa=None, is_staff=False, seleccion_explicita=False):
+        self.user = user
+        self.empleado = empleado
+        self.empresa = empresa
+        self.is_staff = is_staff
+        self.seleccion_explicita = seleccion_explicita
+        self._empresa_por_defecto = None
+
+    @property
+    def user_id(self):
+        return self.user.id if self.user is not None else None
+
+    @property
+    def empresa_id(self):
+        return self.empresa.id if self.empresa is not None else None
+
+    @property
+    def suscripcion(self):
+        """Suscripción de la empresa (precargada), o None si no tiene."""
+        if self.empresa is None:
+            return None
+        try:
+            return self.empresa.suscripcion
+        except Suscripcion.DoesNotExist:
+            return None
+
+    @property
+    def ve_todo(self):
+        """El SuperAdmin sin empresa seleccionada ve los datos de todas las empresas."""
+        return self.is_staff and not self.seleccion_explicita
+
+    def filtrar(self, queryset, campo='empresa'):
+        """Aplica el filtro de tenant a un queryset (campo: ruta hasta la empresa)."""
+        if self.ve_todo:
+            return queryset.all()
+        if self.empresa is None:
+            return queryset.none()
+        return queryset.filter(**{campo: self.empresa.pk})
+
+    def empresa_para_escritura(self):
+        """
+        Empresa a la que se asignan los registros nuevos. Para el SuperAdmin sin
+        cabecera X-Empresa-Id se mantiene el comportamiento previo (primera empresa).
+        """
+        if self.empresa is not None:
+            return self.empresa
+        if self.is_staff and not self.seleccion_explicita:
+            if self._empresa_por_defecto is None:
+                self._empresa_por_defecto = Empresa.objects.select_related('suscripcion').first()
+            return self._empresa_por_defecto
+        return None
+
+
+def _resolve(request):
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return TenantContext(user=user)
+
+    if user.is_staff:
+        empresa_id = request.META.get(TENANT_HEADER)
+        if empresa_id:
+            try:
+                empresa = (
+                    Empresa.objects.select_related('suscripcion', 'divisa_base')
+                    .filter(pk=uuid.UUID(empresa_id)).first()
+                )
+            except ValueError:
+                empresa = None
+            if empresa is None:
+                # Una selección inválida no debe ampliar el alcance a "todas las empresas"
+                logger.warning(f"TenantContext: X-Empresa-Id inválido: {empresa_id}")
+            return TenantContext(user=user, empresa=empresa, is_staff=True, seleccion_explicita=True)
+        return TenantContext(user=user, is_staff=True)
+
+    empleado = (
+        Empleado.objects.select_related('empresa__suscripcion', 'empresa__divisa_base')
+        .filter(usuario_id=user.id).first()
+    )
+    if empleado is None:
+        return TenantContext(user=user)
+
+    # Dejar el empleado cacheado en ambos lados de la relación para que
+    # request.user.empleado / empleado.usuario no vuelvan a consultar la BD.
+    Empleado.usuario.field.set_cached_value(empleado, user)
+    type(user).empleado.related.set_cached_value(user, empleado)
+    return TenantContext(user=user, empleado=empleado, empresa=empleado.empresa)
+
+
+def get_tenant(request):
+    """
+    Devuelve el TenantContext del request, resolviéndolo la primera vez.
+    Se memoriza en el HttpRequest subyacente (compartido por la vista DRF, los
+    permisos y los serializers) y se vuelve a resolver solo si cambia el usuario,
+    p. ej. si alguien lo consultó antes de que DRF autenticara el JWT.
+    """
+    holder = getattr(request, '_request', request)
+    user = getattr(request, 'user', None)
+    user_id = getattr(user, 'id', None)
+    ctx = getattr(holder, '_tenant_context', None)
+    if ctx is None or ctx.user_id != user_id:
+        ctx = _resolve(request)
+        holder._tenant_context = ctx
+    return ctx
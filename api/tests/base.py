@@ -0,0 +1,29 @@
+# api/tests/base.py
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from api.models import Divisa, Empresa
+from api.management.commands.seed_data import generar_tenant
+
+# Tenant sintético pequeño: basta para recorrer páginas, lotes y periodos
+OPCIONES_TENANT = {'assets': 60, 'employees': 2, 'movements': 0, 'proveedores': 5, 'seed': 7, 'batch_size': 1000}
+
+
+class TenantTestCase(TestCase):
+    """Empresa generada con seed_data (BOB como divisa base) compartida por los tests de la clase."""
+    databases = '__all__'
+    indice_tenant = 1
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usd = Divisa.objects.create(codigo='USD', nombre='Dólar Americano', simbolo='$', tasa_cambio=Decimal('1.0'))
+        cls.bob = Divisa.objects.create(codigo='BOB', nombre='Boliviano', simbolo='Bs.', tasa_cambio=Decimal('6.96'))
+        empresa_id, _filas = generar_tenant(cls.indice_tenant, OPCIONES_TENANT)
+        cls.empresa = Empresa.objects.get(pk=empresa_id)
+
+    def setUp(self):
+        # Los contadores de versión (tasas, datos de reportes) viven en la caché
+        # y se suben en on_commit, que no corre dentro de un TestCase
+        cache.clear()
@@ -0,0 +1,93 @@
+# api/tests/test_authz.py
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+
+from api.management.commands.seed_data import PASSWORD
+from api.models import Empleado, Empresa, Permisos, Roles
+
+from .base import TenantTestCase
+
+
+class TokenAuthzVersionTests(TenantTestCase):
+    """
+    Un JWT emitido antes de un cambio de roles/permisos deja de conceder lo
+    revocado: la versión de autorización de su empresa ya no coincide y los
+    permisos se resuelven por la caché/BD (api/permissions.py).
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.usuario = User.objects.get(empleado__empresa=self.empresa, username__endswith='000000')
+        self.empleado = self.usuario.empleado
+        self.ver = Permisos.objects.create(nombre='ver_reportes', descripcion='Ver reportes')
+        self.gestionar = Permisos.objects.create(nombre='gestionar_activos', descripcion='Gestionar activos')
+        self.rol = Roles.objects.create(empresa=self.empresa, nombre='Contador')
+        self.rol.permisos.set([self.ver, self.gestionar])
+        self.empleado.roles.add(self.rol)
+        self.client = APIClient()
+
+    def emitir_token(self):
+        response = self.client.post('/api/token/', {'username': self.usuario.username, 'password': PASSWORD})
+        self.assertEqual(response.status_code, 200)
+        return response.data['access']
+
+    def permisos(self, access):
+        response = self.client.get('/api/my-permissions/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(response.status_code, 200)
+        return set(response.data)
+
+    def test_los_claims_se_usan_mientras_la_version_coincide(self):
+        access = self.emitir_token()
+        # Sin ejecutar los on_commit la versión no sube: el token sigue mandando
+        self.rol.permisos.remove(self.gestionar)
+        self.assertEqual(self.permisos(access), {'ver_reportes', 'gestionar_activos'})
+
+    def test_quitar_permiso_del_rol(self):
+        access = self.emitir_token()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rol.permisos.remove(self.gestionar)
+        self.assertEqual(self.permisos(access), {'ver_reportes'})
+        self.assertEqual(self.permisos(self.emitir_token()), {'ver_reportes'})
+
+    def test_quitar_rol_al_empleado(self):
+        access = self.emitir_token()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.empleado.roles.remove(self.rol)
+        self.assertEqual(self.permisos(access), set())
+
+    def test_vaciar_empleados_del_rol(self):
+        access = self.emitir_token()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rol.empleado_set.clear()
+        self.assertEqual(self.permisos(access), set())
+
+    def test_borrar_rol(self):
+        access = self.emitir_token()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rol.delete()
+        self.assertEqual(self.permisos(access), set())
+
+    def test_borrar_empleado(self):
+        access = self.emitir_token()
+        with self.captureOnCommitCallbacks(execute=True):
+            Empleado.objects.filter(pk=self.empleado.pk).delete()
+        self.assertEqual(self.permisos(access), set())
+
+    def test_renombrar_permiso(self):
+        access = self.emitir_token()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.gestionar.nombre = 'administrar_activos'
+            self.gestionar.save()
+        self.assertEqual(self.permisos(access), {'ver_reportes', 'administrar_activos'})
+
+    def test_cambios_en_otra_empresa_no_caducan_el_token(self):
+        access = self.emitir_token()
+        otro_rol = Roles.objects.create(empresa=self.empresa_ajena(), nombre='Contador')
+        with self.captureOnCommitCallbacks(execute=True):
+            otro_rol.permisos.add(self.ver)
+        # Versión intacta: el cambio en BD sin invalidar sigue sin verse
+        self.rol.permisos.remove(self.gestionar)
+        self.assertEqual(self.permisos(access), {'ver_reportes', 'gestionar_activos'})
+
+    def empresa_ajena(self):
+        return Empresa.objects.create(nombre='Empresa Ajena', nit='900000002')
@@ -0,0 +1,132 @@
+# api/tests/test_depreciacion.py
+from unittest import mock
+
+import numpy as np
+from django.db.models import Count, Sum
+from django.test import SimpleTestCase
+
+from api import depreciacion
+from api.depreciacion import (
+    DepreciacionError, calcular_cargos, cerrar_periodo, depreciar, parse_periodo, ultimo_mes_completo,
+)
+from api.models import ActivoFijo, CierreDepreciacion, DepreciacionActivos, TipoDepreciacion
+from .base import TenantTestCase
+
+
+def periodo(meses_atras):
+    """'AAAA-MM' de `meses_atras` meses antes del último mes completo."""
+    fin = ultimo_mes_completo()
+    anio, mes = divmod(fin.year * 12 + fin.month - 1 - meses_atras, 12)
+    return f'{anio}-{mes + 1:02d}'
+
+
+class CalcularCargosTests(SimpleTestCase):
+
+    def test_medio_centimo_redondea_hacia_arriba(self):
+        # 2.05 en los 2 últimos meses: 1.025 -> 1.03 (en float 1.025 es 1.02499...)
+        cargos = calcular_cargos(np.array([205, 105]), np.array([0, 0]), np.array([12, 12]), 11, 'LINEAL')
+        self.assertEqual(cargos.tolist(), [103, 53])
+        self.assertEqual(cargos.dtype, np.int64)
+
+    def test_el_cargo_no_supera_el_valor(self):
+        cargos = calcular_cargos(np.array([1, 0]), np.array([0, 0]), np.array([5, 5]), 3, 'SALDO_DECRECIENTE', 10)
+        self.assertEqual(cargos.tolist(), [1, 0])
+
+
+class DepreciarTests(TenantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tipo = TipoDepreciacion.objects.create(empresa=self.empresa, nombre='Lineal', contable=True)
+        self.activos = ActivoFijo.objects.filter(empresa=self.empresa)
+        self.valor_inicial = self.activos.aggregate(v=Sum('valor_actual'))['v']
+
+    def cargos(self):
+        return DepreciacionActivos.objects.filter(tipo_depreciacion=self.tipo)
+
+    def assertLibroCuadra(self):
+        """Un cargo por activo y periodo, y valor_actual baja exactamente lo cargado."""
+        repetidos = self.cargos().values('activo', 'fecha').annotate(n=Count('id')).filter(n__gt=1)
+        self.assertFalse(repetidos.exists())
+        cargado = self.cargos().aggregate(v=Sum('monto'))['v']
+        self.assertEqual(self.activos.aggregate(v=Sum('valor_actual'))['v'], self.valor_inicial - cargado)
+
+    def test_repetir_no_duplica_cargos(self):
+        resultados = depreciar(self.empresa.id, self.tipo, hasta=periodo(0), desde=periodo(2))
+        self.assertEqual([r['periodo'] for r in resultados], [periodo(2), periodo(1), periodo(0)])
+        total = self.cargos().count()
+        self.assertGreater(total, 0)
+
+        self.assertEqual(depreciar(self.empresa.id, self.tipo, hasta=periodo(0)), [])
+        self.assertEqual(self.cargos().count(), total)
+        self.assertLibroCuadra()
+
+    def test_cierre_interrumpido_se_retoma(self):
+        original = depreciacion.calcular_cargos
+        llamadas = []
+
+        def falla_en_el_tercer_lote(*args, **kwargs):
+            llamadas.append(1)
+            if len(llamadas) == 3:
+                raise RuntimeError('worker caído')
+            return original(*args, **kwargs)
+
+        with mock.patch.object(depreciacion, 'calcular_cargos', falla_en_el_tercer_lote):
+            with self.assertRaises(RuntimeError):
+                depreciar(self.empresa.id, self.tipo, hasta=periodo(0), desde=periodo(0), chunk_size=10)
+
+        cierre = CierreDepreciacion.objects.get(tipo_depreciacion=self.tipo)
+        self.assertIsNotNone(cierre.periodo_en_curso)
+        self.assertIsNotNone(cierre.ultimo_activo)
+        parcial = self.cargos().count()
+
+        resultados = depreciar(self.empresa.id, self.tipo, hasta=periodo(0), chunk_size=10)
+        self.assertEqual([r['periodo'] for r in resultados], [periodo(0)])
+        self.assertGreater(self.cargos().count(), parcial)
+        self.assertLibroCuadra()
+
+        cierre.refresh_from_db()
+        self.assertIsNone(cierre.periodo_en_curso)
+        self.assertEqual(f'{cierre.ultimo_periodo:%Y-%m}', periodo(0))
+
+    def test_cierre_desfasado_no_borra_el_cursor(self):
+        depreciar(self.empresa.id, self.tipo, hasta=periodo(1), desde=periodo(1))
+        # Otro proceso leyó el cierre antes de que este empezara el periodo siguiente
+        desfasado = CierreDepreciacion.objects.get(tipo_depreciacion=self.tipo)
+        desfasado.tipo_depreciacion = self.tipo
+
+        original = depreciacion.calcular_cargos
+        llamadas = []
+
+        def falla_en_el_tercer_lote(*args, **kwargs):
+            llamadas.append(1)
+            if len(llamadas) == 3:
+                raise RuntimeError('worker caído')
+            return original(*args, **kwargs)
+
+        with mock.patch.object(depreciacion, 'calcular_cargos', falla_en_el_tercer_lote):
+            with self.assertRaises(RuntimeError):
+                depreciar(self.empresa.id, self.tipo, hasta=periodo(0), chunk_size=10)
+        cursor = CierreDepreciacion.objects.get(tipo_depreciacion=self.tipo).ultimo_activo
+        self.assertIsNotNone(cursor)
+
+        with self.assertRaises(DepreciacionError):
+            cerrar_periodo(desfasado, parse_periodo(periodo(0)), chunk_size=10)
+        self.assertEqual(CierreDepreciacion.objects.get(tipo_depreciacion=self.tipo).ultimo_activo, cursor)
+
+        resultados = depreciar(self.empresa.id, self.tipo, hasta=periodo(0), chunk_size=10)
+        self.assertEqual([r['periodo'] for r in resultados], [periodo(0)])
+        self.assertLibroCuadra()
+
+    def test_no_se_cierra_antes_de_un_periodo_a_medias(self):
+        with mock.patch.object(depreciacion, 'calcular_cargos', side_effect=RuntimeError('worker caído')):
+            with self.assertRaises(RuntimeError):
+                depreciar(self.empresa.id, self.tipo, hasta=periodo(0), desde=periodo(0))
+        with self.assertRaises(DepreciacionError):
+            depreciar(self.empresa.id, self.tipo, hasta=periodo(1))
+
+    def test_tipo_no_contable_no_toca_valor_actual(self):
+        fiscal = TipoDepreciacion.objects.create(empresa=self.empresa, nombre='Fiscal', metodo='SALDO_DECRECIENTE')
+        depreciar(self.empresa.id, fiscal, hasta=periodo(0), desde=periodo(1))
+        self.assertTrue(DepreciacionActivos.objects.filter(tipo_depreciacion=fiscal).exists())
+        self.assertEqual(self.activos.aggregate(v=Sum('valor_actual'))['v'], self.valor_inicial)
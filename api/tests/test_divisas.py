@@ -0,0 +1,52 @@
+# api/tests/test_divisas.py
+from datetime import date
+from decimal import Decimal
+
+from api.divisas import DivisaError, conversion_para, registrar_tasa
+from .base import TenantTestCase
+
+
+class ConversionTests(TenantTestCase):
+    """La empresa generada lleva sus importes en BOB; las tasas son respecto al USD."""
+
+    def setUp(self):
+        super().setUp()
+        registrar_tasa(self.bob, Decimal('6.90'), date(2023, 1, 1))
+        registrar_tasa(self.bob, Decimal('6.86'), date(2024, 1, 1))
+
+    def test_tasa_historica_y_actual(self):
+        conversion = conversion_para(self.empresa, 'usd')
+        self.assertEqual(conversion.codigo, 'USD')
+        self.assertEqual(conversion.convertir(Decimal('690.00'), date(2023, 6, 1)), Decimal('100.00'))
+        self.assertEqual(conversion.convertir(Decimal('686.00'), date(2024, 6, 1)), Decimal('100.00'))
+        # Antes del primer registro rige el más antiguo
+        self.assertEqual(conversion.convertir(Decimal('690.00'), date(2020, 1, 1)), Decimal('100.00'))
+        # Sin fecha, la tasa actual (la de hoy, registrada al crear la divisa)
+        self.assertEqual(conversion.convertir(Decimal('696.00')), Decimal('100.00'))
+        self.assertIsNone(conversion.convertir(None))
+
+    def test_filas_coinciden_con_convertir(self):
+        conversion = conversion_para(self.empresa, 'USD')
+        fechas = [date(2022, 5, 1), date(2023, 7, 15), date(2024, 2, 29), None]
+        # 0.87 BOB a la tasa actual son 0.125 USD: justo medio céntimo
+        importes = [Decimal('0.01'), Decimal('0.87'), Decimal('10.35'), Decimal('1234.56'), None]
+        filas = [(importe, fecha, 'x') for fecha in fechas for importe in importes]
+        convertidas = list(conversion.convertir_filas(filas, [0], fecha=1, chunk_size=3))
+        self.assertEqual(
+            [fila[0] for fila in convertidas],
+            [conversion.convertir(importe, fecha) for importe, fecha, _x in filas],
+        )
+        self.assertEqual([fila[1:] for fila in convertidas], [fila[1:] for fila in filas])
+
+    def test_misma_divisa_es_identidad(self):
+        conversion = conversion_para(self.empresa, 'BOB')
+        self.assertTrue(conversion.identidad)
+        self.assertIsNone(conversion.clave)
+        filas = [(Decimal('1.005'), None)]
+        self.assertEqual(list(conversion.convertir_filas(filas, [0])), filas)
+
+    def test_divisa_desconocida(self):
+        with self.assertRaises(DivisaError):
+            conversion_para(self.empresa, 'XYZ')
+        with self.assertRaises(DivisaError):
+            conversion_para(None, 'USD')
@@ -0,0 +1,74 @@
+# api/tests/test_pagination.py
+from types import SimpleNamespace
+from urllib.parse import urlsplit, parse_qs
+
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.models import ActivoFijo
+from api.pagination import KeysetPagination
+from .base import TenantTestCase
+
+VISTA = SimpleNamespace(ordering_fields=('valor_actual', 'fecha_adquisicion'), default_ordering='-fecha_adquisicion')
+
+
+class KeysetPaginationTests(TenantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.queryset = ActivoFijo.objects.filter(empresa=self.empresa)
+        # Empates en el campo de orden: el id decide
+        ids = list(self.queryset.order_by('id').values_list('id', flat=True)[:20])
+        ActivoFijo.objects.filter(id__in=ids).update(fecha_adquisicion=timezone.localdate().replace(day=1))
+
+    def pagina(self, params):
+        request = Request(APIRequestFactory().get('/api/activos-fijos/', params))
+        paginator = KeysetPagination()
+        ids = [obj.id for obj in paginator.paginate_queryset(self.queryset, request, VISTA)]
+        return ids, paginator.get_next_link(), paginator.get_previous_link()
+
+    @staticmethod
+    def params(link):
+        return {k: v[0] for k, v in parse_qs(urlsplit(link).query).items()}
+
+    def recorrer(self, params, antes_de_seguir=None):
+        vistos = []
+        ids, siguiente, _anterior = self.pagina(params)
+        vistos.extend(ids)
+        if antes_de_seguir:
+            antes_de_seguir()
+        while siguiente:
+            ids, siguiente, _anterior = self.pagina(self.params(siguiente))
+            vistos.extend(ids)
+        return vistos
+
+    def test_recorrido_completo_sin_duplicados(self):
+        for ordering in ('-fecha_adquisicion', 'valor_actual', '-valor_actual,fecha_adquisicion'):
+            with self.subTest(ordering=ordering):
+                vistos = self.recorrer({'page_size': 7, 'ordering': ordering})
+                self.assertEqual(len(vistos), len(set(vistos)))
+                self.assertEqual(set(vistos), set(self.queryset.values_list('id', flat=True)))
+
+    def test_altas_durante_el_recorrido_no_desplazan_el_cursor(self):
+        esperados = set(self.queryset.values_list('id', flat=True))
+        primero = self.queryset.first()
+
+        def alta():
+            # Más reciente que todo: cae en la primera página, ya servida
+            ActivoFijo.objects.create(
+                empresa=self.empresa, nombre='Alta nueva', codigo_interno='NUEVO-1',
+                fecha_adquisicion=timezone.localdate(), valor_actual=primero.valor_actual,
+                vida_util=primero.vida_util, item_catalogo_id=primero.item_catalogo_id,
+                departamento_id=primero.departamento_id, estado_id=primero.estado_id,
+            )
+
+        vistos = self.recorrer({'page_size': 7}, antes_de_seguir=alta)
+        self.assertEqual(len(vistos), len(set(vistos)))
+        self.assertEqual(set(vistos), esperados)
+
+    def test_pagina_anterior(self):
+        primera, siguiente, anterior = self.pagina({'page_size': 7})
+        self.assertIsNone(anterior)
+        _segunda, _siguiente, anterior = self.pagina(self.params(siguiente))
+        self.assertEqual(self.pagina(self.params(anterior))[0], primera)
@@ -0,0 +1,82 @@
+# api/tests/test_permissions.py
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+
+from api.models import Permisos, Roles
+
+from .base import TenantTestCase
+
+
+class PermisosCacheadosTests(TenantTestCase):
+    """
+    El conjunto de permisos de cada usuario se cachea (api/permissions.py) y las
+    señales de api/signals.py lo invalidan al confirmar cada cambio de roles/permisos.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.usuario = User.objects.get(empleado__empresa=self.empresa, username__endswith='000000')
+        self.empleado = self.usuario.empleado
+        self.ver = Permisos.objects.create(nombre='ver_reportes', descripcion='Ver reportes')
+        self.gestionar = Permisos.objects.create(nombre='gestionar_activos', descripcion='Gestionar activos')
+        self.rol = Roles.objects.create(empresa=self.empresa, nombre='Contador')
+        self.rol.permisos.set([self.ver])
+        self.empleado.roles.add(self.rol)
+        # Sesión sin JWT: los permisos salen de la caché o de la BD
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+        self.assertEqual(self.permisos(), {'ver_reportes'})
+
+    def permisos(self):
+        response = self.client.get('/api/my-permissions/')
+        self.assertEqual(response.status_code, 200)
+        return set(response.data)
+
+    def test_la_cache_se_mantiene_sin_invalidar(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.rol.permisos.add(self.gestionar)
+        # Hasta el commit nadie debe ver (ni volver a cachear) el estado nuevo
+        self.assertEqual(self.permisos(), {'ver_reportes'})
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.permisos(), {'ver_reportes', 'gestionar_activos'})
+
+    def test_anadir_y_quitar_permisos_del_rol(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rol.permisos.add(self.gestionar)
+        self.assertEqual(self.permisos(), {'ver_reportes', 'gestionar_activos'})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rol.permisos.remove(self.ver)
+        self.assertEqual(self.permisos(), {'gestionar_activos'})
+
+    def test_anadir_roles_desde_el_permiso(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.gestionar.roles_set.add(self.rol)
+        self.assertEqual(self.permisos(), {'ver_reportes', 'gestionar_activos'})
+
+    def test_vaciar_roles_del_permiso(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ver.roles_set.clear()
+        self.assertEqual(self.permisos(), set())
+
+    def test_vaciar_roles_del_empleado(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.empleado.roles.clear()
+        self.assertEqual(self.permisos(), set())
+
+    def test_asignar_rol_desde_el_rol(self):
+        otro = Roles.objects.create(empresa=self.empresa, nombre='Auditor')
+        otro.permisos.add(self.gestionar)
+        with self.captureOnCommitCallbacks(execute=True):
+            otro.empleado_set.add(self.empleado)
+        self.assertEqual(self.permisos(), {'ver_reportes', 'gestionar_activos'})
+
+    def test_borrar_rol(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rol.delete()
+        self.assertEqual(self.permisos(), set())
+
+    def test_borrar_permiso(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ver.delete()
+        self.assertEqual(self.permisos(), set())
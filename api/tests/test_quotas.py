@@ -0,0 +1,37 @@
+# api/tests/test_quotas.py
+from django.db import transaction
+from django.db.models import F
+
+from api.models import ActivoFijo, Suscripcion
+from api.quotas import QuotaExceeded, reserve_quota
+from .base import TenantTestCase
+
+
+class ReserveQuotaTests(TenantTestCase):
+
+    def suscripcion(self):
+        return Suscripcion.objects.get(empresa=self.empresa)
+
+    def test_reserva_hasta_el_limite(self):
+        Suscripcion.objects.filter(empresa=self.empresa).update(max_activos=F('activos_usados') + 1)
+        usados = self.suscripcion().activos_usados
+        with transaction.atomic(), reserve_quota(self.empresa.id, ActivoFijo):
+            pass
+        self.assertEqual(self.suscripcion().activos_usados, usados + 1)
+        with self.assertRaises(QuotaExceeded):
+            with reserve_quota(self.empresa.id, ActivoFijo):
+                pass
+        self.assertEqual(self.suscripcion().activos_usados, usados + 1)
+
+    def test_rollback_devuelve_el_cupo(self):
+        usados = self.suscripcion().activos_usados
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic(), reserve_quota(self.empresa.id, ActivoFijo):
+                raise RuntimeError('falla la creación')
+        self.assertEqual(self.suscripcion().activos_usados, usados)
+
+    def test_suscripcion_inactiva(self):
+        Suscripcion.objects.filter(empresa=self.empresa).update(estado='vencida')
+        with self.assertRaises(QuotaExceeded):
+            with reserve_quota(self.empresa.id, ActivoFijo):
+                pass
@@ -0,0 +1,57 @@
+# api/tests/test_report_cache.py
+import os
+import tempfile
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from api import report_cache
+
+
+class ExportCacheTests(SimpleTestCase):
+    """Las exportaciones se entregan abiertas: un desalojo concurrente no rompe la descarga."""
+
+    def setUp(self):
+        cache.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        ajustes = override_settings(MEDIA_ROOT=media.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.renders = 0
+
+    def render(self, fileobj):
+        self.renders += 1
+        fileobj.write(b'%PDF contenido')
+        return {'pages': 1}
+
+    def exportar(self):
+        fileobj, meta, hit = report_cache.get_or_render_export('e1', ['depto:TI'], 'pdf', self.render)
+        self.addCleanup(fileobj.close)
+        return fileobj, meta, hit
+
+    def test_fallo_y_acierto(self):
+        fileobj, meta, hit = self.exportar()
+        self.assertEqual((fileobj.read(), meta, hit), (b'%PDF contenido', {'pages': 1}, False))
+        fileobj, meta, hit = self.exportar()
+        self.assertEqual((fileobj.read(), meta, hit), (b'%PDF contenido', {'pages': 1}, True))
+        self.assertEqual(self.renders, 1)
+
+    def test_desalojo_tras_abrir(self):
+        self.exportar()
+        fileobj, _meta, hit = self.exportar()
+        self.assertTrue(hit)
+        # Otro proceso vacía la caché antes de que empiece la descarga
+        report_cache.evict_exports(max_bytes=0)
+        self.assertFalse(list(report_cache._export_entries()))
+        self.assertEqual(fileobj.read(), b'%PDF contenido')
+
+    def test_render_fallido_no_deja_temporales(self):
+        def falla(fileobj):
+            fileobj.write(b'a medias')
+            raise RuntimeError('fallo simulado')
+
+        with self.assertRaises(RuntimeError):
+            report_cache.get_or_render_export('e1', [], 'excel', falla)
+        raiz = report_cache._export_root()
+        self.assertEqual([f for _d, _s, archivos in os.walk(raiz) for f in archivos], [])
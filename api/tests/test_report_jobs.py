@@ -0,0 +1,34 @@
+# api/tests/test_report_jobs.py
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+
+from api.models import ReporteJob
+
+from .base import TenantTestCase
+
+
+class EncolarReporteTests(TenantTestCase):
+    """async=true solo encola los formatos que genera process_report_jobs."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.get(empleado__empresa=self.empresa, username__endswith='000000'))
+
+    def exportar(self, formato):
+        return self.client.post(
+            '/api/reportes/query/export/', {'filters': [], 'format': formato, 'async': True}, format='json',
+        )
+
+    def test_formatos_en_streaming_se_rechazan(self):
+        for formato in ('csv', 'ndjson'):
+            with self.subTest(formato=formato):
+                response = self.exportar(formato)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(formato, response.data['detail'])
+        self.assertFalse(ReporteJob.objects.exists())
+
+    def test_excel_se_encola(self):
+        response = self.exportar('excel')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(ReporteJob.objects.get(pk=response.data['id']).formato, 'excel')
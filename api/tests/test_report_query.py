@@ -0,0 +1,55 @@
+# api/tests/test_report_query.py
+from django.test import SimpleTestCase
+
+from api.report_query import FilterSyntaxError, canonical_filters, compile_expression
+
+
+class CanonicalFormTests(SimpleTestCase):
+    """La forma canónica es la clave de caché: volver a compilarla debe dar el mismo plan."""
+
+    EXPRESIONES = [
+        'laptop',
+        '"impresora laser"',
+        'depto:TI',
+        'depto: Recursos Humanos',
+        'estado=En Uso',
+        'estado!=Baja',
+        'valor>=500 valor<1000',
+        'valor:100..500',
+        'fecha_adq:2024-01-01..',
+        'depto:[TI, Finanzas]',
+        'depto:TI OR depto:Finanzas',
+        'NOT (estado=Baja OR valor<10)',
+        '-laptop depto:TI',
+        '(depto:TI | depto:Finanzas) & valor>100',
+        'nombre="con \\"comillas\\""',
+        'mantenimiento:pendiente',
+        '!(estado=Baja OR valor<10)',
+        'hola!',
+    ]
+
+    def test_round_trip(self):
+        for expresion in self.EXPRESIONES:
+            with self.subTest(expresion=expresion):
+                canonica = compile_expression(expresion).canonical
+                self.assertEqual(compile_expression(canonica).canonical, canonica)
+
+    def test_espacios_y_orden_no_cambian_la_clave(self):
+        self.assertEqual(
+            canonical_filters(['depto:TI', 'valor>=500']),
+            canonical_filters(['valor >= 500', '  depto:TI ']),
+        )
+
+    def test_exclamacion(self):
+        # NOT solo al inicio de un término; dentro de una palabra es literal
+        self.assertEqual(compile_expression('!laptop').canonical, 'NOT laptop')
+        self.assertEqual(compile_expression('!depto:TI').canonical, 'NOT depto:TI')
+        self.assertEqual(compile_expression('hola!').canonical, '"hola!"')
+        self.assertEqual(compile_expression('nombre=Hola! depto:TI').canonical, 'nombre="Hola!" AND depto:TI')
+        self.assertEqual(compile_expression('estado!=Baja').canonical, 'estado!=Baja')
+
+    def test_errores_de_sintaxis(self):
+        for expresion in ('valor>', '(depto:TI', 'desconocido:1', 'valor>abc', 'fecha_adq>2024-13-01'):
+            with self.subTest(expresion=expresion):
+                with self.assertRaises(FilterSyntaxError):
+                    compile_expression(expresion)
@@ -0,0 +1,137 @@
+# api/tests/test_revalorizacion.py
+from decimal import Decimal, ROUND_HALF_UP
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+from rest_framework.test import APIClient
+
+from api import revalorizacion
+from api.models import ActivoFijo, Permisos, ResumenActivos, RevalorizacionActivo, Roles
+from api.resumen import RESUMEN_KEY, rebuild_resumen
+from api.revalorizacion import revalorizar_masivo
+
+from .base import TenantTestCase
+
+
+class RevalorizacionMasivaTests(TenantTestCase):
+    """revalorizar_masivo por lotes: valores, historial y resumen consistentes, o nada."""
+
+    def setUp(self):
+        super().setUp()
+        self.activos = ActivoFijo.objects.filter(empresa=self.empresa)
+        self.valores = dict(self.activos.values_list('pk', 'valor_actual'))
+
+    def assertResumenConsistente(self):
+        # El resumen mantenido por lotes debe coincidir con un GROUP BY sobre ActivoFijo
+        campos = [c.replace('mes_adquisicion', 'mes') for c in RESUMEN_KEY]
+        reales = {
+            tuple(g[c] for c in campos): g['total']
+            for g in self.activos.annotate(mes=TruncMonth('fecha_adquisicion')).values(*campos)
+            .annotate(total=Sum('valor_actual')).order_by()
+        }
+        resumen = {
+            tuple(g[c] for c in RESUMEN_KEY): g['total']
+            for g in ResumenActivos.objects.filter(empresa=self.empresa).values(*RESUMEN_KEY)
+            .annotate(total=Sum('valor_total')).order_by()
+        }
+        self.assertEqual(resumen, reales)
+
+    def test_porcentual_en_varios_lotes(self):
+        resultado = revalorizar_masivo(self.activos, self.empresa.id, 'porcentual', Decimal('10'), chunk_size=7)
+        self.assertEqual(resultado['revalorizados'], len(self.valores))
+        self.assertEqual(resultado['omitidos'], 0)
+        for pk, valor in self.activos.values_list('pk', 'valor_actual'):
+            esperado = (self.valores[pk] * Decimal('1.1')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            self.assertEqual(valor, esperado)
+        self.assertEqual(RevalorizacionActivo.objects.filter(empresa=self.empresa).count(), len(self.valores))
+        self.assertEqual(resultado['valor_nuevo_total'], self.activos.aggregate(t=Sum('valor_actual'))['t'])
+        self.assertResumenConsistente()
+
+    def test_activos_en_cero_se_omiten(self):
+        ceros = list(self.activos.order_by('pk').values_list('pk', flat=True)[:5])
+        self.activos.filter(pk__in=ceros).update(valor_actual=0)
+        rebuild_resumen([self.empresa.id])
+        resultado = revalorizar_masivo(self.activos, self.empresa.id, 'factor', Decimal('2'), chunk_size=4)
+        self.assertEqual(resultado['omitidos'], 5)
+        self.assertEqual(resultado['revalorizados'], len(self.valores) - 5)
+        self.assertFalse(self.activos.filter(pk__in=ceros).exclude(valor_actual=0).exists())
+        self.assertFalse(RevalorizacionActivo.objects.filter(activo_id__in=ceros).exists())
+        self.assertResumenConsistente()
+
+    def test_fijo_tambien_revaloriza_activos_en_cero(self):
+        cero = self.activos.order_by('pk').values_list('pk', flat=True).first()
+        self.activos.filter(pk=cero).update(valor_actual=0)
+        rebuild_resumen([self.empresa.id])
+        resultado = revalorizar_masivo(self.activos.filter(pk=cero), self.empresa.id, 'fijo', Decimal('150'))
+        self.assertEqual(resultado['revalorizados'], 1)
+        self.assertEqual(self.activos.get(pk=cero).valor_actual, Decimal('150.00'))
+        self.assertResumenConsistente()
+
+    def test_un_lote_fallido_deshace_todos(self):
+        resumen_antes = ResumenActivos.objects.filter(empresa=self.empresa).aggregate(t=Sum('valor_total'))['t']
+        original = revalorizacion.sumar_valores
+        llamadas = []
+
+        def falla_en_el_tercero(empresa_id, deltas):
+            llamadas.append(empresa_id)
+            if len(llamadas) == 3:
+                raise RuntimeError('fallo simulado')
+            return original(empresa_id, deltas)
+
+        with mock.patch.object(revalorizacion, 'sumar_valores', falla_en_el_tercero):
+            with self.assertRaises(RuntimeError):
+                revalorizar_masivo(self.activos, self.empresa.id, 'factor', Decimal('3'), chunk_size=10)
+        self.assertEqual(dict(self.activos.values_list('pk', 'valor_actual')), self.valores)
+        self.assertFalse(RevalorizacionActivo.objects.exists())
+        self.assertEqual(
+            ResumenActivos.objects.filter(empresa=self.empresa).aggregate(t=Sum('valor_total'))['t'], resumen_antes,
+        )
+
+
+class EjecutarMasivoViewTests(TenantTestCase):
+    URL = '/api/revalorizaciones/ejecutar-masivo/'
+
+    def setUp(self):
+        super().setUp()
+        usuario = User.objects.get(empleado__empresa=self.empresa, username__endswith='000000')
+        rol = Roles.objects.create(empresa=self.empresa, nombre='Contador')
+        rol.permisos.add(Permisos.objects.create(nombre='manage_revalorizacion', descripcion='Revalorizar'))
+        usuario.empleado.roles.add(rol)
+        self.client = APIClient()
+        self.client.force_authenticate(usuario)
+        self.activos = ActivoFijo.objects.filter(empresa=self.empresa)
+
+    def ejecutar(self, **datos):
+        return self.client.post(self.URL, {'reval_type': 'porcentual', 'value': '5', **datos}, format='json')
+
+    def test_por_filtros(self):
+        elegidos = set(self.activos.filter(valor_actual__gte=1000).values_list('pk', flat=True))
+        self.assertTrue(0 < len(elegidos) < self.activos.count())
+        response = self.ejecutar(filters=['valor>=1000'], notas='UFV')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['revalorizados'], len(elegidos))
+        self.assertEqual(set(RevalorizacionActivo.objects.values_list('activo_id', flat=True)), elegidos)
+
+    def test_por_ids(self):
+        ids = list(self.activos.order_by('pk').values_list('pk', flat=True)[:3])
+        response = self.ejecutar(activo_ids=[str(pk) for pk in ids])
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['activos'], 3)
+        self.assertEqual(set(RevalorizacionActivo.objects.values_list('activo_id', flat=True)), set(ids))
+
+    def test_entradas_invalidas(self):
+        casos = [
+            {},
+            {'filters': [], 'activo_ids': ['x']},
+            {'activo_ids': []},
+            {'filters': 'valor>1'},
+            {'activo_ids': ['no-es-un-uuid']},
+            {'filters': ['valor>>1']},
+            {'filters': [], 'value': '-100'},
+        ]
+        for datos in casos:
+            with self.subTest(datos=datos):
+                self.assertEqual(self.ejecutar(**datos).status_code, 400)
+        self.assertFalse(RevalorizacionActivo.objects.exists())
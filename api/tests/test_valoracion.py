@@ -0,0 +1,53 @@
+# api/tests/test_valoracion.py
+from datetime import datetime, time
+from decimal import Decimal
+
+from django.utils import timezone
+
+from api.depreciacion import depreciar, parse_periodo
+from api.models import ActivoFijo, RevalorizacionActivo, TipoDepreciacion
+from api.valoracion import tomar_snapshot, valor_a_fecha, valores_por_activo
+from .base import TenantTestCase
+from .test_depreciacion import periodo
+
+
+class ValorAFechaTests(TenantTestCase):
+    """
+    Sin snapshots el valor se reconstruye hacia atrás desde valor_actual; con un
+    snapshot anterior, hacia delante desde él. Ambos caminos deben coincidir.
+    """
+
+    def setUp(self):
+        super().setUp()
+        tipo = TipoDepreciacion.objects.create(empresa=self.empresa, nombre='Lineal', contable=True)
+        depreciar(self.empresa.id, tipo, hasta=periodo(0), desde=periodo(5))
+        self.snapshot = parse_periodo(periodo(4))
+        self.fecha = parse_periodo(periodo(2))
+
+        # Una revalorización entre el snapshot y la fecha consultada
+        activo = ActivoFijo.objects.filter(empresa=self.empresa, fecha_adquisicion__lt=self.snapshot).first()
+        RevalorizacionActivo.objects.create(
+            empresa=self.empresa, activo=activo, valor_anterior=activo.valor_actual,
+            valor_nuevo=activo.valor_actual + Decimal('150.00'), factor_aplicado=Decimal('1'),
+        )
+        RevalorizacionActivo.objects.filter(activo=activo).update(
+            fecha=timezone.make_aware(datetime.combine(parse_periodo(periodo(3)), time(12)))
+        )
+        ActivoFijo.objects.filter(pk=activo.pk).update(valor_actual=activo.valor_actual + Decimal('150.00'))
+
+    def test_hacia_delante_coincide_con_hacia_atras(self):
+        hacia_atras = valor_a_fecha(self.empresa.id, self.fecha, group_by=['departamento'])
+        _s, por_activo = valores_por_activo(self.empresa.id, self.fecha)
+        self.assertIsNone(hacia_atras['checkpoint'])
+
+        self.assertGreater(tomar_snapshot(self.empresa.id, self.snapshot), 0)
+        hacia_delante = valor_a_fecha(self.empresa.id, self.fecha, group_by=['departamento'])
+        self.assertEqual(hacia_delante['checkpoint'], self.snapshot)
+        self.assertEqual(hacia_delante['valor'], hacia_atras['valor'])
+        self.assertEqual(hacia_delante['results'], hacia_atras['results'])
+        self.assertEqual(valores_por_activo(self.empresa.id, self.fecha)[1], por_activo)
+
+    def test_hoy_es_la_suma_de_valor_actual(self):
+        hoy = valor_a_fecha(self.empresa.id, timezone.localdate())
+        vigentes = ActivoFijo.objects.filter(empresa=self.empresa, fecha_adquisicion__lte=timezone.localdate())
+        self.assertEqual(hoy['valor'], sum(vigentes.values_list('valor_actual', flat=True)))
@@ -11,7 +11,9 @@ from .views import (
     EmpleadoViewSet, ActivoFijoViewSet, PresupuestoViewSet, 
     RolesViewSet, LogViewSet, EstadoViewSet, UbicacionViewSet, ProveedorViewSet, PermisosViewSet,
     RegisterEmpresaView, MyTokenObtainPairView, UserPermissionsView, MantenimientoViewSet, OrdenesCompraViewSet, SuscripcionViewSet, NotificacionViewSet, ItemCatalogoViewSet, InventarioViewSet, MovimientoInventarioViewSet,
-    MyThemePreferencesView, ReporteQueryView, ReporteQueryExportView, RevalorizacionActivoViewSet
+    MyThemePreferencesView, ReporteQueryView, ReporteQueryExportView, RevalorizacionActivoViewSet, ReporteJobViewSet, ReporteAgregadoView,
+    ReporteCacheStatsView, ReporteLibroView, TipoDepreciacionViewSet, DepreciacionActivosViewSet,
+    ValorActivosAFechaView
 )
 from rest_framework_simplejwt.views import TokenRefreshView
 
@@ -32,9 +34,12 @@ router.register(r'ordenes-compra', OrdenesCompraViewSet, basename='orden_compra'
 router.register(r'suscripcion', SuscripcionViewSet, basename='suscripcion')
 router.register(r'notificaciones', NotificacionViewSet, basename='notificacion')
 router.register(r'revalorizaciones', RevalorizacionActivoViewSet, basename='revalorizacion')
+router.register(r'tipos-depreciacion', TipoDepreciacionViewSet, basename='tipo_depreciacion')
+router.register(r'depreciaciones', DepreciacionActivosViewSet, basename='depreciacion')
 router.register(r'items-catalogo', ItemCatalogoViewSet, basename='item_catalogo')
 router.register(r'inventarios', InventarioViewSet, basename='inventario')
 router.register(r'movimientos-inventario', MovimientoInventarioViewSet, basename='movimiento_inventario')
+router.register(r'reportes/jobs', ReporteJobViewSet, basename='reporte_job')
 
 urlpatterns = [
     ##path('reportes/activos-preview/', ReporteActivosPreview.as_view(), name='reporte_activos_preview'),
@@ -42,6 +47,10 @@ urlpatterns = [
     ##path('reportes/activos-export/', ReporteActivosExport.as_view(), name='reporte_activos_export'),       
     path('reportes/query/', ReporteQueryView.as_view(), name='reporte_query_preview'),
     path('reportes/query/export/', ReporteQueryExportView.as_view(), name='reporte_query_export'),
+    path('reportes/libro/', ReporteLibroView.as_view(), name='reporte_libro'),
+    path('reportes/valor-a-fecha/', ValorActivosAFechaView.as_view(), name='reporte_valor_a_fecha'),
+    path('reportes/agregado/', ReporteAgregadoView.as_view(), name='reporte_agregado'),
+    path('reportes/cache-stats/', ReporteCacheStatsView.as_view(), name='reporte_cache_stats'),
     path('register/', RegisterEmpresaView.as_view(), name='register_empresa'),
     path('', include(router.urls)),
     path('token/', MyTokenObtainPairView.as_view(), name='token_obtain_pair'),
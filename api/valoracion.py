@@ -0,0 +1,166 @@
+# api/valoracion.py
+import time
+import logging
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Sum, Count, F, Max
+
+from .models import ActivoFijo, DepreciacionActivos, DisposicionActivos, RevalorizacionActivo, SnapshotValorActivo
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_BATCH_SIZE = 5000
+
+# Dimensiones de agrupación (atributos actuales del activo): nombre -> (campo, campo con el nombre)
+DIMENSIONS = {
+    'departamento': ('departamento_id', 'departamento__nombre'),
+    'estado': ('estado_id', 'estado__nombre'),
+    'proveedor': ('proveedor_id', 'proveedor__nombre'),
+    'categoria': ('item_catalogo_id', 'item_catalogo__nombre'),
+}
+
+CERO = Decimal('0')
+
+
+# --- VALOR A UNA FECHA ---
+# Cada revalorización guarda el valor anterior, así que su efecto es aditivo
+# (valor_nuevo - valor_anterior), igual que el de una depreciación del tipo
+# contable (-monto; los demás tipos no tocan valor_actual):
+#   con snapshot S <= D:  valor(D) = snapshot(S) + efectos en (S, D]
+#   sin snapshot:         valor(D) = valor_actual - efectos posteriores a D
+# El segundo caso cubre los activos dados de alta después del último snapshot (y
+# las empresas sin snapshots). Los cambios directos de valor_actual (edición del
+# activo) no son eventos: solo los recogen los snapshots tomados después.
+
+def checkpoint(empresa_id, fecha):
+    """Fecha del snapshot más reciente de la empresa en o antes de `fecha` (o None)."""
+    return (
+        SnapshotValorActivo.objects.filter(empresa_id=empresa_id, fecha__lte=fecha)
+        .aggregate(f=Max('fecha'))['f']
+    )
+
+
+def activos_vigentes(empresa_id, fecha):
+    """Activos de la empresa adquiridos en o antes de `fecha` y sin disposición a esa fecha."""
+    dispuestos = DisposicionActivos.objects.filter(activo=OuterRef('pk'), fecha__lte=fecha)
+    return ActivoFijo.objects.filter(empresa_id=empresa_id, fecha_adquisicion__lte=fecha).filter(~Exists(dispuestos))
+
+
+def _sumar(resultado, filas, clave, campo, signo=1):
+    for fila in filas:
+        k = tuple(fila[c] for c in clave)
+        resultado[k] = resultado.get(k, CERO) + signo * (fila[campo] or CERO)
+
+
+def _componentes(empresa_id, fecha, campos, activos=None):
+    """
+    Valor a `fecha` agrupado por `campos` (rutas desde ActivoFijo) en unas pocas
+    consultas GROUP BY: una por cada componente de las fórmulas de arriba.
+    Devuelve (punto de control, {clave: valor}, {clave: cantidad}).
+    """
+    s = checkpoint(empresa_id, fecha)
+    vigentes = activos_vigentes(empresa_id, fecha)
+    if activos is not None:
+        vigentes = vigentes.filter(pk__in=activos)
+    snap = SnapshotValorActivo.objects.filter(activo=OuterRef('pk'), fecha=s)
+    con_snapshot = vigentes.filter(Exists(snap)) if s else vigentes.none()
+    sin_snapshot = vigentes.filter(~Exists(snap)) if s else vigentes
+
+    por_activo = [f'activo__{c}' for c in campos]
+    delta = F('valor_nuevo') - F('valor_anterior')
+    valores, cantidades = {}, {}
+
+    # Cantidad de activos (y claves de agrupación) con los atributos actuales
+    for fila in vigentes.values(*campos).annotate(n=Count('pk')).order_by():
+        cantidades[tuple(fila[c] for c in campos)] = fila['n']
+
+    if s:
+        base = SnapshotValorActivo.objects.filter(empresa_id=empresa_id, fecha=s, activo__in=con_snapshot.values('pk'))
+        _sumar(valores, base.values(*por_activo).annotate(v=Sum('valor')).order_by(), por_activo, 'v')
+        revs = RevalorizacionActivo.objects.filter(
+            empresa_id=empresa_id, fecha__date__gt=s, fecha__date__lte=fecha, activo__in=con_snapshot.values('pk'),
+        )
+        _sumar(valores, revs.values(*por_activo).annotate(v=Sum(delta)).order_by(), por_activo, 'v')
+        deps = DepreciacionActivos.objects.filter(
+            tipo_depreciacion__contable=True, fecha__gt=s, fecha__lte=fecha, activo__in=con_snapshot.values('pk'),
+        )
+        _sumar(valores, deps.values(*por_activo).annotate(v=Sum('monto')).order_by(), por_activo, 'v', -1)
+
+    _sumar(valores, sin_snapshot.values(*campos).annotate(v=Sum('valor_actual')).order_by(), campos, 'v')
+    revs = RevalorizacionActivo.objects.filter(
+        empresa_id=empresa_id, fecha__date__gt=fecha, activo__in=sin_snapshot.values('pk'),
+    )
+    _sumar(valores, revs.values(*por_activo).annotate(v=Sum(delta)).order_by(), por_activo, 'v', -1)
+    deps = DepreciacionActivos.objects.filter(
+        tipo_depreciacion__contable=True, fecha__gt=fecha, activo__in=sin_snapshot.values('pk'),
+    )
+    _sumar(valores, deps.values(*por_activo).annotate(v=Sum('monto')).order_by(), por_activo, 'v')
+    return s, valores, cantidades
+
+
+def valores_por_activo(empresa_id, fecha, activos=None):
+    """{activo_id: valor en libros a `fecha`} de los activos vigentes. Devuelve (checkpoint, dict)."""
+    s, valores, _cantidades = _componentes(empresa_id, fecha, ['id'], activos)
+    return s, {k[0]: v.quantize(Decimal('0.01')) for k, v in valores.items()}
+
+
+def valor_a_fecha(empresa_id, fecha, group_by=(), activos=None):
+    """
+    Valor en libros de la cartera (o de `activos`) a `fecha`, agrupado por las
+    dimensiones de `group_by` (validadas contra DIMENSIONS). El coste depende del
+    número de activos y de los eventos desde el snapshot anterior, no de la
+    longitud del historial. Devuelve {'fecha', 'checkpoint', 'cantidad', 'valor', 'results'}.
+    """
+    campos = []
+    for dimension in group_by:
+        campos.extend(DIMENSIONS[dimension])
+    s, valores, cantidades = _componentes(empresa_id, fecha, campos, activos)
+    results = []
+    for clave in sorted(cantidades, key=lambda k: tuple('' if v is None else str(v) for v in k[1::2])):
+        fila = dict(zip(campos, clave))
+        item = {d: {'id': fila[DIMENSIONS[d][0]], 'nombre': fila[DIMENSIONS[d][1]]} for d in group_by}
+        item['cantidad'] = cantidades[clave]
+        item['valor'] = valores.get(clave, CERO).quantize(Decimal('0.01'))
+        results.append(item)
+    return {
+        'fecha': fecha,
+        'checkpoint': s,
+        'cantidad': sum(cantidades.values()),
+        'valor': sum((r['valor'] for r in results), CERO),
+        'results': results if group_by else [],
+    }
+
+
+# --- SNAPSHOTS ---
+
+def tomar_snapshot(empresa_id, fecha):
+    """
+    Guarda el valor de cada activo vigente a `fecha` (fin de mes) como punto de
+    control. Si ya existía se regenera. Devuelve el número de filas.
+    """
+    start = time.perf_counter()
+    with transaction.atomic():
+        SnapshotValorActivo.objects.filter(empresa_id=empresa_id, fecha=fecha).delete()
+        _s, valores = valores_por_activo(empresa_id, fecha)
+        filas = [
+            SnapshotValorActivo(empresa_id=empresa_id, activo_id=pk, fecha=fecha, valor=valor)
+            for pk, valor in valores.items()
+        ]
+        SnapshotValorActivo.objects.bulk_create(filas, batch_size=SNAPSHOT_BATCH_SIZE)
+    logger.info(
+        f"tomar_snapshot: empresa {empresa_id}, {fecha}: {len(filas)} activos en "
+        f"{(time.perf_counter() - start) * 1000:.0f} ms."
+    )
+    return len(filas)
+
+
+def invalidar_snapshots(empresa_id, desde):
+    """
+    Borra los snapshots en o después de `desde`: un evento con fecha anterior a un
+    snapshot ya tomado (ej. el cierre tardío de un mes) lo deja desactualizado.
+    """
+    borrados, _detalle = SnapshotValorActivo.objects.filter(empresa_id=empresa_id, fecha__gte=desde).delete()
+    if borrados:
+        logger.info(f"invalidar_snapshots: empresa {empresa_id}, {borrados} filas desde {desde}.")
+    return borrados
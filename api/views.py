@@ -2,9 +2,9 @@
 from rest_framework import viewsets, status, serializers
 from rest_framework import permissions
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
-from .permissions import HasPermission, check_permission
+from .permissions import HasPermission, check_permission, get_user_permissions, add_permission_claims
 import io
-from django.http import HttpResponse, Http404
+from django.http import HttpResponse, Http404, FileResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import action
@@ -19,15 +19,29 @@ from .serializers import *
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 import logging
-from django.db.models import Q
-import re
-from datetime import datetime
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework.exceptions import NotFound
 from django.db import transaction
-from .report_utils import create_excel_report, create_pdf_report
+from .report_utils import (
+    create_excel_report, create_pdf_report, write_excel_report, write_pdf_report, streaming_report_response,
+    EXCEL_CONTENT_TYPE, STREAM_CONTENT_TYPES, spooled_file, file_response,
+)
+from .report_workbook import sheet_querysets, write_tenant_workbook
+from . import divisas, report_cache, resumen, revalorizacion, valoracion
+from .depreciacion import depreciar, parse_periodo, DepreciacionError
+from .report_jobs import enqueue, artifact_abspath, delete_artifact, download_filename, ACTIVOS_FORM_PARAMS
+from .tenancy import get_tenant
+from .pagination import KeysetPagination, ReportPreviewPagination, TRUTHY
+from .quotas import reserve_quota, usage_field, QuotaExceeded
+from .search import IndexedSearchFilter
+from .report_query import apply_filters, FilterSyntaxError
 from .filters import ActivoFijoFilter, ProveedorFilter, EmpleadoFilter, MantenimientoFilter, OrdenesCompraFilter, ItemCatalogoFilter, InventarioFilter, MovimientoInventarioFilter, PresupuestoFilter, UbicacionFilter, EstadoFilter # <-- NUEVA IMPORTACIÓN
 from rest_framework.filters import SearchFilter
 from django_filters.rest_framework import DjangoFilterBackend
-from decimal import Decimal, InvalidOperation
+from decimal import Decimal
+from datetime import date
 logger = logging.getLogger(__name__)
 
 class MyThemePreferencesView(APIView):
@@ -36,11 +50,11 @@ class MyThemePreferencesView(APIView):
     def get_object(self, request):
         # SOLO devuelve empleado si NO es staff
         if not request.user.is_staff:
-            try:
-                return request.user.empleado
-            except Empleado.DoesNotExist:
+            empleado = get_tenant(request).empleado
+            if empleado is None:
                 # Usuario normal sin perfil, esto es un error de datos
                 raise serializers.ValidationError("Usuario no asociado a un perfil de empleado.")
+            return empleado
         # Si es staff (SuperAdmin), devuelve None
         return None
 
@@ -138,32 +152,42 @@ class MyTokenObtainPairView(TokenObtainPairView):
 
 class BaseTenantViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
+    # Ruta desde el modelo hasta la Empresa (ej: 'departamento__empresa' en Presupuesto)
+    tenant_field = 'empresa'
+
+    # Paginación por cursor (ver api/pagination.py). Cada ViewSet declara los campos
+    # por los que se puede ordenar (?ordering=) y su orden por defecto; el id se
+    # añade siempre como desempate. Los índices (empresa, campo, id) están en models.py.
+    pagination_class = KeysetPagination
+    ordering_fields = ()
+    default_ordering = None
+
+    @property
+    def tenant(self):
+        """Contexto de tenant del request (resuelto una sola vez, ver api/tenancy.py)."""
+        return get_tenant(self.request)
+
+    # Presupuesto de consultas por acción; lo vigila QueryInstrumentationMiddleware
+    # (api/instrumentation.py), que reporta por logging las vistas que lo superan.
+    query_budget = {'list': 5, 'retrieve': 5, 'default': 10}
 
     def get_queryset(self):
         """
         Modificado para que el Superusuario (is_staff) pueda ver
-        TODOS los objetos, sin filtrar por empresa.
+        TODOS los objetos, sin filtrar por empresa (salvo que elija
+        una con la cabecera X-Empresa-Id).
+        Las métricas (nº de consultas, filas, tiempo) las registra el middleware
+        de instrumentación; aquí no se hace ningún COUNT adicional.
         """
-        # 1. Si el usuario es staff (Superusuario), saltar el filtro de tenant
-        if self.request.user.is_staff:
-            print(f"DEBUG: get_queryset for SUPERUSER: {self.request.user}. Returning all objects.")
+        tenant = self.tenant
+        # 1. Si el usuario es staff (Superusuario) sin empresa elegida, saltar el filtro de tenant
+        if tenant.ve_todo:
             return self.queryset.all() # <-- Devuelve todo
 
         # 2. Si es un usuario normal, aplicar el filtro de tenant
-        try:
-            print(f"DEBUG: get_queryset called by user: {self.request.user}")
-            empleado = self.request.user.empleado
-            print(f"DEBUG: Found empleado: {empleado}, for empresa: {empleado.empresa}")
-            
-            queryset = self.queryset.filter(empresa=empleado.empresa)
-            print(f"DEBUG: Filtered queryset count: {queryset.count()}")
-            return queryset
-        except Empleado.DoesNotExist:
-            print(f"DEBUG: Empleado.DoesNotExist for user: {self.request.user}")
-            return self.queryset.none()
-        except Exception as e:
-             print(f"ERROR in get_queryset: {e}")
-             return self.queryset.none()       
+        if tenant.empresa is None:
+            logger.debug(f"get_queryset: usuario {self.request.user} sin empresa asociada.")
+        return tenant.filtrar(self.queryset, self.tenant_field)
 
     def check_permissions(self, request):
         super().check_permissions(request) 
@@ -178,73 +202,75 @@ class BaseTenantLimitViewSet(BaseTenantViewSet):
     """
     ViewSet que comprueba los límites de la suscripción antes de CUALQUIER
     creación (POST) de un nuevo objeto (ej. Empleado o ActivoFijo).
+    El cupo se reserva con un UPDATE condicional sobre los contadores de uso
+    de la Suscripción (api/quotas.py): O(1) y sin carreras entre POST concurrentes.
     """
-    model_to_count = None       # Ej: Empleado
+    model_to_count = None       # Ej: Empleado (debe estar en quotas.QUOTA_FIELDS)
     model_limit_field = None  # Ej: 'max_usuarios'
 
     def create(self, request, *args, **kwargs):
-        empleado = request.user.empleado
-        empresa = empleado.empresa
+        empresa = self.tenant.empresa_para_escritura()
 
-        if self.model_to_count and self.model_limit_field:
-            try:
-                suscripcion = empresa.suscripcion
-                
-                # 1. Comprobar si la suscripción está activa
-                if suscripcion.estado != 'activa':
-                    return Response(
-                        {'detail': 'Tu suscripción no está activa. No puedes añadir nuevos registros.'},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
-
-                # 2. Comprobar límite
-                current_count = self.model_to_count.objects.filter(empresa=empresa).count()
-                limit = getattr(suscripcion, self.model_limit_field)
-
-                if current_count >= limit:
-                    # Límite alcanzado, bloquear creación
-                    return Response(
-                        {'detail': f'Has alcanzado el límite de {limit} {self.model_to_count._meta.verbose_name_plural} '
-                                   f'para tu plan {suscripcion.get_plan_display()}. Por favor, actualiza tu plan.'},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
-                
-                # 3. Comprobar umbral de notificación (90%) y crear notificación
-                # (Se comprueba ANTES de crear, para notificar en el 90%)
-                threshold = limit * 0.9
-                if (current_count + 1) > threshold and limit < 9999: # No notificar si es "ilimitado"
-                    # Usamos get_or_create para no spamear notificaciones idénticas
-                    Notificacion.objects.get_or_create(
-                        empresa=empresa,
-                        leido=False,
-                        tipo='ADVERTENCIA',
-                        mensaje=f'Estás cerca de tu límite de {self.model_to_count._meta.verbose_name_plural}. '
-                                f'Uso actual: {current_count + 1} de {limit}.'
-                        ,
-                        defaults={'url_destino': '/app/suscripcion'} # URL en el frontend
-                    )
-            
-            except Suscripcion.DoesNotExist:
-                return Response(
-                    {'detail': 'Error: No se encontró una suscripción para tu empresa.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            except Exception as e:
-                return Response(
-                    {'detail': str(e)},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
+        if not (self.model_to_count and self.model_limit_field and empresa is not None):
+            # Si no hay límites definidos, procede con la creación normal
+            return super().create(request, *args, **kwargs)
+
+        try:
+            suscripcion = empresa.suscripcion # Precargada por el contexto de tenant
+        except Suscripcion.DoesNotExist:
+            return Response(
+                {'detail': 'Error: No se encontró una suscripción para tu empresa.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # 1. Comprobar si la suscripción está activa
+        if suscripcion.estado != 'activa':
+            return Response(
+                {'detail': 'Tu suscripción no está activa. No puedes añadir nuevos registros.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        # 2. Reservar el cupo y crear en la misma transacción: si la creación
+        # falla (ej. error de validación) el rollback devuelve el cupo.
+        limit = getattr(suscripcion, self.model_limit_field)
+        try:
+            with transaction.atomic(), reserve_quota(empresa.id, self.model_to_count):
+                response = super().create(request, *args, **kwargs)
+        except QuotaExceeded:
+            # Límite alcanzado, bloquear creación
+            return Response(
+                {'detail': f'Has alcanzado el límite de {limit} {self.model_to_count._meta.verbose_name_plural} '
+                           f'para tu plan {suscripcion.get_plan_display()}. Por favor, actualiza tu plan.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
 
-        # Si todo está bien (o no hay límites definidos), procede con la creación normal
-        return super().create(request, *args, **kwargs)
+        # 3. Comprobar umbral de notificación (90%) y crear notificación
+        # (el uso precargado + 1 es suficiente para un aviso)
+        usados = getattr(suscripcion, usage_field(self.model_to_count)) + 1
+        if usados > limit * 0.9 and limit < 9999: # No notificar si es "ilimitado"
+            # Notificacion no tiene empresa: se avisa al usuario que está creando.
+            # Usamos get_or_create para no spamear notificaciones idénticas
+            Notificacion.objects.get_or_create(
+                destinatario=request.user,
+                leido=False,
+                tipo='ADVERTENCIA',
+                mensaje=f'Estás cerca de tu límite de {self.model_to_count._meta.verbose_name_plural}. '
+                        f'Uso actual: {usados} de {limit}.',
+                defaults={'url_destino': '/app/suscripcion'} # URL en el frontend
+            )
+        return response
     
 class CargoViewSet(BaseTenantViewSet):
     queryset = Cargo.objects.all()
     serializer_class = CargoSerializer
     required_manage_permission = 'manage_cargo'
+    ordering_fields = ('nombre',)
+    default_ordering = 'nombre'
 
 class DepartamentoViewSet(BaseTenantViewSet):
     queryset = Departamento.objects.all()
+    ordering_fields = ('nombre',)
+    default_ordering = 'nombre'
     serializer_class = DepartamentoSerializer
     required_manage_permission = 'manage_departamento'
 
@@ -302,47 +328,50 @@ class EmpleadoViewSet(BaseTenantLimitViewSet):
     # --- [NUEVO] Definir los campos para el chequeo de límites ---
     model_to_count = Empleado
     model_limit_field = 'max_usuarios'
+    ordering_fields = ('apellido_p', 'ci')
+    default_ordering = 'apellido_p'
 
     # --- CONFIGURACIÓN DE FILTROS Y BÚSQUEDA ---
     filterset_class = EmpleadoFilter
     filter_backends = (DjangoFilterBackend, SearchFilter)
     search_fields = ['usuario__first_name', 'apellido_p', 'apellido_m', 'ci', 'usuario__email']
 
-class ActivoFijoViewSet(BaseTenantViewSet):
+class ActivoFijoViewSet(BaseTenantLimitViewSet):
     queryset = ActivoFijo.objects.all()
     serializer_class = ActivoFijoSerializer
     required_manage_permission = 'manage_activofijo'
 
+    # Límite de activos del plan (contador activos_usados de la Suscripción)
+    model_to_count = ActivoFijo
+    model_limit_field = 'max_activos'
+
     # --- CONFIGURACIÓN DE FILTROS Y BÚSQUEDA ---
     # Usa la clase de filtro personalizado que creamos en api/filters.py
     filterset_class = ActivoFijoFilter
-    # Añade el backend de Búsqueda general de DRF
-    filter_backends = (DjangoFilterBackend, SearchFilter)
-    # Define los campos sobre los que actuará el parámetro ?search=
-    search_fields = ['nombre', 'codigo_interno', 'serial']
+    # ?search= usa el índice de búsqueda (api/search.py) en lugar de varios icontains
+    filter_backends = (DjangoFilterBackend, IndexedSearchFilter)
+    ordering_fields = ('fecha_adquisicion', 'nombre', 'codigo_interno', 'valor_actual')
+
+    @property
+    def default_ordering(self):
+        # Con búsqueda, por relevancia; si no, los más recientes primero
+        if self.request.query_params.get(IndexedSearchFilter.search_param, '').strip():
+            return '-search_rank'
+        return '-fecha_adquisicion'
 
 class PresupuestoViewSet(BaseTenantViewSet):
     queryset = Presupuesto.objects.all()
     serializer_class = PresupuestoSerializer
     required_manage_permission = 'manage_presupuesto'
+    # Presupuesto no tiene 'empresa': se filtra a través del departamento
+    tenant_field = 'departamento__empresa'
 
     # --- CONFIGURACIÓN DE FILTROS Y BÚSQUEDA ---
     filterset_class = PresupuestoFilter
     filter_backends = (DjangoFilterBackend, SearchFilter)
     search_fields = ['descripcion', 'departamento__nombre']
-
-    def get_queryset(self):
-        """
-        Sobrescribe el método base para filtrar a través del departamento.
-        """
-        if self.request.user.is_staff:
-            return self.queryset.all()
-        
-        try:
-            empleado = self.request.user.empleado
-            return self.queryset.filter(departamento__empresa=empleado.empresa)
-        except Empleado.DoesNotExist:
-            return self.queryset.none()
+    ordering_fields = ('fecha',)
+    default_ordering = '-fecha'
 
     def perform_create(self, serializer):
         """
@@ -352,7 +381,7 @@ class PresupuestoViewSet(BaseTenantViewSet):
         """
         # Validar que el departamento pertenezca a la empresa del usuario
         departamento = serializer.validated_data.get('departamento')
-        if departamento.empresa != self.request.user.empleado.empresa:
+        if departamento.empresa_id != self.tenant.empresa_id:
             raise serializers.ValidationError({
                 "departamento_id": "Este departamento no pertenece a tu empresa."
             })
@@ -360,6 +389,8 @@ class PresupuestoViewSet(BaseTenantViewSet):
 
 class RolesViewSet(BaseTenantViewSet):
     queryset = Roles.objects.all()
+    ordering_fields = ('nombre',)
+    default_ordering = 'nombre'
     serializer_class = RolesSerializer
     required_manage_permission = 'manage_rol'
 
@@ -371,6 +402,8 @@ class EstadoViewSet(BaseTenantViewSet):
     filterset_class = EstadoFilter
     filter_backends = (DjangoFilterBackend, SearchFilter)
     search_fields = ['nombre']
+    ordering_fields = ('nombre',)
+    default_ordering = 'nombre'
 
 class UbicacionViewSet(BaseTenantViewSet):
     queryset = Ubicacion.objects.all()
@@ -380,6 +413,8 @@ class UbicacionViewSet(BaseTenantViewSet):
     filterset_class = UbicacionFilter
     filter_backends = (DjangoFilterBackend, SearchFilter)
     search_fields = ['nombre', 'direccion']
+    ordering_fields = ('nombre',)
+    default_ordering = 'nombre'
 
 class ProveedorViewSet(BaseTenantViewSet):
     queryset = Proveedor.objects.all()
@@ -390,6 +425,8 @@ class ProveedorViewSet(BaseTenantViewSet):
     filterset_class = ProveedorFilter
     filter_backends = (DjangoFilterBackend, SearchFilter)
     search_fields = ['nombre', 'nit', 'email']
+    ordering_fields = ('nombre',)
+    default_ordering = 'nombre'
 
 class PermisosViewSet(viewsets.ModelViewSet): 
     """
@@ -410,11 +447,18 @@ class PermisosViewSet(viewsets.ModelViewSet):
 class LogViewSet(viewsets.ModelViewSet):
     """
     ViewSet para recibir y guardar registros de log desde el frontend.
-    No usa el filtro de tenant porque es una función a nivel de sistema.
+    No hereda de BaseTenantViewSet (Log vive en 'log_saas' y solo guarda tenant_id),
+    pero la lectura se limita a los logs de la empresa del usuario.
     """
     queryset = Log.objects.all()
     serializer_class = LogSerializer
     permission_classes = [IsAuthenticated] # Solo usuarios autenticados pueden registrar logs
+    pagination_class = KeysetPagination
+    ordering_fields = ('timestamp',)
+    default_ordering = '-timestamp'
+
+    def get_queryset(self):
+        return get_tenant(self.request).filtrar(self.queryset, 'tenant_id')
 
     def perform_create(self, serializer):
         # Obtenemos la IP del cliente de forma segura
@@ -425,11 +469,10 @@ class LogViewSet(viewsets.ModelViewSet):
             ip = self.request.META.get('REMOTE_ADDR')
 
         # Asignamos los datos automáticos antes de guardar
-        empleado = self.request.user.empleado
         serializer.save(
             usuario=self.request.user,
             ip_address=ip,
-            tenant_id=empleado.empresa.id if empleado else None
+            tenant_id=get_tenant(self.request).empresa_id
         )
 
 class RegisterEmpresaView(APIView):
@@ -452,11 +495,13 @@ class RegisterEmpresaView(APIView):
                 token['empresa_id'] = str(empleado.empresa.id)
                 token['empresa_nombre'] = empleado.empresa.nombre
                 token['empleado_id'] = str(empleado.id)
-                # Al registrarse, el rol de Admin aún no está asignado (a menos que lo hagas en el serializer)
-                token['roles'] = [] # Vacío por ahora
+                # El serializer ya asignó el rol 'Admin' de la nueva empresa
+                token['roles'] = [rol.nombre for rol in empleado.roles.all()]
+                add_permission_claims(token, user, empleado.empresa_id)
                 token['is_admin'] = user.is_staff
             except Empleado.DoesNotExist:
                 token['roles'] = []
+                token['permisos'] = []
                 token['is_admin'] = user.is_staff
                 
             return Response({
@@ -467,43 +512,87 @@ class RegisterEmpresaView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class UserPermissionsView(APIView):
-    # (Tu vista de permisos está bien)
+    # Lee de la misma caché de permisos que usa HasPermission (api/permissions.py)
     permission_classes = [IsAuthenticated]
     def get(self, request, *args, **kwargs):
         permissions_set = set()
         try:
-            empleado = request.user.empleado
-            permissions_set = set(
-                empleado.roles.values_list('permisos__nombre', flat=True).distinct()
-            )
-            if request.user.is_staff:
-                 permissions_set.add('is_superuser')
-        except Empleado.DoesNotExist:
-            if request.user.is_staff:
-                 permissions_set.add('is_superuser')
-            pass 
+            permissions_set = set(get_user_permissions(request))
         except Exception as e:
-            print(f"Error fetching user permissions: {e}")
+            logger.error(f"Error fetching user permissions: {e}")
+        if request.user.is_staff:
+             permissions_set.add('is_superuser')
         return Response(list(permissions_set))
 
-class ReporteActivosPreview(APIView):
+class ReportePreviewMixin:
+    """
+    Vista previa paginada por cursor (api/pagination.py) en lugar de devolver
+    todas las filas: una página acotada de una proyección (values), el total
+    estimado y, en la primera página, el resumen del filtro completo (filas y
+    suma de valor_actual) calculado con un solo aggregate. Con una conversión
+    (api/divisas.py) los importes de la página y del resumen salen en esa divisa.
+    """
+    pagination_class = ReportPreviewPagination
+    ordering_fields = ('fecha_adquisicion', 'nombre', 'codigo_interno', 'valor_actual')
+    default_ordering = '-fecha_adquisicion'
+    summary_query_param = 'include_summary'
+    preview_fields = (
+        'id', 'nombre', 'codigo_interno', 'fecha_adquisicion', 'valor_actual',
+        'item_catalogo__nombre', 'departamento__nombre'
+    )
+
+    def preview_payload(self, request, queryset, conversion=None):
+        ranked = 'search_rank' in queryset.query.annotations
+        if ranked:
+            # Con texto libre el orden por defecto es la relevancia (lo lee el paginador)
+            self.default_ordering = '-search_rank'
+        fields = self.preview_fields + (('search_rank',) if ranked else ())
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(queryset.values(*fields), request, view=self)
+        payload = paginator.get_paginated_response(page).data
+        if conversion is not None and not conversion.identidad:
+            for fila in payload['results']:
+                fila['valor_actual'] = conversion.convertir(fila['valor_actual'])
+
+        cursor = request.query_params.get(paginator.cursor_query_param)
+        summary = request.query_params.get(self.summary_query_param, '').lower()
+        if cursor is None and summary not in ('0', 'false', 'no'):
+            payload['resumen'] = queryset.order_by().aggregate(
+                filas=Count('pk'), valor_total=Coalesce(Sum('valor_actual'), Decimal('0'))
+            )
+            if conversion is not None:
+                payload['resumen']['valor_total'] = conversion.convertir(payload['resumen']['valor_total'])
+        if conversion is not None and conversion.codigo:
+            payload['divisa'] = conversion.codigo
+        return payload
+
+class ReporteActivosPreview(ReportePreviewMixin, APIView):
     """
     Vista previa para el reporte original basado en filtros de formulario.
     """
     permission_classes = [IsAuthenticated]
+    default_ordering = 'fecha_adquisicion'
 
     def get_queryset(self, request):
-        empleado = request.user.empleado
-        queryset = ActivoFijo.objects.filter(empresa=empleado.empresa).select_related(
-            'item_catalogo', 'estado', 'ubicacion', 'departamento' # Asegurar todos los relateds
-        )
-        ubicacion_id = request.query_params.get('ubicacion_id') 
-        fecha_min = request.query_params.get('fecha_min')
-        fecha_max = request.query_params.get('fecha_max')
+        tenant = get_tenant(request)
+        if tenant.empresa is None and not tenant.is_staff:
+            raise Empleado.DoesNotExist
+        return self.filtrar_formulario(tenant.filtrar(ActivoFijo.objects.all()), request.query_params)
+
+    @staticmethod
+    def filtrar_formulario(queryset, params):
+        """
+        Aplica los filtros del formulario (params: query_params o dict).
+        ActivoFijo no tiene ubicación: el antiguo ubicacion_id (que fallaba siempre)
+        se sustituye por departamento_id / proveedor_id / estado_id.
+        """
+        for param in ('departamento_id', 'proveedor_id', 'estado_id'):
+            if params.get(param):
+                queryset = queryset.filter(**{param: params.get(param)})
+        fecha_min = params.get('fecha_min')
+        fecha_max = params.get('fecha_max')
         
         # Aplicar filtros
-        if ubicacion_id:
-            queryset = queryset.filter(ubicacion_id=ubicacion_id)
         if fecha_min:
             queryset = queryset.filter(fecha_adquisicion__gte=fecha_min)
         if fecha_max:
@@ -514,34 +603,61 @@ class ReporteActivosPreview(APIView):
     def get(self, request, *args, **kwargs):
         try:
             queryset = self.get_queryset(request)
-            # Devolver los campos que el frontend necesita para la tabla
-            data = queryset.values(
-                'id', 'nombre', 'codigo_interno', 'fecha_adquisicion', 'valor_actual',
-                'ubicacion__nombre', 'item_catalogo__nombre', 'departamento__nombre'
-            )
-            return Response(list(data))
+            conversion = divisas.conversion_para(get_tenant(request).empresa, request.query_params.get('divisa'))
+            return Response(self.preview_payload(request, queryset, conversion))
         except Empleado.DoesNotExist:
              return Response({"detail": "Usuario no asociado a un empleado."}, status=status.HTTP_400_BAD_REQUEST)
+        except divisas.DivisaError as e:
+             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except DjangoValidationError as e:
+             return Response({"detail": f"Filtro inválido: {e.messages[0]}"}, status=status.HTTP_400_BAD_REQUEST)
+        except NotFound:
+             raise
         except Exception as e:
              logger.error(f"ReporteActivosPreview Error: {e}", exc_info=True)
              return Response({"detail": "Error al generar vista previa."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def encolar_reporte(request, origen, export_format, parametros):
+    """
+    Registra la exportación como ReporteJob y responde 202 sin generar nada:
+    el archivo lo produce el comando process_report_jobs (ver api/report_jobs.py).
+    """
+    if export_format in STREAM_CONTENT_TYPES:
+        # csv/ndjson ya se envían en streaming; el worker solo genera pdf y excel
+        return Response(
+            {"detail": f"El formato {export_format} no se genera en segundo plano; usa pdf o excel, o quita async."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    serializer = ReporteJobSerializer(
+        data={'origen': origen, 'formato': 'excel' if export_format == 'excel' else 'pdf', 'parametros': parametros},
+        context={'request': request},
+    )
+    serializer.is_valid(raise_exception=True)
+    tenant = get_tenant(request)
+    if tenant.empresa is None and not tenant.ve_todo:
+        return Response({"detail": "Usuario no asociado a un empleado."}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        # El trabajo convierte los importes con las tasas vigentes al generarlo
+        divisas.conversion_para(tenant.empresa, serializer.validated_data['parametros'].get('divisa'))
+    except divisas.DivisaError as e:
+        return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    job = enqueue(tenant, request.user, **serializer.validated_data)
+    logger.info(f"Reporte encolado: {job.id} ({job.origen}, {job.formato})")
+    return Response(ReporteJobSerializer(job, context={'request': request}).data, status=status.HTTP_202_ACCEPTED)
+
 class ReporteActivosExport(APIView):
     """
-    Exporta el reporte original (filtros de formulario) a PDF o Excel.
+    Exporta el reporte original (filtros de formulario) a PDF, Excel, CSV o NDJSON.
     Reutiliza funciones de report_utils.py
     """
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self, request):
         try:
-            # Reutiliza la lógica de get_queryset de la vista previa
-            # y asegura que todos los campos relacionados necesarios estén
-            qs = ReporteActivosPreview().get_queryset(request).select_related(
-               'ubicacion', 'estado', 'item_catalogo', 'departamento'
-            )
-            logger.info(f"Report Export: Queryset count = {qs.count()}")
-            return qs
+            # Reutiliza la lógica de get_queryset de la vista previa.
+            # Las utilidades de report_utils leen una proyección plana (values_list),
+            # así que no hace falta select_related ni contar las filas de antemano.
+            return ReporteActivosPreview().get_queryset(request)
         except Exception as e:
             logger.error(f"Report Export: Error in get_queryset: {e}", exc_info=True)
             raise Http404("Error al obtener datos base.")
@@ -549,8 +665,22 @@ class ReporteActivosExport(APIView):
     def get(self, request, *args, **kwargs):
         export_format = request.query_params.get('format', 'pdf').lower()
         logger.info(f"Report Export GET request. Format = {export_format}")
+        divisa = request.query_params.get('divisa')
+        if request.query_params.get('async', '').lower() in TRUTHY:
+            parametros = {k: request.query_params[k] for k in ACTIVOS_FORM_PARAMS if request.query_params.get(k)}
+            if divisa:
+                parametros['divisa'] = divisa
+            return encolar_reporte(request, 'activos', export_format, parametros)
+        try:
+            conversion = divisas.conversion_para(get_tenant(request).empresa, divisa)
+        except divisas.DivisaError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         try:
             queryset = self.get_queryset(request)
+            if export_format in STREAM_CONTENT_TYPES:
+                # Se envía directamente desde el cursor (sin exists(): vacío = solo encabezado)
+                compress = request.query_params.get('gzip', '').lower() in TRUTHY
+                return streaming_report_response(queryset, export_format, compress=compress, conversion=conversion)
             if not queryset.exists():
                  logger.warning("Report Export: Queryset is empty.")
                  return Response({"detail": "No hay datos para exportar con esos filtros."}, status=status.HTTP_404_NOT_FOUND)
@@ -558,12 +688,12 @@ class ReporteActivosExport(APIView):
             # --- Llamar a funciones de utils ---
             if export_format == 'excel':
                 logger.info("Report Export: Calling create_excel_report util...")
-                response = create_excel_report(queryset)
+                response = create_excel_report(queryset, conversion)
                 logger.info("Report Export: create_excel_report finished.")
                 return response
             else:
                 logger.info("Report Export: Calling create_pdf_report util...")
-                response = create_pdf_report(queryset)
+                response = create_pdf_report(queryset, conversion)
                 logger.info("Report Export: create_pdf_report finished.")
                 return response
 
@@ -574,118 +704,20 @@ class ReporteActivosExport(APIView):
              logger.error(f"Report Export: Unhandled error in GET: {e}", exc_info=True)
              return Response({"detail": f"Error interno al generar el reporte: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-
-    # --- FUNCIÓN HELPER PARA REPORTE DINÁMICO ---
-    def parse_and_build_query(filters_list, base_queryset):
-        """
-        Toma una lista de strings de filtro (ej: ["depto:TI", "laptop", "valor>500"])
-        y la convierte en un queryset de Django filtrado.
-        """
-        query = base_queryset
-        
-        # Mapeo de claves a campos base del modelo ActivoFijo
-        field_mapping = {
-            'depto': 'departamento__nombre',
-            'categoria': 'item_catalogo__nombre',
-            'ubicacion': 'ubicacion__nombre',
-            'estado': 'estado__nombre',
-            'proveedor': 'proveedor__nombre',
-            'nombre': 'nombre',
-            'codigo': 'codigo_interno',
-            'valor': 'valor_actual',
-            'fecha_adq': 'fecha_adquisicion',
-        }
-
-        # Mapeo de operadores de texto/numéricos a suffixes de Django ORM
-        operator_mapping = {
-            ':': '__icontains', # Búsqueda de texto flexible (contiene, sin mayúsculas)
-            '>': '__gt',        # Mayor que
-            '<': '__lt',        # Menor que
-            '=': '__exact',     # Coincidencia exacta
-        }
-
-        q_objects = Q() # Inicializa un objeto Q vacío (para combinar filtros con AND)
-
-        for f in filters_list:
-            try:
-                f = f.strip()
-                if not f: continue # Ignorar filtros vacíos
-
-                # --- NUEVA LÓGICA DE PARSEO ---
-                # Intenta encontrar un patrón como "clave:valor", "clave>valor", "clave < valor"
-                # Regex: (clave) (espacios) (operador) (espacios) (valor)
-                match = re.match(r'([\w_]+)\s*([:<>])\s*(.+)', f)
-                
-                if match:
-                    # --- Filtro Estructurado (ej: "depto: TI", "valor > 1000") ---
-                    key, operator, value = match.groups()
-                    key = key.lower().strip()
-                    operator = operator.strip()
-                    value = value.strip()
-                    
-                    # Verificar si la clave y el operador son válidos
-                    if key in field_mapping and operator in operator_mapping:
-                        # Construir el nombre completo del campo ORM (ej: 'valor_actual__gt')
-                        orm_field = field_mapping[key] + operator_mapping[operator]
-                        
-                        # Convertir valor si es numérico o fecha
-                        if operator in ['>', '<', '='] and key in ['valor', 'fecha_adq']:
-                            try:
-                                if key == 'valor':
-                                    value = float(value) # Convertir a número
-                                elif key == 'fecha_adq':
-                                    # Asumir formato YYYY-MM-DD
-                                    value = datetime.strptime(value, '%Y-%m-%d').date()
-                            except ValueError:
-                                logger.warn(f"Filtro ignorado: Valor para '{key}{operator}' no es válido: '{value}'")
-                                continue # Saltar este filtro
-                        
-                        # Añadir al query (ej: Q(valor_actual__gt=1000))
-                        q_objects &= Q(**{orm_field: value})
-                    else:
-                        logger.warn(f"Filtro ignorado: Clave '{key}' u operador '{operator}' no reconocidos.")
-
-                # --- Filtro de Texto Simple (ej: "laptop", "finanzas") ---
-                else:
-                    # Si no es un filtro estructurado, buscar el texto en MÚLTIPLES campos
-                    q_objects &= (
-                        Q(nombre__icontains=f) | 
-                        Q(codigo_interno__icontains=f) |
-                        Q(departamento__nombre__icontains=f) |
-                        Q(item_catalogo__nombre__icontains=f) |
-                        Q(ubicacion__nombre__icontains=f) |
-                        Q(estado__nombre__icontains=f) |
-                        Q(proveedor__nombre__icontains=f)
-                    )
-            except Exception as e:
-                # Ignorar filtros malformados (ej: "valor>abc")
-                logger.warn(f"Report Query: Ignorando filtro malformado: '{f}'. Error: {e}")
-                pass
-                
-        # Aplicar todos los filtros combinados (Q objects) al queryset
-        return query.filter(q_objects).distinct()
-
-class ReporteQueryView(APIView):
+class ReporteQueryView(ReportePreviewMixin, APIView):
     """
-    Recibe filtros dinámicos (POST) y devuelve una vista previa JSON.
+    Recibe filtros dinámicos (POST) y devuelve una vista previa JSON paginada:
+    {next, previous, count, resumen, results}. Las páginas siguientes se piden
+    con el mismo cuerpo y el ?cursor= del enlace next.
     Endpoint: /api/reportes/query/
     """
     permission_classes = [IsAuthenticated]
 
     def get_base_queryset(self, request):
-        # Filtrar por tenant (empresa)
-        try:
-            empleado = request.user.empleado
-            # Precargar todos los campos relacionados que podamos necesitar
-            return ActivoFijo.objects.filter(empresa=empleado.empresa).select_related(
-                'departamento', 'ubicacion', 'item_catalogo', 'estado', 'proveedor'
-            )
-        except Empleado.DoesNotExist:
-            if request.user.is_staff:
-                 return ActivoFijo.objects.all().select_related(
-                    'departamento', 'ubicacion', 'item_catalogo', 'estado', 'proveedor'
-                 )
-            return ActivoFijo.objects.none()
+        # Filtrar por tenant (empresa); el SuperAdmin ve todo salvo que elija empresa.
+        # Sin select_related: la vista previa y los archivos leen proyecciones
+        # (values/values_list) y los filtros solo unen las tablas que mencionan.
+        return get_tenant(request).filtrar(ActivoFijo.objects.all())
 
     def post(self, request, *args, **kwargs):
         filters = request.data.get('filters', [])
@@ -694,115 +726,50 @@ class ReporteQueryView(APIView):
         
         logger.info(f"Report Query Preview POST. Filters = {filters}")
         try:
+            tenant = get_tenant(request)
+            if tenant.empresa is None and not tenant.ve_todo:
+                # Sin empresa no hay activos visibles: el mismo sobre paginado, vacío
+                data = self.preview_payload(request, ActivoFijo.objects.none())
+                return Response(data, status=status.HTTP_200_OK)
+            conversion = divisas.conversion_para(tenant.empresa, self.divisa_pedida(request))
+            # Caché por (tenant, filtros normalizados, página pedida, divisa, versión de datos): ver api/report_cache.py
+            params = request.query_params.dict()
+            if conversion.clave:
+                params['divisa'] = conversion.clave
+            cache_key, data = report_cache.get_preview(self.cache_scope(tenant), filters, params)
+            if data is not None:
+                return Response(data, status=status.HTTP_200_OK, headers={'X-Report-Cache': 'HIT'})
+
             base_qs = self.get_base_queryset(request)
-            queryset = ReporteQueryView.parse_and_build_query(filters, base_qs)
+            queryset = apply_filters(base_qs, filters, tenant.empresa_id)
             
-            # Devolver los datos que el frontend espera en la tabla
-            data = queryset.values(
-                'id', 'nombre', 'codigo_interno', 'fecha_adquisicion', 'valor_actual',
-                'departamento__nombre',
-                'ubicacion__nombre'
-            )
-            return Response(list(data), status=status.HTTP_200_OK)
+            # Una página de la proyección que el frontend muestra en la tabla
+            data = self.preview_payload(request, queryset, conversion)
+            report_cache.set_preview(cache_key, data)
+            return Response(data, status=status.HTTP_200_OK, headers={'X-Report-Cache': 'MISS'})
         
+        except (FilterSyntaxError, divisas.DivisaError) as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except NotFound:
+            raise  # Cursor inválido
         except Exception as e:
             logger.error(f"Report Query Error: {e}", exc_info=True)
             return Response({"detail": f"Error al procesar la consulta: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     @staticmethod
-    def parse_and_build_query(filters_list, base_queryset):
-        """
-        Toma una lista de strings de filtro (ej: ["depto:TI", "laptop", "valor>500"])
-        y la convierte en un queryset de Django filtrado.
-        """
-        query = base_queryset
-        
-        # Mapeo de claves a campos base del modelo ActivoFijo
-        field_mapping = {
-            'depto': 'departamento__nombre',
-            'categoria': 'item_catalogo__nombre',
-            'ubicacion': 'ubicacion__nombre',
-            'estado': 'estado__nombre',
-            'proveedor': 'proveedor__nombre',
-            'nombre': 'nombre',
-            'codigo': 'codigo_interno',
-            'valor': 'valor_actual',
-            'fecha_adq': 'fecha_adquisicion',
-        }
-
-        # Mapeo de operadores de texto/numéricos a suffixes de Django ORM
-        operator_mapping = {
-            ':': '__icontains', # Búsqueda de texto flexible (contiene, sin mayúsculas)
-            '>': '__gt',        # Mayor que
-            '<': '__lt',        # Menor que
-            '=': '__exact',     # Coincidencia exacta
-        }
-
-        q_objects = Q() # Inicializa un objeto Q vacío (para combinar filtros con AND)
-
-        for f in filters_list:
-            try:
-                f = f.strip()
-                if not f: continue # Ignorar filtros vacíos
+    def divisa_pedida(request):
+        """Divisa de los importes: campo 'divisa' del cuerpo o ?divisa= (vacío = divisa base)."""
+        return request.data.get('divisa') or request.query_params.get('divisa')
 
-                # --- NUEVA LÓGICA DE PARSEO ---
-                # Intenta encontrar un patrón como "clave:valor", "clave>valor", "clave < valor"
-                # Regex: (clave) (espacios) (operador) (espacios) (valor)
-                match = re.match(r'([\w_]+)\s*([:<>])\s*(.+)', f)
-                
-                if match:
-                    # --- Filtro Estructurado (ej: "depto: TI", "valor > 1000") ---
-                    key, operator, value = match.groups()
-                    key = key.lower().strip()
-                    operator = operator.strip()
-                    value = value.strip()
-                    
-                    # Verificar si la clave y el operador son válidos
-                    if key in field_mapping and operator in operator_mapping:
-                        # Construir el nombre completo del campo ORM (ej: 'valor_actual__gt')
-                        orm_field = field_mapping[key] + operator_mapping[operator]
-                        
-                        # Convertir valor si es numérico o fecha
-                        if operator in ['>', '<', '='] and key in ['valor', 'fecha_adq']:
-                            try:
-                                if key == 'valor':
-                                    value = float(value) # Convertir a número
-                                elif key == 'fecha_adq':
-                                    # Asumir formato YYYY-MM-DD
-                                    value = datetime.strptime(value, '%Y-%m-%d').date()
-                            except ValueError:
-                                logger.warn(f"Filtro ignorado: Valor para '{key}{operator}' no es válido: '{value}'")
-                                continue # Saltar este filtro
-                        
-                        # Añadir al query (ej: Q(valor_actual__gt=1000))
-                        q_objects &= Q(**{orm_field: value})
-                    else:
-                        logger.warn(f"Filtro ignorado: Clave '{key}' u operador '{operator}' no reconocidos.")
-
-                # --- Filtro de Texto Simple (ej: "laptop", "finanzas") ---
-                else:
-                    # Si no es un filtro estructurado, buscar el texto en MÚLTIPLES campos
-                    q_objects &= (
-                        Q(nombre__icontains=f) | 
-                        Q(codigo_interno__icontains=f) |
-                        Q(departamento__nombre__icontains=f) |
-                        Q(categoria__nombre__icontains=f) |
-                        Q(ubicacion__nombre__icontains=f) |
-                        Q(estado__nombre__icontains=f) |
-                        Q(proveedor__nombre__icontains=f)
-                    )
-            except Exception as e:
-                # Ignorar filtros malformados (ej: "valor>abc")
-                logger.warn(f"Report Query: Ignorando filtro malformado: '{f}'. Error: {e}")
-                pass
-                
-        # Aplicar todos los filtros combinados (Q objects) al queryset
-        return query.filter(q_objects).distinct()
+    @staticmethod
+    def cache_scope(tenant):
+        """Empresa con la que se indexa la caché de reportes (None = vista global del SuperAdmin)."""
+        return None if tenant.ve_todo else tenant.empresa_id
 
 class ReporteQueryExportView(ReporteQueryView):
     """
     Recibe filtros dinámicos y formato (POST) y devuelve un archivo PDF/Excel
-    usando las funciones de report_utils.py
+    (cacheado) o un CSV/NDJSON en streaming, usando las funciones de report_utils.py
     """
     
     def post(self, request, *args, **kwargs):
@@ -813,24 +780,50 @@ class ReporteQueryExportView(ReporteQueryView):
              return Response({"detail": "Filters debe ser lista."}, status=status.HTTP_400_BAD_REQUEST)
 
         logger.info(f"Report Query Export POST. Format = {export_format}, Filters = {filters}")
+        divisa = self.divisa_pedida(request)
+        if str(request.data.get('async', '')).lower() in TRUTHY:
+            parametros = {'filters': filters, 'divisa': divisa} if divisa else {'filters': filters}
+            return encolar_reporte(request, 'query', export_format, parametros)
         try:
-            # Obtener queryset base (ya tiene select_related)
-            base_qs = self.get_base_queryset(request)
-            # Aplicar filtros
-            queryset = ReporteQueryView.parse_and_build_query(filters, base_qs)
-
-            if not queryset.exists():
-                logger.warning("Report Query Export: Queryset is empty.")
+            tenant = get_tenant(request)
+            if tenant.empresa is None and not tenant.ve_todo:
                 return Response({"detail": "No hay datos para exportar."}, status=status.HTTP_404_NOT_FOUND)
+            conversion = divisas.conversion_para(tenant.empresa, divisa)
+            base_qs = self.get_base_queryset(request)
+            # Aplicar filtros (el plan compilado se memoriza, ver api/report_query.py)
+            queryset = apply_filters(base_qs, filters, tenant.empresa_id)
+            if export_format in STREAM_CONTENT_TYPES:
+                compress = str(request.data.get('gzip', '')).lower() in TRUTHY
+                return streaming_report_response(queryset, export_format, compress=compress, conversion=conversion)
+            export_format = 'excel' if export_format == 'excel' else 'pdf'
+
+            def render(fileobj):
+                # Se comprueba aquí para no consultar la BD cuando el archivo ya está en caché
+                if not queryset.exists():
+                    raise Http404("No hay datos para exportar.")
+                logger.info(f"Report Query Export: rendering {export_format}...")
+                if export_format == 'excel':
+                    write_excel_report(queryset, fileobj, conversion=conversion)
+                    return {}
+                _rows, pages = write_pdf_report(queryset, fileobj, conversion=conversion)
+                return {'pages': pages}
+
+            # Archivos cacheados en disco por (tenant, filtros, formato, divisa, versión de datos)
+            fileobj, meta, hit = report_cache.get_or_render_export(
+                self.cache_scope(tenant), filters, export_format, render, extra=conversion.clave
+            )
+            response = FileResponse(
+                fileobj, as_attachment=True,
+                filename=f"reporte_activos.{report_cache.EXTENSIONS[export_format]}",
+                content_type=EXCEL_CONTENT_TYPE if export_format == 'excel' else 'application/pdf',
+            )
+            response['X-Report-Cache'] = 'HIT' if hit else 'MISS'
+            if 'pages' in meta:
+                response['X-Report-Pages'] = str(meta['pages'])
+            return response
 
-            # --- Llamar a funciones de utils ---
-            if export_format == 'excel':
-                logger.info("Report Query Export: Calling create_excel_report util...")
-                return create_excel_report(queryset) # <-- LLAMADA A UTIL
-            else:
-                logger.info("Report Query Export: Calling create_pdf_report util...")
-                return create_pdf_report(queryset) # <-- LLAMADA A UTIL
-
+        except (FilterSyntaxError, divisas.DivisaError) as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Http404 as e:
             logger.warning(f"Report Query Export: Http404 - {e}")
             return Response({"detail": str(e)}, status=status.HTTP_404_NOT_FOUND)
@@ -838,6 +831,181 @@ class ReporteQueryExportView(ReporteQueryView):
             logger.error(f"Report Query Export Error: {e}", exc_info=True)
             return Response({"detail": f"Error al exportar: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
                 
+class ReporteLibroView(APIView):
+    """
+    Libro de auditoría del tenant en un solo Excel: activos, mantenimientos,
+    revalorizaciones, depreciaciones, disposiciones y movimientos de inventario.
+    Las hojas se consultan en paralelo (ver api/report_workbook.py). Con ?divisa=
+    cada importe se convierte con la tasa de su fecha.
+    Endpoint: GET /api/reportes/libro/
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        tenant = get_tenant(request)
+        if tenant.empresa is None and not tenant.ve_todo:
+            return Response({"detail": "Usuario no asociado a un empleado."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            conversion = divisas.conversion_para(tenant.empresa, request.query_params.get('divisa'))
+        except divisas.DivisaError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            fileobj = spooled_file()
+            write_tenant_workbook(sheet_querysets(tenant), fileobj, conversion=conversion)
+            return file_response(fileobj, "libro_auditoria.xlsx", EXCEL_CONTENT_TYPE)
+        except Exception as e:
+            logger.error(f"Libro de auditoría: error al generar: {e}", exc_info=True)
+            return Response({"detail": f"Error al generar el libro: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class ReporteJobViewSet(BaseTenantViewSet):
+    """
+    Exportaciones en segundo plano: POST encola (filtros + formato) y devuelve el
+    id; GET consulta estado/progreso; /descargar/ entrega el archivo terminado.
+    Cada usuario ve sus propios trabajos (el SuperAdmin, todos los del tenant).
+    """
+    queryset = ReporteJob.objects.all()
+    serializer_class = ReporteJobSerializer
+    http_method_names = ['get', 'post', 'delete', 'head', 'options']
+    ordering_fields = ('creado',)
+    default_ordering = '-creado'
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(usuario=self.request.user)
+        return queryset
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        return encolar_reporte(request, data.get('origen', 'query'), data.get('formato', 'pdf'), data.get('parametros', {}))
+
+    def perform_destroy(self, instance):
+        # Un trabajo en curso termina igualmente, pero su UPDATE final ya no encuentra la fila
+        delete_artifact(instance.archivo)
+        instance.delete()
+
+    @action(detail=True, methods=['get'])
+    def descargar(self, request, pk=None):
+        job = self.get_object()
+        if job.estado == 'expirado':
+            return Response({"detail": "El reporte ha caducado. Vuelve a generarlo."}, status=status.HTTP_410_GONE)
+        if job.estado != 'completado':
+            return Response({"detail": f"El reporte aún no está listo ({job.get_estado_display()})."},
+                            status=status.HTTP_409_CONFLICT)
+        try:
+            fileobj = open(artifact_abspath(job.archivo), 'rb')
+        except FileNotFoundError:
+            logger.error(f"ReporteJob {job.id}: falta el archivo {job.archivo}")
+            return Response({"detail": "El archivo del reporte no existe."}, status=status.HTTP_410_GONE)
+        return FileResponse(fileobj, as_attachment=True, filename=download_filename(job))
+
+class ReporteCacheStatsView(APIView):
+    """Aciertos/fallos de la caché de reportes (para dimensionarla). DELETE reinicia los contadores."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(report_cache.get_stats())
+
+    def delete(self, request, *args, **kwargs):
+        report_cache.reset_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class ReporteAgregadoView(APIView):
+    """
+    Totales agrupados desde la tabla resumen (ResumenActivos), en una sola
+    consulta GROUP BY y sin recorrer ActivoFijo.
+    GET /api/reportes/agregado/?group_by=departamento,estado&metrics=cantidad,valor_total,valor_promedio
+    Dimensiones: departamento, estado, proveedor, categoria, anio, mes, antiguedad.
+    Filtros: departamento_id, estado_id, proveedor_id, categoria_id, fecha_min, fecha_max.
+    ?divisa= convierte los importes con las tasas actuales.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @staticmethod
+    def _lista(valor, default):
+        return [v.strip() for v in valor.split(',') if v.strip()] if valor else list(default)
+
+    def get(self, request, *args, **kwargs):
+        group_by = self._lista(request.query_params.get('group_by'), ())
+        metrics = self._lista(request.query_params.get('metrics'), resumen.DEFAULT_METRICS)
+        invalidas = [d for d in group_by if d not in resumen.DIMENSIONS]
+        invalidas += [m for m in metrics if m not in resumen.METRICS]
+        if invalidas or len(set(group_by)) != len(group_by):
+            return Response({
+                "detail": f"Parámetros inválidos: {', '.join(invalidas) or 'dimensiones repetidas'}.",
+                "dimensiones": list(resumen.DIMENSIONS), "metricas": list(resumen.METRICS),
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        tenant = get_tenant(request)
+        if tenant.empresa is None and not tenant.ve_todo:
+            return Response({"group_by": group_by, "results": []})
+        try:
+            conversion = divisas.conversion_para(tenant.empresa, request.query_params.get('divisa'))
+        except divisas.DivisaError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            queryset = resumen.filtrar_resumen(tenant.filtrar(ResumenActivos.objects.all()), request.query_params)
+            results = resumen.aggregate(queryset, group_by, metrics)
+        except (ValueError, DjangoValidationError) as e:
+            return Response({"detail": f"Filtro inválido: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+        if not conversion.identidad:
+            for item in results:
+                for metric in ('valor_total', 'valor_promedio'):
+                    if metric in item:
+                        item[metric] = conversion.convertir(item[metric])
+        return Response({"group_by": group_by, "divisa": conversion.codigo, "results": results})
+
+class ValorActivosAFechaView(APIView):
+    """
+    Valor en libros a una fecha (balance histórico), desde el snapshot mensual más
+    cercano y los eventos posteriores (ver api/valoracion.py).
+    GET /api/reportes/valor-a-fecha/?fecha=2024-06-30&group_by=departamento,categoria
+    Con ?activo_id= devuelve el valor de un solo activo; con ?divisa=, los importes
+    en esa divisa con las tasas vigentes a la fecha.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        group_by = ReporteAgregadoView._lista(request.query_params.get('group_by'), ())
+        invalidas = [d for d in group_by if d not in valoracion.DIMENSIONS]
+        if invalidas or len(set(group_by)) != len(group_by):
+            return Response({
+                "detail": f"Parámetros inválidos: {', '.join(invalidas) or 'dimensiones repetidas'}.",
+                "dimensiones": list(valoracion.DIMENSIONS),
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            fecha = date.fromisoformat(request.query_params.get('fecha', ''))
+        except ValueError:
+            return Response({"detail": "Se requiere fecha (AAAA-MM-DD)."}, status=status.HTTP_400_BAD_REQUEST)
+
+        tenant = get_tenant(request)
+        if tenant.empresa is None:
+            return Response({"detail": "Selecciona una empresa (X-Empresa-Id)." if tenant.is_staff
+                             else "Usuario no asociado a un empleado."}, status=status.HTTP_400_BAD_REQUEST)
+        activos = None
+        activo_id = request.query_params.get('activo_id')
+        if activo_id:
+            try:
+                existe = ActivoFijo.objects.filter(pk=activo_id, empresa=tenant.empresa).exists()
+            except DjangoValidationError:
+                existe = False
+            if not existe:
+                return Response({"detail": "El activo no existe o no pertenece a tu empresa."}, status=status.HTTP_404_NOT_FOUND)
+            activos = [activo_id]
+        try:
+            conversion = divisas.conversion_para(tenant.empresa, request.query_params.get('divisa'))
+        except divisas.DivisaError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        data = valoracion.valor_a_fecha(tenant.empresa_id, fecha, group_by, activos)
+        if not conversion.identidad:
+            for item in data['results']:
+                item['valor'] = conversion.convertir(item['valor'], fecha)
+            data['valor'] = conversion.convertir(data['valor'], fecha)
+        data['divisa'] = conversion.codigo
+        return Response(data)
+
 class MantenimientoViewSet(BaseTenantViewSet):
     queryset = Mantenimiento.objects.all().select_related('activo', 'empleado_asignado__usuario') # Optimizar query
     serializer_class = MantenimientoSerializer
@@ -847,6 +1015,8 @@ class MantenimientoViewSet(BaseTenantViewSet):
     filterset_class = MantenimientoFilter
     filter_backends = (DjangoFilterBackend, SearchFilter)
     search_fields = ['activo__nombre', 'activo__codigo_interno', 'descripcion_problema', 'notas_solucion']
+    ordering_fields = ('fecha_inicio', 'estado')
+    default_ordering = '-fecha_inicio'
 
     @action(detail=True, methods=['patch'], permission_classes=[IsAuthenticated]) # No necesita permiso especial aquí, validamos adentro
     def actualizar_estado(self, request, pk=None):
@@ -855,7 +1025,9 @@ class MantenimientoViewSet(BaseTenantViewSet):
         """
         try:
             mantenimiento = self.get_object() # Obtiene el mantenimiento por ID (pk)
-            empleado_actual = request.user.empleado
+            empleado_actual = self.tenant.empleado
+            if empleado_actual is None:
+                raise Empleado.DoesNotExist
 
             # 1. Verificar si el usuario es el empleado asignado
             if mantenimiento.empleado_asignado != empleado_actual:
@@ -943,8 +1115,7 @@ class MantenimientoViewSet(BaseTenantViewSet):
     # --- [ MÉTODO EDITADO ] ---
     def perform_create(self, serializer):
         # Primero, guarda el mantenimiento normalmente (asignando la empresa del usuario creador)
-        empleado_creador = self.request.user.empleado
-        mantenimiento = serializer.save(empresa=self.request.user.empleado.empresa)
+        mantenimiento = serializer.save(empresa=self.tenant.empresa_para_escritura())
         # Luego, intenta crear la notificación para el asignado (si existe)
         self._crear_notificacion_asignacion(mantenimiento)
 
@@ -961,6 +1132,80 @@ class OrdenesCompraViewSet(BaseTenantViewSet):
     queryset = OrdenesCompra.objects.all().select_related('proveedor', 'solicitante__usuario')
     serializer_class = OrdenesCompraSerializer
     required_manage_permission = 'manage_orden_compra' # Necesitarás crear este permiso
+    ordering_fields = ('fecha_inicio', 'estado')
+    default_ordering = '-fecha_inicio'
+
+class TipoDepreciacionViewSet(BaseTenantViewSet):
+    queryset = TipoDepreciacion.objects.all()
+    serializer_class = TipoDepreciacionSerializer
+    required_manage_permission = 'manage_tipodepreciacion'
+    ordering_fields = ('nombre',)
+    default_ordering = 'nombre'
+
+class DepreciacionActivosViewSet(BaseTenantViewSet):
+    """
+    Historial de cargos de depreciación (solo lectura) y cierre mensual incremental:
+    POST /api/depreciaciones/ejecutar/ {"tipo_depreciacion_id": "...", "periodo": "2025-01"}
+    cierra los meses que falten hasta `periodo` (por defecto, el último mes completo).
+    GET /api/depreciaciones/cierres/ muestra la marca de agua de cada tipo.
+    Solo el tipo contable descuenta sus cargos de valor_actual; los demás llevan
+    un saldo paralelo.
+    El cálculo es vectorizado sobre todos los activos de la empresa (api/depreciacion.py).
+    """
+    queryset = DepreciacionActivos.objects.all().select_related('activo', 'tipo_depreciacion')
+    serializer_class = DepreciacionActivosSerializer
+    required_manage_permission = 'manage_depreciacion'
+    tenant_field = 'activo__empresa'
+    http_method_names = ['get', 'post', 'head', 'options']
+    ordering_fields = ('fecha',)
+    default_ordering = '-fecha'
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        activo_id = self.request.query_params.get('activo_id')
+        if activo_id:
+            qs = qs.filter(activo_id=activo_id)
+        periodo = self.request.query_params.get('periodo')
+        if periodo:
+            try:
+                qs = qs.filter(fecha=parse_periodo(periodo))
+            except DepreciacionError as e:
+                raise serializers.ValidationError({'periodo': str(e)})
+        return qs
+
+    def create(self, request, *args, **kwargs):
+        # Los cargos solo los genera el cierre (acción ejecutar)
+        return Response({'detail': 'Usa /depreciaciones/ejecutar/ para generar depreciaciones.'},
+                        status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    @action(detail=False, methods=['get'])
+    def cierres(self, request, *args, **kwargs):
+        cierres = self.tenant.filtrar(CierreDepreciacion.objects.select_related('tipo_depreciacion'))
+        return Response(CierreDepreciacionSerializer(cierres.order_by('tipo_depreciacion__nombre'), many=True).data)
+
+    @action(detail=False, methods=['post'], url_path='ejecutar')
+    def ejecutar(self, request, *args, **kwargs):
+        tipo_id = request.data.get('tipo_depreciacion_id')
+        if not tipo_id:
+            return Response({'detail': 'Se requiere tipo_depreciacion_id.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        empresa = self.tenant.empresa_para_escritura()
+        if empresa is None:
+            return Response({'detail': 'No se pudo determinar la empresa para la operación.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            tipo = TipoDepreciacion.objects.get(pk=tipo_id, empresa=empresa)
+        except (TipoDepreciacion.DoesNotExist, DjangoValidationError):
+            return Response({'detail': 'El tipo de depreciación no existe o no pertenece a tu empresa.'}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            periodos = depreciar(empresa.id, tipo, hasta=request.data.get('periodo'), desde=request.data.get('desde'))
+        except DepreciacionError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Error en DepreciacionActivosViewSet.ejecutar: {e}", exc_info=True)
+            return Response({'detail': f'Error interno del servidor: {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        # Sin periodos pendientes no se crea nada: repetir el cierre es inocuo
+        return Response({'periodos': periodos}, status=status.HTTP_201_CREATED if periodos else status.HTTP_200_OK)
 
 class ItemCatalogoViewSet(BaseTenantViewSet):
     queryset = ItemCatalogo.objects.all()
@@ -976,6 +1221,8 @@ class RevalorizacionActivoViewSet(BaseTenantViewSet):
     queryset = RevalorizacionActivo.objects.all()
     serializer_class = RevalorizacionActivoSerializer
     required_manage_permission = 'manage_revalorizacion'
+    ordering_fields = ('fecha',)
+    default_ordering = '-fecha'
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -987,6 +1234,7 @@ class RevalorizacionActivoViewSet(BaseTenantViewSet):
     @action(detail=False, methods=['post'], url_path='ejecutar')
     def ejecutar(self, request, *args, **kwargs):
         # 1. Comprobar permiso explícitamente para esta acción
+        # (check_permissions ya lo validó; aquí se resuelve desde el memo del request)
         if not check_permission(request, self, self.required_manage_permission):
             self.permission_denied(request, message=f'Permiso "{self.required_manage_permission}" requerido.')
 
@@ -999,24 +1247,15 @@ class RevalorizacionActivoViewSet(BaseTenantViewSet):
         if not all([activo_id, reval_type, value_str]):
             return Response({'detail': 'Se requieren activo_id, reval_type y value.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if reval_type not in ['factor', 'fijo', 'porcentual']:
-            return Response({'detail': 'reval_type inválido.'}, status=status.HTTP_400_BAD_REQUEST)
-
         try:
-            value = Decimal(value_str)
-            if reval_type == 'porcentual':
-                if value <= -100:
-                    raise ValueError("El porcentaje no puede ser menor o igual a -100%.")
-            elif value < 0:
-                raise ValueError("El valor no puede ser negativo para este método.")
-
-        except (ValueError, InvalidOperation) as e:
-            return Response({'detail': str(e) or 'El valor proporcionado no es un número válido.'}, status=status.HTTP_400_BAD_REQUEST)
+            value = revalorizacion.parse_valor(reval_type, value_str)
+        except revalorizacion.RevalorizacionError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
             with transaction.atomic():
                 # Determinar la empresa del usuario
-                empresa_obj = Empresa.objects.first() if request.user.is_staff else request.user.empleado.empresa
+                empresa_obj = self.tenant.empresa_para_escritura()
                 if not empresa_obj:
                     return Response({'detail': 'No se pudo determinar la empresa para la operación.'}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -1026,25 +1265,12 @@ class RevalorizacionActivoViewSet(BaseTenantViewSet):
                 )
 
                 valor_anterior = activo.valor_actual
-                valor_nuevo = Decimal(0)
-                factor_aplicado = Decimal(1)
 
-                if valor_anterior == 0 and reval_type != 'fijo':
+                # 3. Calcular el nuevo valor según el tipo (api/revalorizacion.py)
+                calculado = revalorizacion.calcular(valor_anterior, reval_type, value)
+                if calculado is None:
                     return Response({'detail': 'No se puede revalorizar por factor o porcentaje un activo con valor cero.'}, status=status.HTTP_400_BAD_REQUEST)
-
-                # 3. Calcular el nuevo valor según el tipo
-                if reval_type == 'factor':
-                    factor_aplicado = value
-                    valor_nuevo = valor_anterior * factor_aplicado
-                elif reval_type == 'fijo':
-                    valor_nuevo = value
-                    if valor_anterior > 0:
-                        factor_aplicado = valor_nuevo / valor_anterior
-                    else:
-                        factor_aplicado = Decimal(0)
-                elif reval_type == 'porcentual':
-                    factor_aplicado = Decimal(1) + (value / Decimal(100))
-                    valor_nuevo = valor_anterior * factor_aplicado
+                valor_nuevo, factor_aplicado = calculado
 
                 # 4. Crear registro de historial
                 historial = RevalorizacionActivo.objects.create(
@@ -1072,6 +1298,52 @@ class RevalorizacionActivoViewSet(BaseTenantViewSet):
             logger.error(f"Error en RevalorizacionActivoViewSet.ejecutar: {e}", exc_info=True)
             return Response({'detail': f'Error interno del servidor: {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=False, methods=['post'], url_path='ejecutar-masivo')
+    def ejecutar_masivo(self, request, *args, **kwargs):
+        """
+        Revaloriza de una vez un conjunto de activos (ej. actualización por UFV):
+        {"filters": [...] | "activo_ids": [...], "reval_type": "factor|fijo|porcentual",
+         "value": "1.0345", "notas": "..."}
+        `filters` usa la sintaxis del reporte dinámico; [] selecciona todos los activos.
+        Todo se aplica en una transacción y se devuelve un resumen.
+        """
+        if not check_permission(request, self, self.required_manage_permission):
+            self.permission_denied(request, message=f'Permiso "{self.required_manage_permission}" requerido.')
+
+        filters = request.data.get('filters')
+        activo_ids = request.data.get('activo_ids')
+        if (filters is None) == (activo_ids is None):
+            return Response({'detail': 'Indica filters o activo_ids (solo uno).'}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(filters if filters is not None else activo_ids, list) or activo_ids == []:
+            return Response({'detail': 'filters debe ser una lista y activo_ids una lista no vacía.'}, status=status.HTTP_400_BAD_REQUEST)
+        reval_type = request.data.get('reval_type')
+        try:
+            value = revalorizacion.parse_valor(reval_type, request.data.get('value'))
+        except revalorizacion.RevalorizacionError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        empresa_obj = self.tenant.empresa_para_escritura()
+        if not empresa_obj:
+            return Response({'detail': 'No se pudo determinar la empresa para la operación.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            queryset = ActivoFijo.objects.filter(empresa=empresa_obj)
+            if activo_ids is not None:
+                queryset = queryset.filter(pk__in=activo_ids)
+            else:
+                queryset = apply_filters(queryset, filters, empresa_obj.id)
+            resultado = revalorizacion.revalorizar_masivo(
+                queryset, empresa_obj.id, reval_type, value,
+                notas=request.data.get('notas'), usuario=request.user,
+            )
+        except FilterSyntaxError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except DjangoValidationError:
+            return Response({'detail': 'activo_ids contiene identificadores inválidos.'}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Error en RevalorizacionActivoViewSet.ejecutar_masivo: {e}", exc_info=True)
+            return Response({'detail': f'Error interno del servidor: {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(resultado, status=status.HTTP_200_OK)
+
 class ItemCatalogoViewSet(BaseTenantViewSet):
     queryset = ItemCatalogo.objects.all()
     serializer_class = ItemCatalogoSerializer
@@ -1080,6 +1352,8 @@ class ItemCatalogoViewSet(BaseTenantViewSet):
     filterset_class = ItemCatalogoFilter
     filter_backends = (DjangoFilterBackend, SearchFilter)
     search_fields = ['nombre', 'tipo_item']
+    ordering_fields = ('nombre',)
+    default_ordering = 'nombre'
 
 class InventarioViewSet(BaseTenantViewSet):
     queryset = Inventario.objects.all().select_related('ubicacion', 'item_catalogo', 'responsable__usuario')
@@ -1089,15 +1363,21 @@ class InventarioViewSet(BaseTenantViewSet):
     filterset_class = InventarioFilter
     filter_backends = (DjangoFilterBackend, SearchFilter)
     search_fields = ['item_catalogo__nombre', 'ubicacion__nombre']
+    ordering_fields = ('cantidad',)
+    default_ordering = 'cantidad'  # Primero lo que queda con menos existencias
 
 class MovimientoInventarioViewSet(BaseTenantViewSet):
     queryset = MovimientoInventario.objects.all().select_related('inventario__item_catalogo')
     serializer_class = MovimientoInventarioSerializer
     required_manage_permission = 'manage_inventario' # Permiso de inventario general
+    # MovimientoInventario no tiene 'empresa': se filtra a través del inventario
+    tenant_field = 'inventario__empresa'
     # --- CONFIGURACIÓN DE FILTROS Y BÚSQUEDA ---
     filterset_class = MovimientoInventarioFilter
     filter_backends = (DjangoFilterBackend, SearchFilter)
     search_fields = ['descripcion']
+    ordering_fields = ('fecha', 'cantidad')
+    default_ordering = '-fecha'
 
 
 class SuscripcionViewSet(BaseTenantViewSet):
@@ -1113,8 +1393,7 @@ class SuscripcionViewSet(BaseTenantViewSet):
 
     def get_queryset(self):
         # Sobrescribimos para que solo devuelva LA suscripción de la empresa
-        empleado = self.request.user.empleado
-        return self.queryset.filter(empresa=empleado.empresa)
+        return self.tenant.filtrar(self.queryset)
 
 class NotificacionViewSet(BaseTenantViewSet):
     """
@@ -1123,6 +1402,8 @@ class NotificacionViewSet(BaseTenantViewSet):
     queryset = Notificacion.objects.all()
     serializer_class = NotificacionSerializer
     required_manage_permission = 'view_dashboard' # Cualquiera que vea el dashboard puede verlas
+    ordering_fields = ('leido', 'timestamp')
+    default_ordering = ('leido', '-timestamp') # No leídas primero (igual que Meta.ordering)
 
     def get_queryset(self):
         """